@@ -0,0 +1,247 @@
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from flask import jsonify, request
+
+from observability import record_stage, registry
+
+logger = logging.getLogger(__name__)
+
+# Admission control for the API. Each weighted endpoint costs tokens from two buckets: one
+# per client and one shared by everybody. A client over its own rate gets 429 at once; when
+# the global bucket is empty a request may wait for tokens (a bounded queue: up to
+# ADMISSION_MAX_WAIT seconds and ADMISSION_QUEUE_LIMIT waiting requests per worker), and
+# beyond that gets 503. Both carry Retry-After. Buckets live in a small SQLite file by
+# default, so all gunicorn workers draw on the same tokens.
+
+ENABLED = os.getenv('ADMISSION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# Tokens per second and bucket size, per client and for the whole service
+CLIENT_RATE = float(os.getenv('ADMISSION_CLIENT_RATE', '1.0'))
+CLIENT_BURST = float(os.getenv('ADMISSION_CLIENT_BURST', '40'))
+GLOBAL_RATE = float(os.getenv('ADMISSION_GLOBAL_RATE', '5.0'))
+GLOBAL_BURST = float(os.getenv('ADMISSION_GLOBAL_BURST', '100'))
+MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', '10'))
+# Waiting requests hold a worker thread, so keep this below GUNICORN_THREADS
+QUEUE_LIMIT = int(os.getenv('ADMISSION_QUEUE_LIMIT', '4'))
+# Proxies in front of the app that append to X-Forwarded-For (1 on Render); 0 uses the peer address
+PROXY_HOPS = int(os.getenv('ADMISSION_PROXY_HOPS', '0'))
+# "" keeps buckets in each worker's memory instead of the shared file
+STATE_PATH = os.getenv('ADMISSION_STATE_PATH', os.path.join(tempfile.gettempdir(), 'brm-admission.sqlite3'))
+
+# Tokens per request by endpoint; endpoints not listed are not limited
+DEFAULT_WEIGHTS = ('process_pdf=10,create_job=10,process_batch=30,chat=1,metrics=1,'
+                   'query_statements=1,query_statement_documents=1,compare_statements=1')
+
+
+def parse_weights(text):
+    # "process_pdf=10,chat=1" -> {'process_pdf': 10.0, 'chat': 1.0}
+    weights = {}
+    for part in text.split(','):
+        name, _, value = part.partition('=')
+        if name.strip() and value.strip():
+            weights[name.strip()] = float(value)
+    return weights
+
+
+WEIGHTS = parse_weights(os.getenv('ADMISSION_WEIGHTS', DEFAULT_WEIGHTS))
+
+
+def refill(tokens, updated, now, rate, burst):
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+def draw(balances, requests, now):
+    """Take tokens from several buckets, all or none.
+
+    `balances` maps key -> (tokens, updated) and is updated in place. Each request is
+    (key, cost, rate, burst, max_wait): a bucket may go into debt up to `max_wait` seconds
+    of refill, which the caller waits out. Returns (None, wait) when granted, or
+    (failed key, retry_after) when not.
+    """
+    granted = []
+    for key, cost, rate, burst, max_wait in requests:
+        tokens = refill(*balances.get(key, (burst, now)), now, rate, burst)
+        # A request costing more than the bucket holds could never be admitted
+        cost = min(cost, burst)
+        if tokens - cost < -rate * max_wait:
+            return key, max(0.0, (cost - tokens) / rate - max_wait)
+        granted.append((key, tokens - cost, rate))
+    wait = 0.0
+    for key, tokens, rate in granted:
+        balances[key] = (tokens, now)
+        wait = max(wait, -tokens / rate)
+    return None, wait
+
+
+class LocalBuckets:
+    """Token buckets in this process only."""
+
+    def __init__(self):
+        self._balances = {}
+        self._lock = threading.Lock()
+
+    def draw(self, requests):
+        with self._lock:
+            return draw(self._balances, requests, time.time())
+
+
+class SharedBuckets:
+    """Token buckets in a SQLite file shared by every worker on the host."""
+
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL) WITHOUT ROWID'
+    # Client buckets idle this long are full again and can be dropped
+    PRUNE_AFTER = 3600
+
+    def __init__(self, path, busy_timeout=1.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._draws = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # No connection is kept open here, so a preloading gunicorn master forks none
+        connection = self._open()
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(self.SCHEMA)
+        finally:
+            connection.close()
+
+    def _open(self):
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                     check_same_thread=False)
+        # Losing the last moments of bucket state in a crash only refills the buckets
+        connection.execute('PRAGMA synchronous=OFF')
+        return connection
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._local.connection = self._open()
+            self._local.pid = os.getpid()
+        return connection
+
+    def draw(self, requests):
+        connection = self._connection()
+        keys = [key for key, *_ in requests]
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            balances = {key: (tokens, updated) for key, tokens, updated in connection.execute(
+                f"SELECT key, tokens, updated FROM buckets WHERE key IN ({', '.join('?' * len(keys))})", keys)}
+            failed, wait = draw(balances, requests, now)
+            if failed is None:
+                connection.executemany('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                                       [(key, *balances[key]) for key in keys])
+            self._draws += 1
+            if self._draws % 1000 == 0:
+                connection.execute('DELETE FROM buckets WHERE updated < ?', (now - self.PRUNE_AFTER,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return failed, wait
+
+
+class AdmissionController:
+    def __init__(self, buckets, weights=WEIGHTS, client_rate=CLIENT_RATE, client_burst=CLIENT_BURST,
+                 global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST, max_wait=MAX_WAIT, queue_limit=QUEUE_LIMIT):
+        self.buckets = buckets
+        self.weights = weights
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.max_wait = max_wait
+        self.queue_limit = queue_limit
+        self._lock = threading.Lock()
+        self._waiting = 0
+
+    def admit(self, endpoint, client):
+        """Returns (None, None) to admit, possibly after waiting, or (status, retry_after)."""
+        cost = self.weights.get(endpoint)
+        if not cost:
+            return None, None
+        with self._lock:
+            # With the queue full nothing may wait, so only requests the bucket covers now get in
+            max_wait = self.max_wait if self._waiting < self.queue_limit else 0.0
+        try:
+            failed, wait = self.buckets.draw([
+                (f'client:{client}', cost, self.client_rate, self.client_burst, 0.0),
+                ('global', cost, self.global_rate, self.global_burst, max_wait),
+            ])
+        except sqlite3.Error as e:
+            # Admission must not take the service down with it
+            logger.warning(f"Admission state unavailable, admitting: {str(e)}")
+            registry.inc('brm_admission_total', endpoint=endpoint, result='unchecked')
+            return None, None
+
+        if failed is not None:
+            result = 'rejected_client' if failed != 'global' else \
+                ('rejected_queue' if max_wait == 0.0 and self.max_wait else 'rejected_global')
+            registry.inc('brm_admission_total', endpoint=endpoint, result=result)
+            logger.warning("Shed %s from %s (%s, retry after %.1fs)", endpoint, client, result, wait)
+            return (429 if result == 'rejected_client' else 503), wait
+
+        if wait > 0:
+            registry.inc('brm_admission_total', endpoint=endpoint, result='queued')
+            with self._lock:
+                self._waiting += 1
+            try:
+                time.sleep(wait)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            record_stage('admission_wait', wait)
+        else:
+            registry.inc('brm_admission_total', endpoint=endpoint, result='admitted')
+        return None, None
+
+    def stats(self):
+        with self._lock:
+            waiting = self._waiting
+        return {'waiting': waiting, 'queue_limit': self.queue_limit, 'max_wait': self.max_wait,
+                'client': {'rate': self.client_rate, 'burst': self.client_burst},
+                'global': {'rate': self.global_rate, 'burst': self.global_burst}, 'weights': self.weights}
+
+
+def client_id():
+    # The address PROXY_HOPS proxies back in X-Forwarded-For; addresses further left are client-supplied
+    if PROXY_HOPS:
+        forwarded = [part.strip() for value in request.headers.getlist('X-Forwarded-For')
+                     for part in value.split(',') if part.strip()]
+        if len(forwarded) >= PROXY_HOPS:
+            return forwarded[-PROXY_HOPS]
+    return request.remote_addr or 'unknown'
+
+
+def shed_response(status, retry_after):
+    message = 'Too many requests. Please slow down.' if status == 429 else \
+        'Server is busy. Please try again shortly.'
+    response = jsonify({'error': message, 'code': 'rate_limited' if status == 429 else 'overloaded'})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def setup_admission_control(app, exempt=lambda: False):
+    # Registered after the upload limits, so oversized bodies are refused before costing tokens.
+    # `exempt()` is true for requests that are never limited (admin calls)
+    if not ENABLED:
+        return None
+    controller = AdmissionController(SharedBuckets(STATE_PATH) if STATE_PATH else LocalBuckets())
+
+    @app.before_request
+    def admit_request():
+        if request.method == 'OPTIONS' or exempt():
+            return None
+        status, retry_after = controller.admit(request.endpoint, client_id())
+        if status is not None:
+            return shed_response(status, retry_after)
+        return None
+
+    return controller
@@ -0,0 +1,34 @@
+import re
+import unicodedata
+
+# Keys for cached chat answers. Questions that differ only in case, punctuation, spacing,
+# filler words or a known synonym ("D/E" and "debt-equity", "turnover" and "revenue") map
+# to the same key, so the answer Gemini gave once is reused for every phrasing.
+
+# Applied in order to the lower-cased question
+SYNONYMS = [
+    (r"\bwhat's\b|\bwhats\b", 'what is'),
+    (r"\b(?:calculate|compute|work out|tell me|show me|give me|find|determine|explain)\b", 'what is'),
+    (r'\b(?:d\s*/\s*e|debt[\s-]*equity|debt to equity|gearing)\b', 'debt to equity'),
+    (r'\bweighted average cost of capital\b', 'wacc'),
+    (r'\b(?:p\s*&\s*l|profit (?:and|&) loss|income statement)\b', 'profit and loss'),
+    (r'\b(?:revenues|turnover|sales)\b', 'revenue'),
+    (r'\b(?:profits|earnings)\b', 'profit'),
+    (r'\b(?:ratios)\b', 'ratio'),
+    (r"\b(?:company's|companys|firm's|firm|business)\b", 'company'),
+    (r'&', ' and '),
+]
+SYNONYM_PATTERNS = [(re.compile(pattern), replacement) for pattern, replacement in SYNONYMS]
+FILLER_WORDS = {'please', 'kindly', 'the', 'a', 'an', 'this', 'our', 'can', 'could', 'would', 'you', 'me', 'us'}
+
+
+def normalize_question(message):
+    # "Please calculate the D/E ratio?" -> "what is debt to equity ratio"
+    text = unicodedata.normalize('NFKC', str(message)).lower()
+    for pattern, replacement in SYNONYM_PATTERNS:
+        text = pattern.sub(replacement, text)
+    # Punctuation goes, except inside numbers ("12.5%" stays as written)
+    text = re.sub(r'(?<!\d)[.,](?!\d)|[^\w\s.,%]', ' ', text)
+    text = ' '.join(word for word in text.split() if word not in FILLER_WORDS)
+    # "can you calculate" and "what is" both fold to "what is"; once is enough
+    return re.sub(r'\b(?:what is )+', 'what is ', text)
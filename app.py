@@ -1,455 +1,853 @@
 import os
-from flask import Flask, request, jsonify, send_from_directory
-import google.generativeai as genai
-from PyPDF2 import PdfReader
 from dotenv import load_dotenv
+
+# Load environment variables before anything else: the modules below read their settings on import
+load_dotenv()
+
+from flask import Flask, Response, abort, request, jsonify, send_file
+from comparative import build_comparative, describe_pages, unique_labels
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from admission import setup_admission_control
+from answer_cache import normalize_question
 from cors_middleware import setup_cors_middleware
+from deadlines import (MIN_LLM_SECONDS, REQUEST_DEADLINE, RequestCancelled, cancelled_response_body, checkpoint,
+                       current_deadline, deadline_scope, request_deadline, setup_deadlines)
+from document_store import DocumentStore, document_key, render_context
+from financial_metrics import (answer_metric_question, compute_metrics, compute_period_metrics,
+                               match_metric_question, render_metrics)
+from jobs import JobManager, QueueFullError
+from llm_backends import LazyModel
+from llm_client import LLMCancelledError, LLMClient, LLMUnavailableError
+from local_parser import parse_statements
+from observability import configure_logging, record_stage, registry, setup_observability, stage
+from profiling import setup_profiling
+from page_index import compact_pages, compact_statement_pages, estimate_tokens
+from pdf_extraction import iter_page_texts, text_pdf
+from response_parser import normalize_financial_data, parse_model_json
+from result_cache import ResultCache, digest_stream
+from statement_store import CATEGORIES, GROUP_COLUMNS, STATEMENTS, StatementStore
+from static_assets import ASSET_PREFIX, IMMUTABLE, REVALIDATE, AssetBundle, setup_api_compression
+from uploads import MAX_BATCH_FILES, MAX_UPLOAD_BYTES, setup_upload_limits, stream_size
+import contextvars
+import io
 import json
 import logging
+import sqlite3
+import tempfile
+import time
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: request ids on every line, INFO sampled per request (LOG_SAMPLE_RATE)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+STARTED_AT = time.time()
+# Prime parsing and prompt code paths at start-up (see warm_up)
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', '1').lower() in ('1', 'true', 'yes')
 
-# Configure Gemini AI
-try:
-    logger.info("Initializing Gemini AI model...")
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
-        logger.error("GOOGLE_API_KEY environment variable not found")
-        raise ValueError("GOOGLE_API_KEY environment variable not found")
-    
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-1.5-pro')
-    logger.info("Successfully initialized Gemini AI model")
-except Exception as e:
-    logger.error(f"Error initializing Gemini model: {str(e)}")
-    model = None
+MODEL_NAME = 'gemini-1.5-pro'
+# Bump whenever the extraction prompt, local parser or post-processing changes so cached results are not reused
+PROMPT_VERSION = '3'
+
+# Approximate token budget for document text in the extraction prompt (0 sends every page)
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '30000'))
+
+# Minimum local parser confidence (0-1) for skipping Gemini; above 1 always uses Gemini
+LOCAL_PARSER_THRESHOLD = float(os.getenv('LOCAL_PARSER_THRESHOLD', '0.85'))
+
+# "combined" asks Gemini for both statements in one prompt; "split" asks for the balance sheet
+# and the profit & loss in separate prompts sent concurrently, each with only its own pages
+EXTRACTION_MODE = os.getenv('EXTRACTION_MODE', 'combined')
+# Further attempts for one statement whose answer cannot be read or validated (split mode)
+EXTRACTION_SECTION_RETRIES = int(os.getenv('EXTRACTION_SECTION_RETRIES', '1'))
+
+# Cache of processed PDFs keyed by upload digest, shared by all workers through the cache directory
+result_cache = ResultCache(
+    os.getenv('RESULT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'brm-result-cache')),
+    max_memory_entries=int(os.getenv('RESULT_CACHE_MEMORY_ENTRIES', '128')),
+    max_disk_bytes=int(os.getenv('RESULT_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+    ttl=int(os.getenv('RESULT_CACHE_TTL', str(7 * 24 * 3600))),
+)
+
+# Configure the model backend: Gemini by default, or a local fake for tests and benchmarks (LLM_BACKEND=fake).
+# It is built on first use in each worker; /readyz reports why when it cannot be.
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+model = LazyModel(LLM_BACKEND, MODEL_NAME)
+
+# Every model call goes through the client: concurrency and token limits, retries with
+# backoff, a circuit breaker, collapsing of identical in-flight prompts and optional hedging
+llm = LLMClient(
+    model,
+    max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', '4')),
+    tokens_per_minute=int(os.getenv('LLM_TOKENS_PER_MINUTE', '0')),
+    max_retries=int(os.getenv('LLM_MAX_RETRIES', '3')),
+    call_timeout=float(os.getenv('LLM_TIMEOUT', '60')),
+    queue_timeout=float(os.getenv('LLM_QUEUE_TIMEOUT', '30')),
+    breaker_threshold=int(os.getenv('LLM_BREAKER_THRESHOLD', '5')),
+    breaker_cooldown=float(os.getenv('LLM_BREAKER_COOLDOWN', '30')),
+    hedge_after=float(os.getenv('LLM_HEDGE_AFTER', '0')),
+)
+
+# Server-side document sessions so chat requests only carry a document id
+document_store = DocumentStore(ResultCache(
+    os.getenv('DOCUMENT_STORE_DIR', os.path.join(tempfile.gettempdir(), 'brm-documents')),
+    max_memory_entries=int(os.getenv('DOCUMENT_STORE_MEMORY_ENTRIES', '256')),
+    max_disk_bytes=int(os.getenv('DOCUMENT_STORE_MAX_BYTES', str(64 * 1024 * 1024))),
+    ttl=int(os.getenv('DOCUMENT_STORE_TTL', str(24 * 3600))),
+    name='document',
+))
+
+# Chat answers by document and normalized question, shared by all workers (ANSWER_CACHE_TTL=0 disables)
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', str(24 * 3600)))
+answer_cache = ResultCache(
+    os.getenv('ANSWER_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'brm-answers')),
+    max_memory_entries=int(os.getenv('ANSWER_CACHE_MEMORY_ENTRIES', '512')),
+    max_disk_bytes=int(os.getenv('ANSWER_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    ttl=ANSWER_CACHE_TTL,
+    name='answer',
+) if ANSWER_CACHE_TTL > 0 else None
+
+# Line items of every processed document, kept in SQLite for /api/statements queries
+statement_store = StatementStore(
+    os.getenv('STATEMENT_STORE_PATH', os.path.join(tempfile.gettempdir(), 'brm-statements.sqlite3')))
+
+# Reports of one /api/batch request processed at the same time, shared by all batches in a worker
+batch_executor = ThreadPoolExecutor(max_workers=int(os.getenv('BATCH_PARALLELISM', '3')),
+                                    thread_name_prefix='batch')
+# Per-statement model calls of split extraction; never more than the client lets through at once
+section_executor = ThreadPoolExecutor(max_workers=llm.max_concurrency, thread_name_prefix='section')
+
+# Background workers for asynchronous PDF jobs; job state is shared between gunicorn workers on disk
+job_manager = JobManager(
+    os.getenv('JOB_STATE_DIR', os.path.join(tempfile.gettempdir(), 'brm-jobs')),
+    max_workers=int(os.getenv('JOB_WORKERS', '2')),
+    max_queue=int(os.getenv('JOB_QUEUE_LIMIT', '16')),
+    ttl=int(os.getenv('JOB_TTL', '3600')),
+)
+
+# Cache and queue numbers are exported on /metrics next to the stage timers
+def collect_pipeline_metrics():
+    cache_stats, queue_stats, llm_stats = result_cache.stats(), job_manager.stats(), llm.stats()
+    answer_stats = answer_cache.stats() if answer_cache else {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+    return [
+        ('brm_result_cache_hits_total', 'counter', cache_stats['memory_hits'], {'tier': 'memory'}),
+        ('brm_result_cache_hits_total', 'counter', cache_stats['disk_hits'], {'tier': 'disk'}),
+        ('brm_result_cache_misses_total', 'counter', cache_stats['misses'], {}),
+        ('brm_answer_cache_hits_total', 'counter', answer_stats['memory_hits'], {'tier': 'memory'}),
+        ('brm_answer_cache_hits_total', 'counter', answer_stats['disk_hits'], {'tier': 'disk'}),
+        ('brm_answer_cache_misses_total', 'counter', answer_stats['misses'], {}),
+        ('brm_job_queue_depth', 'gauge', queue_stats['queue_depth'], {}),
+        ('brm_jobs_running', 'gauge', queue_stats['running'], {}),
+        ('brm_jobs_rejected_total', 'counter', queue_stats['rejected'], {}),
+    ] + [
+        (f'brm_llm_{name}_total', 'counter', llm_stats[name], {})
+        for name in ('calls', 'retries', 'transient_errors', 'timeouts', 'single_flight_joins', 'hedges',
+                     'hedge_wins', 'rejected_busy', 'rejected_rate', 'rejected_open', 'breaker_opens')
+    ]
+
+registry.register_collector(collect_pipeline_metrics)
+
+def is_admin_request():
+    # Admin-only endpoints are disabled unless ADMIN_TOKEN is configured
+    admin_token = os.getenv('ADMIN_TOKEN')
+    return bool(admin_token) and request.headers.get('X-Admin-Token') == admin_token
 
 app = Flask(__name__)
+# Registered first so request ids and timers also cover CORS preflights
+setup_observability(app)
+# Opt-in per-request profiles (X-Profile from an admin, or PROFILE_SAMPLE_RATE), saved under the request id
+profiles = setup_profiling(app, allowed=is_admin_request,
+                           exempt=('recent_profiles', 'get_profile', 'healthz', 'readyz', 'prometheus_metrics'))
+# Starts each request's clock for its deadline; before admission, so queueing counts against it
+setup_deadlines(app)
 setup_cors_middleware(app)
+setup_upload_limits(app)
+# Per-client and global token buckets in front of the expensive endpoints (None when disabled)
+admission = setup_admission_control(app, exempt=is_admin_request)
+setup_api_compression(app)
+
+# Front-end files, fingerprinted and compressed once at start-up
+static_assets = AssetBundle(app.root_path)
+
+# Instructions for Gemini AI to extract financial data with detailed categorization.
+# Built once at import; the schema is given a single time in compact form instead of
+# a full schema plus a worked example, which only added input tokens to every call.
+EXTRACTION_PROMPT = """Extract financial data from the following text. Focus on:
+1. Balance Sheet items: current and non-current assets, current and non-current liabilities, equity components.
+2. Profit & Loss items:
+   - Operating Revenue (e.g., Revenue from Operations, Sales Revenue, Service Revenue)
+   - Non-Operating Revenue (e.g., Other Income, Interest Income, Dividend Income)
+   - Operating Expenses (e.g., Cost of Materials Consumed, Employees Benefit Expenses, Salaries, Rent, Changes in Inventories of WIP & Finished Goods)
+   - Non-Operating Expenses (e.g., Finance Cost, Interest Expense, Loss on Sale of Assets, Depreciation & Amortization Expenses if not part of operations)
+
+Rules:
+- All amounts are plain positive numbers without currency symbols or commas; use 0 if an amount cannot be determined
+- Operating items relate to core business activities, non-operating items do not; use operating if unclear
+- Treat "Other Expenses" as operating unless they clearly relate to interest or finance costs
+- Use the current-year column when several periods are shown
+- Keep line item names as written in the document
+
+Respond with only a JSON object in exactly this shape, where each list holds {"name": "item_name", "value": numeric_amount} objects:
+{"balance_sheet": {"assets": {"current": [], "non_current": []}, "liabilities": {"current": [], "non_current": []}, "equity": []},
+ "income_statement": {"revenue": {"operating": [], "non_operating": []}, "expenses": {"operating": [], "non_operating": []}}}
+
+Pages are marked [Page N]. Text to analyze:
+"""
+
+# Split extraction: the same instructions, one statement per prompt
+SECTION_PROMPTS = {
+    'balance_sheet': """Extract financial data from the following text. Focus on the Balance Sheet only: current and non-current assets, current and non-current liabilities, equity components.
+
+Rules:
+- All amounts are plain positive numbers without currency symbols or commas; use 0 if an amount cannot be determined
+- Use the current-year column when several periods are shown
+- Keep line item names as written in the document
+
+Respond with only a JSON object in exactly this shape, where each list holds {"name": "item_name", "value": numeric_amount} objects:
+{"balance_sheet": {"assets": {"current": [], "non_current": []}, "liabilities": {"current": [], "non_current": []}, "equity": []}}
 
-def extract_text_from_pdf(pdf_file):
-    logger.info(f"Starting PDF text extraction for file: {pdf_file.filename}")
+Pages are marked [Page N]. Text to analyze:
+""",
+    'income_statement': """Extract financial data from the following text. Focus on the Profit & Loss statement only:
+   - Operating Revenue (e.g., Revenue from Operations, Sales Revenue, Service Revenue)
+   - Non-Operating Revenue (e.g., Other Income, Interest Income, Dividend Income)
+   - Operating Expenses (e.g., Cost of Materials Consumed, Employees Benefit Expenses, Salaries, Rent, Changes in Inventories of WIP & Finished Goods)
+   - Non-Operating Expenses (e.g., Finance Cost, Interest Expense, Loss on Sale of Assets, Depreciation & Amortization Expenses if not part of operations)
+
+Rules:
+- All amounts are plain positive numbers without currency symbols or commas; use 0 if an amount cannot be determined
+- Operating items relate to core business activities, non-operating items do not; use operating if unclear
+- Treat "Other Expenses" as operating unless they clearly relate to interest or finance costs
+- Use the current-year column when several periods are shown
+- Keep line item names as written in the document
+
+Respond with only a JSON object in exactly this shape, where each list holds {"name": "item_name", "value": numeric_amount} objects:
+{"income_statement": {"revenue": {"operating": [], "non_operating": []}, "expenses": {"operating": [], "non_operating": []}}}
+
+Pages are marked [Page N]. Text to analyze:
+""",
+}
+
+def extract_pages_from_pdf(pdf_stream, filename, on_page=None):
+    # Returns the text of every page; `on_page(pages_done)` is called as pages arrive.
+    # Stops between pages once the request's deadline has passed or its client has gone
+    deadline = current_deadline()
     try:
-        reader = PdfReader(pdf_file)
-        logger.info(f"Successfully created PdfReader object. Number of pages: {len(reader.pages)}")
-        text = ''
-        for i, page in enumerate(reader.pages):
-            page_text = page.extract_text()
-            logger.info(f"Extracted text from page {i+1}. Text length: {len(page_text)}")
-            text += page_text + '\n'
-        logger.info(f"Total extracted text length: {len(text)}")
-        return text
+        pages = []
+        for page_text in iter_page_texts(pdf_stream, stop_at=deadline.expires if deadline else None):
+            pages.append(page_text)
+            if on_page:
+                on_page(len(pages))
+            checkpoint('pdf_extract')
+        # Pool extraction ends early without raising when the deadline passes
+        checkpoint('pdf_extract')
+        logger.info("Extracted %d pages from %s", len(pages), filename)
+        return pages
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error in PDF text extraction: {str(e)}")
         raise
 
-def parse_financial_data(text):
-    logger.info("Starting financial data parsing...")
-    # Enhanced prompt for Gemini AI to extract financial data with detailed categorization
-    prompt = f"""Extract financial data from the following text. Focus on:
-    1. Balance Sheet items with detailed categorization:
-       - Current Assets (e.g., Cash, Accounts Receivable, Inventory)
-       - Non-Current Assets (e.g., Property, Plant, Equipment, Intangible Assets)
-       - Current Liabilities (e.g., Accounts Payable, Short-term Debt)
-       - Non-Current Liabilities (e.g., Long-term Debt, Deferred Tax Liabilities)
-       - Equity components (e.g., Common Stock, Retained Earnings)
-    2. Profit & Loss items with detailed categorization:
-       - Operating Revenue (e.g., Revenue from Operations, Sales Revenue, Service Revenue)
-       - Non-Operating Revenue (e.g., Other Income, Interest Income, Dividend Income)
-       - Operating Expenses (e.g., Cost of Materials Consumed, Employees Benefit Expenses, Cost of Goods Sold, Salaries, Rent, Changes in Inventories of WIP & Finished Goods)
-       - Non-Operating Expenses (e.g., Finance Cost, Interest Expense, Loss on Sale of Assets, Depreciation & Amortization Expenses if not part of operations)
-
-    Important rules:
-    - All amounts must be numeric values (convert text/string amounts to numbers)
-    - Remove any currency symbols (e.g., $, €) and commas from amounts
-    - Ensure all values are positive numbers
-    - Use 0 if an amount cannot be determined
-    - Categorize revenue and expenses into operating and non-operating based on their nature:
-      - Operating Revenue: Directly related to the core business activities (e.g., sales of goods or services)
-      - Non-Operating Revenue: Not related to core business (e.g., interest earned, dividends, other income)
-      - Operating Expenses: Directly related to core business operations (e.g., cost of materials, employee salaries, changes in inventory)
-      - Non-Operating Expenses: Not related to core operations (e.g., finance costs, interest expenses, depreciation if not operational)
-    - If an item cannot be categorized, place it in the appropriate default category (e.g., use 'operating' for revenue/expenses if unclear)
-    - For expenses labeled as "Other Expenses", attempt to classify them as operating unless they clearly relate to non-operating activities (e.g., interest or finance costs)
-
-    Format the response as a valid JSON object with this type of structure:
-    {{
-        "balance_sheet": {{
-            "assets": {{
-                "current": [
-                    {{"name": "item_name", "value": numeric_amount}}
-                ],
-                "non_current": [
-                    {{"name": "item_name", "value": numeric_amount}}
-                ]
-            }},
-            "liabilities": {{
-                "current": [
-                    {{"name": "item_name", "value": numeric_amount}}
-                ],
-                "non_current": [
-                    {{"name": "item_name", "value": numeric_amount}}
-                ]
-            }},
-            "equity": [
-                {{"name": "item_name", "value": numeric_amount}}
-            ]
-        }},
-        "income_statement": {{
-            "revenue": {{
-                "operating": [
-                    {{"name": "item_name", "value": numeric_amount}}
-                ],
-                "non_operating": [
-                    {{"name": "item_name", "value": numeric_amount}}
-                ]
-            }},
-            "expenses": {{
-                "operating": [
-                    {{"name": "item_name", "value": numeric_amount}}
-                ],
-                "non_operating": [
-                    {{"name": "item_name", "value": numeric_amount}}
-                ]
-            }}
-        }}
-    }}
-
-    Example output for clarity:
-    {{
-        "balance_sheet": {{
-            "assets": {{
-                "current": [
-                    {{"name": "Cash", "value": 5000}},
-                    {{"name": "Accounts Receivable", "value": 3000}}
-                ],
-                "non_current": [
-                    {{"name": "Property", "value": 10000}},
-                    {{"name": "Equipment", "value": 7000}}
-                ]
-            }},
-            "liabilities": {{
-                "current": [
-                    {{"name": "Accounts Payable", "value": 2000}}
-                ],
-                "non_current": [
-                    {{"name": "Long-term Debt", "value": 5000}}
-                ]
-            }},
-            "equity": [
-                {{"name": "Common Stock", "value": 8000}},
-                {{"name": "Retained Earnings", "value": 4000}}
-            ]
-        }},
-        "income_statement": {{
-            "revenue": {{
-                "operating": [
-                    {{"name": "Revenue from Operations", "value": 15000}}
-                ],
-                "non_operating": [
-                    {{"name": "Other Income", "value": 500}}
-                ]
-            }},
-            "expenses": {{
-                "operating": [
-                    {{"name": "Cost of Materials Consumed", "value": 8000}},
-                    {{"name": "Employees Benefit Expenses", "value": 3000}},
-                    {{"name": "Changes in Inventories of WIP & Finished Goods", "value": 1000}}
-                ],
-                "non_operating": [
-                    {{"name": "Finance Cost", "value": 1000}},
-                    {{"name": "Depreciation & Amortization Expenses", "value": 500}}
-                ]
-            }}
-        }}
-    }}
-
-    Text to analyze: {text}
-    """
+def call_model(prompt, report, **details):
+    # One extraction call; returns the answer's text. `details` are added to the progress events
+    report('llm_started', prompt_characters=len(prompt), **details)
+    try:
+        with stage('llm_call'):
+            response = llm.generate(prompt, deadline=current_deadline())
+        logger.info("Received %d characters from Gemini AI", len(response.text or ''))
+        report('llm_finished', response_characters=len(response.text or ''), **details)
+    except (LLMUnavailableError, LLMCancelledError):
+        raise
+    except Exception as api_error:
+        logger.error(f"Error calling Gemini AI API: {str(api_error)}")
+        raise Exception(f"Failed to process text with AI: {str(api_error)}")
+
+    if not response.text:
+        logger.error("Error: Empty response from Gemini AI")
+        raise ValueError("Empty response from Gemini AI")
+    return response.text
+
+def read_model_answer(text, statements=STATEMENTS):
+    # Extract the JSON object, repairing common model quirks instead of paying for another call
+    try:
+        with stage('json_repair'):
+            data, repairs = parse_model_json(text)
+    except ValueError as e:
+        registry.inc('brm_llm_json_total', outcome='failed')
+        logger.error("Error decoding JSON: %s (response starts %r)", e, text[:200])
+        raise
+    registry.inc('brm_llm_json_total', outcome='repaired' if repairs else 'clean')
+    for repair in repairs:
+        registry.inc('brm_llm_json_repairs_total', kind=repair)
+    if repairs:
+        log = logger.warning if 'truncated' in repairs else logger.info
+        log("Repaired model JSON: %s", ', '.join(repairs))
+
+    # Validate the structure and convert every amount in one pass
+    with stage('validation'):
+        data, counts = normalize_financial_data(data, statements)
+    for result, count in counts.items():
+        if count:
+            registry.inc('brm_llm_json_values_total', count, result=result)
+    return data
+
+def parse_financial_data(text, progress=None):
+    report = progress or (lambda stage, **details: None)
+    with stage('prompt_build'):
+        prompt = EXTRACTION_PROMPT + text
     
     try:
         if not model:
             logger.error("Error: Gemini AI model not initialized")
             raise Exception("Gemini AI model not initialized properly")
             
-        logger.info("Sending request to Gemini AI...")
+        data = read_model_answer(call_model(prompt, report))
+        report('validated')
+        return data
+    except (LLMUnavailableError, LLMCancelledError):
+        raise
+    except Exception as e:
+        logger.error(f"Error in parse_financial_data: {str(e)}")
+        raise Exception(f"Error processing financial data: {str(e)}")
+
+def extract_section(statement, text, report):
+    # One statement of a split extraction. An answer that cannot be read or validated is asked
+    # for again; transient API errors are already retried by the LLM client
+    with stage('prompt_build'):
+        prompt = SECTION_PROMPTS[statement] + text
+    for attempt in range(EXTRACTION_SECTION_RETRIES + 1):
+        answer = call_model(prompt, report, section=statement)
         try:
-            response = model.generate_content(prompt)
-            logger.info(f"Received response from Gemini AI: {response.text}")
-        except Exception as api_error:
-            logger.error(f"Error calling Gemini AI API: {str(api_error)}")
-            raise Exception(f"Failed to process text with AI: {str(api_error)}")
-        
-        if not response.text:
-            logger.error("Error: Empty response from Gemini AI")
-            raise ValueError("Empty response from Gemini AI")
-            
-        # Clean up the response text to ensure it's valid JSON
-        cleaned_text = response.text.strip()
-        logger.info(f"Cleaned text (before processing): {cleaned_text}")
-        
-        # Remove any markdown code block markers if present
-        cleaned_text = cleaned_text.replace('```json', '').replace('```', '')
-        # Replace single quotes with double quotes for JSON compatibility
-        cleaned_text = cleaned_text.replace("'", '"')
-        
-        logger.info(f"Cleaned text (after processing): {cleaned_text}")
-        
-        # Validate JSON structure and numeric values
+            return read_model_answer(answer, [statement])[statement]
+        except ValueError as e:
+            if attempt == EXTRACTION_SECTION_RETRIES:
+                raise
+            registry.inc('brm_extraction_section_retries_total', section=statement)
+            logger.warning(f"Asking again for the {statement} after an unusable answer: {str(e)}")
+
+def parse_financial_data_split(sections, progress=None):
+    # `sections` maps each statement to its own compacted pages. The statements are asked for
+    # concurrently (the first on this thread) and merged into one financial_data structure
+    report = progress or (lambda stage, **details: None)
+    try:
+        if not model:
+            logger.error("Error: Gemini AI model not initialized")
+            raise Exception("Gemini AI model not initialized properly")
+
+        (first, first_text), *others = sections.items()
+        futures = {statement: section_executor.submit(contextvars.copy_context().run, extract_section,
+                                                      statement, text, report)
+                   for statement, text in others}
         try:
-            data = json.loads(cleaned_text)
-            logger.info(f"Successfully parsed JSON data: {json.dumps(data, indent=2)}")
-            
-            # Validate required structure and data format
-            required_sections = ['balance_sheet', 'income_statement']
-            for section in required_sections:
-                if section not in data:
-                    logger.error(f"Error: Missing required section '{section}' in data")
-                    raise ValueError(f"Missing required section: {section}")
-                if not isinstance(data[section], dict):
-                    logger.error(f"Error: Invalid format for section '{section}', expected object but got {type(data[section])}")
-                    raise ValueError(f"Invalid format for section: {section}")
-            
-            # Validate subsections for balance_sheet
-            balance_sheet_subsections = {
-                'assets': ['current', 'non_current'],
-                'liabilities': ['current', 'non_current'],
-                'equity': None  # equity is a list, not a dict with subcategories
-            }
-            for subsection, subcategories in balance_sheet_subsections.items():
-                if subsection not in data['balance_sheet']:
-                    logger.error(f"Error: Missing subsection '{subsection}' in balance_sheet")
-                    raise ValueError(f"Missing subsection '{subsection}' in balance_sheet")
-                if subsection == 'equity':
-                    if not isinstance(data['balance_sheet'][subsection], list):
-                        logger.error(f"Error: Invalid format for 'equity', expected array but got {type(data['balance_sheet'][subsection])}")
-                        raise ValueError(f"Invalid format for 'equity' in balance_sheet")
-                else:
-                    if not isinstance(data['balance_sheet'][subsection], dict):
-                        logger.error(f"Error: Invalid format for '{subsection}', expected object but got {type(data['balance_sheet'][subsection])}")
-                        raise ValueError(f"Invalid format for '{subsection}' in balance_sheet")
-                    for subcategory in subcategories:
-                        if subcategory not in data['balance_sheet'][subsection]:
-                            logger.warning(f"Warning: Missing subcategory '{subcategory}' in {subsection}, initializing as empty list")
-                            data['balance_sheet'][subsection][subcategory] = []
-                        if not isinstance(data['balance_sheet'][subsection][subcategory], list):
-                            logger.error(f"Error: Invalid format for '{subcategory}' in {subsection}, expected array but got {type(data['balance_sheet'][subsection][subcategory])}")
-                            raise ValueError(f"Invalid format for '{subcategory}' in {subsection}")
-            
-            # Validate subsections for income_statement
-            income_statement_subsections = {
-                'revenue': ['operating', 'non_operating'],
-                'expenses': ['operating', 'non_operating']
-            }
-            for subsection, subcategories in income_statement_subsections.items():
-                if subsection not in data['income_statement']:
-                    logger.error(f"Error: Missing subsection '{subsection}' in income_statement")
-                    raise ValueError(f"Missing subsection '{subsection}' in income_statement")
-                if not isinstance(data['income_statement'][subsection], dict):
-                    logger.error(f"Error: Invalid format for '{subsection}', expected object but got {type(data['income_statement'][subsection])}")
-                    raise ValueError(f"Invalid format for '{subsection}' in income_statement")
-                for subcategory in subcategories:
-                    if subcategory not in data['income_statement'][subsection]:
-                        logger.warning(f"Warning: Missing subcategory '{subcategory}' in {subsection}, initializing as empty list")
-                        data['income_statement'][subsection][subcategory] = []
-                    if not isinstance(data['income_statement'][subsection][subcategory], list):
-                        logger.error(f"Error: Invalid format for '{subcategory}' in {subsection}, expected array but got {type(data['income_statement'][subsection][subcategory])}")
-                        raise ValueError(f"Invalid format for '{subcategory}' in {subsection}")
-            
-            # Function to convert value to numeric
-            def convert_to_numeric(value):
-                if isinstance(value, (int, float)):
-                    return value
-                try:
-                    # Remove currency symbols and commas
-                    cleaned_value = str(value).replace('$', '').replace(',', '').strip()
-                    # Handle empty or invalid values
-                    if not cleaned_value or cleaned_value.lower() in ['na', 'n/a', '-']:
-                        logger.warning(f"Warning: Empty or invalid value '{value}', defaulting to 0")
-                        return 0
-                    # Convert to float
-                    numeric_value = float(cleaned_value)
-                    logger.info(f"Successfully converted '{value}' to numeric value: {numeric_value}")
-                    return numeric_value
-                except (ValueError, TypeError) as e:
-                    logger.error(f"Error converting value '{value}' to numeric: {str(e)}")
-                    return 0
-            
-            # Process and validate numeric values recursively
-            def process_items(items):
-                for item in items:
-                    if not isinstance(item, dict) or 'name' not in item:
-                        logger.error(f"Error: Invalid item format: {item}")
-                        raise ValueError(f"Invalid item format")
-                    original_value = item.get('value', 0)
-                    item['value'] = convert_to_numeric(original_value)
-                    logger.info(f"Converted value for {item['name']}: {original_value} -> {item['value']}")
-            
-            # Process balance_sheet items
-            for subsection in ['assets', 'liabilities']:
-                for subcategory in ['current', 'non_current']:
-                    process_items(data['balance_sheet'][subsection][subcategory])
-            process_items(data['balance_sheet']['equity'])
-            
-            # Process income_statement items
-            for subsection in ['revenue', 'expenses']:
-                for subcategory in ['operating', 'non_operating']:
-                    process_items(data['income_statement'][subsection][subcategory])
-            
-            # Convert back to JSON string
-            result = json.dumps(data)
-            logger.info(f"Final processed data: {result}")
-            return result
-        except json.JSONDecodeError as e:
-            logger.error(f"Error decoding JSON: {str(e)}\nProblematic text: {cleaned_text}")
-            raise ValueError(f"Invalid JSON format: {str(e)}")
+            data = {first: extract_section(first, first_text, report)}
+            for statement, future in futures.items():
+                data[statement] = future.result()
+        finally:
+            for future in futures.values():
+                future.cancel()
+        report('validated')
+        return data
+    except (LLMUnavailableError, LLMCancelledError):
+        raise
     except Exception as e:
-        logger.error(f"Error in parse_financial_data: {str(e)}")
+        logger.error(f"Error in parse_financial_data_split: {str(e)}")
         raise Exception(f"Error processing financial data: {str(e)}")
 
-@app.route('/api/process-pdf', methods=['POST'])
-def process_pdf():
-    logger.info("\n=== Starting PDF Upload Process ===\nRequest Details:")
-    logger.info(f"Headers: {dict(request.headers)}")
-    logger.info(f"Content Type: {request.content_type}")
-    logger.info(f"Content Length: {request.content_length}")
-    logger.info(f"Files: {request.files}")
-    logger.info(f"Form Data: {request.form}")
-    
-    # Validate file presence
-    if 'file' not in request.files:
-        error_msg = 'No file provided in request'
-        logger.error(f"Error: {error_msg}")
-        return jsonify({'error': error_msg}), 400
-        
-    file = request.files['file']
-    logger.info(f"File received: {file.filename}")
-    logger.info(f"File content type: {file.content_type}")
-    
+class ProcessingError(Exception):
+    # An error that maps to a specific HTTP status in the PDF pipeline
+    def __init__(self, message, status_code=500, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def json_error(message, status_code, retry_after=None, **extra):
+    response = jsonify({'error': message, **extra})
+    response.status_code = status_code
+    if retry_after:
+        response.headers['Retry-After'] = str(max(1, round(retry_after)))
+    return response
+
+def validate_pdf_file(file):
+    # Returns None when the uploaded file is acceptable, otherwise (error message, status)
     # Validate filename
     if file.filename == '':
         error_msg = 'No file selected'
         logger.error(f"Error: {error_msg}")
-        return jsonify({'error': error_msg}), 400
+        return error_msg, 400
     
     # Validate file format
     if not file.filename.lower().endswith('.pdf'):
         error_msg = 'File must be a PDF'
         logger.error(f"Error: {error_msg} (received: {file.filename})")
-        return jsonify({'error': error_msg}), 400
+        return error_msg, 400
     
     # Validate file content type
     if file.content_type != 'application/pdf':
         error_msg = 'Invalid file type. Please upload a PDF file.'
         logger.error(f"Error: {error_msg} (received: {file.content_type})")
-        return jsonify({'error': error_msg}), 400
-    
-    # Validate file size (max 10MB)
-    max_size = 10 * 1024 * 1024  # 10MB in bytes
-    if request.content_length > max_size:
-        error_msg = 'File size exceeds maximum limit of 10MB'
-        logger.error(f"Error: {error_msg} (size: {request.content_length} bytes)")
-        return jsonify({'error': error_msg}), 400
+        return error_msg, 400
     
-    logger.info("=== File validation passed successfully ===")
+    # Validate file size. Oversized bodies were already refused with 413 before being read
+    # (MAX_CONTENT_LENGTH); this catches a file just over the limit inside the multipart framing
+    size = stream_size(file.stream)
+    if size > MAX_UPLOAD_BYTES:
+        logger.error(f"Error: file exceeds the upload limit (size: {size} bytes)")
+        return f'File size exceeds maximum limit of {MAX_UPLOAD_BYTES // (1024 * 1024)}MB', 413
     
-    try:
-        # Check if Gemini AI model is properly initialized
-        if not model:
-            error_msg = 'AI service is not available. Please check your API key configuration.'
-            logger.error(f"Error: {error_msg}")
-            return jsonify({'error': error_msg}), 503
+    return None
 
-        # Extract text from PDF
-        try:
-            logger.info("Starting text extraction from PDF...")
-            text = extract_text_from_pdf(file)
-            if not text.strip():
-                error_msg = 'No readable text found in the PDF. Please ensure the PDF contains text and not just images.'
-                logger.error(f"Error: {error_msg}")
-                return jsonify({'error': error_msg}), 400
-            logger.info(f"Successfully extracted {len(text)} characters from PDF")
-        except Exception as e:
-            error_msg = f'Error reading PDF file: {str(e)}. Please ensure the file is not corrupted and is a valid PDF.'
-            logger.error(f"Error during PDF extraction: {str(e)}")
-            return jsonify({'error': error_msg}), 400
+def validate_pdf_upload():
+    # Returns (file, None) when the upload is acceptable, otherwise (None, error response)
+    # Validate file presence; the first access to request.files parses the multipart body
+    with stage('upload_parse'):
+        has_file = 'file' in request.files
+    if not has_file:
+        error_msg = 'No file provided in request'
+        logger.error(f"Error: {error_msg}")
+        return None, (jsonify({'error': error_msg}), 400)
         
-        # Parse financial data using Gemini AI
-        try:
-            logger.info("Starting financial data parsing with Gemini AI...")
-            financial_data_str = parse_financial_data(text)
-            financial_data = json.loads(financial_data_str)
-            
-            # Additional validation of the extracted data
-            if not any(section for section in financial_data['balance_sheet'].values()) and \
-               not any(section for section in financial_data['income_statement'].values()):
-                error_msg = 'No financial data could be extracted from the PDF. Please ensure the document contains financial statements.'
-                logger.error(f"Error: {error_msg}")
-                return jsonify({'error': error_msg}), 400
-                
-            logger.info("Successfully processed and validated financial data")
-            return jsonify({'data': financial_data})
-        except json.JSONDecodeError as e:
-            error_msg = f'Invalid data format received: {str(e)}'
-            logger.error(f"JSON decode error: {str(e)}")
-            return jsonify({'error': error_msg}), 500
-        except ValueError as e:
-            error_msg = str(e)
-            logger.error(f"Validation error: {str(e)}")
-            return jsonify({'error': error_msg}), 400
-        except Exception as e:
-            error_msg = f'Error processing financial data: {str(e)}'
-            logger.error(f"Error during financial data processing: {str(e)}")
-            return jsonify({'error': error_msg}), 500
+    file = request.files['file']
+    error = validate_pdf_file(file)
+    if error:
+        return None, (jsonify({'error': error[0]}), error[1])
+    return file, None
+
+def parse_with_model(pages, filename, report):
+    # Gemini path: compact the document, call the model and validate its JSON
+    # Check if Gemini AI model is properly initialized
+    if not model:
+        error_msg = 'AI service is not available. Please check your API key configuration.'
+        logger.error(f"Error: {error_msg}")
+        raise ProcessingError(error_msg, 503)
+
+    # Send only the statement pages, without repeated headers/footers, within the token budget.
+    # In split mode each statement gets its own pages and its own model call; a report whose
+    # statement pages cannot all be found goes through the combined prompt instead
+    sections = None
+    with stage('prompt_build'):
+        if EXTRACTION_MODE == 'split':
+            sections = compact_statement_pages(pages, token_budget=PROMPT_TOKEN_BUDGET)
+        if sections is None:
+            text, compaction = compact_pages(pages, token_budget=PROMPT_TOKEN_BUDGET)
+    if sections is None:
+        logger.info("Compacted %s: %d -> %d chars, ~%d -> ~%d tokens, %d/%d pages kept", filename,
+                    compaction['chars_before'], compaction['chars_after'], compaction['tokens_before'],
+                    compaction['tokens_after'], compaction['pages_selected'], compaction['pages_total'])
+        report('compacted', characters=compaction['chars_before'], compacted_characters=compaction['chars_after'])
+    else:
+        for statement, (_, compaction) in sections.items():
+            logger.info("Compacted %s for the %s: %d -> %d chars, ~%d tokens, %d/%d pages kept", filename,
+                        statement, compaction['chars_before'], compaction['chars_after'], compaction['tokens_after'],
+                        compaction['pages_selected'], compaction['pages_total'])
+        report('compacted', characters=compaction['chars_before'],
+               compacted_characters=sum(stats['chars_after'] for _, stats in sections.values()))
+
+    # The model is only called with enough of the budget left to answer; once it has answered,
+    # the result is kept and cached even if the client has gone
+    checkpoint('llm_call', reserve=MIN_LLM_SECONDS)
+
+    # Parse financial data using Gemini AI
+    try:
+        if sections is not None:
+            return parse_financial_data_split({statement: text for statement, (text, _) in sections.items()},
+                                              progress=report)
+        return parse_financial_data(text, progress=report)
+    except LLMCancelledError as e:
+        raise current_deadline().error(e.reason, 'llm_call')
+    except LLMUnavailableError as e:
+        logger.warning(f"AI service unavailable: {str(e)}")
+        raise ProcessingError('AI service is busy. Please try again shortly.', 503, retry_after=e.retry_after)
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise ProcessingError(str(e), 400)
+    except Exception as e:
+        logger.error(f"Error during financial data processing: {str(e)}")
+        raise ProcessingError(f'Error processing financial data: {str(e)}', 500)
+
+def label_document(document_id, filename, company, period, found):
+    # Company and period of a document: as given, else as stored earlier, else `found` on the
+    # report's first pages when it was processed (the period in the file name wins there).
+    # Returns (company, period, stored document or None)
+    try:
+        stored = statement_store.get_document(document_id)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not look up {document_id[:12]} in the statement store: {str(e)}")
+        stored = None
+    if stored:
+        company, period = company or stored['company'], period or stored['period']
+    if company is None or period is None:
+        named_period = describe_pages([], filename)[1]
+        company, period = company or found[0], period or named_period or found[1]
+    return company, period, stored
+
+def store_statements(records):
+    # Persisting is best effort: the upload has succeeded whether or not its line items are stored
+    if not records:
+        return
+    try:
+        with stage('statement_store'):
+            added = statement_store.put_many(records)
+        registry.inc('brm_statement_store_writes_total', added, result='new')
+        registry.inc('brm_statement_store_writes_total', len(records) - added, result='updated')
+    except sqlite3.Error as e:
+        registry.inc('brm_statement_store_writes_total', len(records), result='failed')
+        logger.error(f"Could not store the statements of {len(records)} document(s): {str(e)}")
+
+def process_document(pdf_stream, filename, progress=None, company=None, period=None, pending=None):
+    # Full pipeline for one uploaded PDF: cache lookup, extraction, local or Gemini parsing and validation.
+    # Returns (financial_data, details) where details describes the cache and parser used and the
+    # company and period; raises ProcessingError on failure. The line items are stored in the
+    # statement store, or appended to `pending` for the caller to store in one transaction.
+    report = progress or (lambda stage, **details: None)
+
+    def finish(financial_data, pdf_digest, details, found):
+        document_id = document_store.put(financial_data, source_digest=pdf_digest)
+        labels = label_document(document_id, filename, company, period, found)
+        stored = labels[2]
+        if stored is None or (stored['company'], stored['period']) != labels[:2]:
+            record = {'document_id': document_id, 'financial_data': financial_data, 'source_digest': pdf_digest,
+                      'company': labels[0], 'period': labels[1], 'filename': filename,
+                      'parser': details['parser']['name'] if details['parser'] else None}
+            if pending is None:
+                store_statements([record])
+            else:
+                pending.append(record)
+        return financial_data, dict(details, document_id=document_id, company=labels[0], period=labels[1])
+
+    # Serve repeat uploads of the same document straight from the result cache
+    with stage('cache_lookup'):
+        pdf_digest = digest_stream(pdf_stream)
+        cache_key = result_cache.make_key(pdf_digest, MODEL_NAME, PROMPT_VERSION)
+        cached, cache_tier = result_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Result cache hit (%s) for %s", cache_tier, pdf_digest[:12])
+        report('cache_hit', tier=cache_tier)
+        # Entries written before the labels were cached hold the bare financial_data; the PDF
+        # is not opened again for them, so only the period in the file name is known
+        if 'financial_data' in cached:
+            cached_data, found = cached['financial_data'], (cached['company'], cached['period'])
+        else:
+            cached_data, found = cached, (None, None)
+        return finish(cached_data, pdf_digest,
+                      {'cache': {'status': 'hit', 'tier': cache_tier, 'digest': pdf_digest}, 'parser': None}, found)
+    logger.info("Result cache miss for %s", pdf_digest[:12])
+
+    # Extract text from PDF
+    checkpoint('pdf_extract')
+    try:
+        report('extracting')
+        with stage('pdf_extract'):
+            pages = extract_pages_from_pdf(pdf_stream, filename,
+                                           on_page=lambda done: done % 10 == 0 and report('extracting', pages=done))
+    except RequestCancelled:
+        raise
+    except Exception as e:
+        error_msg = f'Error reading PDF file: {str(e)}. Please ensure the file is not corrupted and is a valid PDF.'
+        logger.error(f"Error during PDF extraction: {str(e)}")
+        raise ProcessingError(error_msg, 400)
+    if not any(page.strip() for page in pages):
+        error_msg = 'No readable text found in the PDF. Please ensure the PDF contains text and not just images.'
+        logger.error(f"Error: {error_msg}")
+        raise ProcessingError(error_msg, 400)
+    report('extracted', pages=len(pages))
+
+    # Standard Schedule III statements can be read by rules alone; Gemini is only needed below the threshold
+    checkpoint('local_parse')
+    try:
+        with stage('local_parse'):
+            local_data, confidence, unmapped = parse_statements(pages)
+    except Exception as e:
+        logger.warning(f"Local parser failed for {filename}: {str(e)}")
+        local_data, confidence, unmapped = None, 0.0, []
+    logger.info("Local parser confidence for %s: %s (%d unmapped lines)", filename, confidence, len(unmapped))
+
+    if local_data is not None and confidence >= LOCAL_PARSER_THRESHOLD:
+        report('parsed_locally', confidence=confidence)
+        financial_data = local_data
+        parser_info = {'name': 'local', 'confidence': confidence}
+    else:
+        financial_data = parse_with_model(pages, filename, report)
+        parser_info = {'name': 'llm', 'local_confidence': confidence}
+
+    # Additional validation of the extracted data
+    if not any(section for section in financial_data['balance_sheet'].values()) and \
+       not any(section for section in financial_data['income_statement'].values()):
+        error_msg = 'No financial data could be extracted from the PDF. Please ensure the document contains financial statements.'
+        logger.error(f"Error: {error_msg}")
+        raise ProcessingError(error_msg, 400)
+
+    # The company and period on the first pages are cached with the result, None when they were
+    # looked for and not found, so a repeat upload is labelled without opening the PDF again
+    found = describe_pages(pages[:3])
+    result_cache.set(cache_key, {'financial_data': financial_data, 'company': found[0], 'period': found[1]})
+    return finish(financial_data, pdf_digest,
+                  {'cache': {'status': 'miss', 'tier': None, 'digest': pdf_digest}, 'parser': parser_info}, found)
+
+def cancelled_response(error):
+    logger.warning(f"Stopped request: {str(error)}")
+    return jsonify(cancelled_response_body(error)), error.status_code
+
+@app.route('/api/process-pdf', methods=['POST'])
+def process_pdf():
+    file, error_response = validate_pdf_upload()
+    if error_response:
+        return error_response
+    try:
+        deadline = request_deadline()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        with deadline_scope(deadline):
+            financial_data, details = process_document(file.stream, file.filename, **upload_labels())
+        with stage('serialization'):
+            return jsonify({'data': financial_data, **details})
+    except RequestCancelled as e:
+        return cancelled_response(e)
+    except ProcessingError as e:
+        return json_error(str(e), e.status_code, e.retry_after)
     except Exception as e:
         error_msg = f'Unexpected error: {str(e)}'
         logger.error(f"Unexpected error during processing: {str(e)}")
         return jsonify({'error': error_msg}), 500
 
-@app.route('/api/chat', methods=['POST'])
-def chat():
+def upload_labels():
+    # Optional "company" and "period" form fields naming the uploaded report; read from it when absent
+    return {name: (request.form.get(name) or '').strip() or None for name in ('company', 'period')}
+
+def run_document_job(progress, pdf_path, filename, labels):
+    # Job body for asynchronous uploads; owns and removes the spooled upload
     try:
-        data = request.get_json()
-        if not data or 'message' not in data or 'financial_data' not in data:
-            return jsonify({'error': 'Invalid request data'}), 400
+        with open(pdf_path, 'rb') as pdf_stream:
+            financial_data, details = process_document(pdf_stream, filename, progress=progress, **labels)
+        return {'data': financial_data, **details}
+    finally:
+        try:
+            os.remove(pdf_path)
+        except OSError:
+            pass
 
-        message = data['message']
-        financial_data = data['financial_data']
+def spool_upload(file):
+    # Copies an upload to a named temporary file the caller must remove
+    spooled = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    with spooled:
+        file.save(spooled)
+    return spooled.name
 
-        # Company information for context
-        company_info = """
-        Shubh Sawariya Industries Private Limited is a manufacturing company based in Jamshedpur, Jharkhand, India.
-        Established in 2019 (Jamshedpur location), the company manufactures and supplies food carts, food vans, push carts, and kiosks.
-        The company is directed by Mr. Nishant Agarwal with an employee count between 50-100.
-        Annual turnover: Below Rs. 0.5 Crore.
-        The company holds ISO 9001:2015 certification for quality management.
-        """
+def format_sse(data, event=None):
+    message = f"event: {event}\n" if event else ''
+    return f"{message}data: {json.dumps(data)}\n\n"
 
-        # Prepare prompt for financial analysis with company context and markdown formatting
-        prompt = f"""Analyze the following financial data for Shubh Sawariya Industries and answer this question: {message}
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    file, error_response = validate_pdf_upload()
+    if error_response:
+        return error_response
 
-        Company Context:
-        {company_info}
+    # The request stream is gone once we return, so the job gets its own copy of the upload
+    spooled_path = spool_upload(file)
+    try:
+        job_id = job_manager.submit(run_document_job, spooled_path, file.filename, upload_labels())
+    except QueueFullError as e:
+        os.remove(spooled_path)
+        logger.warning(f"Rejected job: {str(e)}")
+        return jsonify({'error': 'Server is busy. Please try again shortly.'}), 503
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'events_url': f'/api/jobs/{job_id}/events',
+    }), 202
 
-        Financial Data:
-        {json.dumps(financial_data, indent=2)}
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    body = {key: job[key] for key in ('id', 'status', 'created_at', 'started_at', 'finished_at', 'error')}
+    body['progress'] = job['events'][-1] if job['events'] else None
+    if job['status'] == 'succeeded':
+        body.update(job['result'])
+    return jsonify(body), (job['status_code'] if job['status'] == 'failed' else 200)
 
-        If the question is about WACC (Weighted Average Cost of Capital), calculate it using this formula:
-        WACC = (E/V) * Re + (D/V) * Rd * (1-Tc)
-        Where:
-        - E = Market value of equity
-        - D = Market value of debt
-        - V = Total value of the firm (E + D)
-        - Re = Cost of equity (use CAPM if possible, otherwise assume 10-15%)
-        - Rd = Cost of debt (use average interest rate if available, otherwise assume 8-10%)
-        - Tc = Corporate tax rate (assume 30% if not specified)
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    if job_manager.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        for event in job_manager.iter_events(job_id):
+            # Comment lines keep proxies from closing an idle stream
+            yield ': keep-alive\n\n' if event is None else format_sse(event, event='progress')
+        yield format_sse(job_manager.get(job_id)['status'], event='end')
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(job_manager.stats())
+
+@app.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify(llm.stats())
+
+@app.route('/api/admission', methods=['GET'])
+def admission_stats():
+    return jsonify(dict(admission.stats(), enabled=True) if admission else {'enabled': False})
+
+@app.route('/api/profiles', methods=['GET'])
+def recent_profiles():
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        limit = query_int('limit', 20, 200)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'profiles': profiles.recent(limit)})
+
+@app.route('/api/profiles/<request_id>', methods=['GET'])
+def get_profile(request_id):
+    # The summary with the top functions, or the raw file with ?format=pstats|collapsed
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    kind = request.args.get('format')
+    if kind in ('pstats', 'collapsed'):
+        found = profiles.file(request_id, kind)
+        if found is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        path, mimetype = found
+        return send_file(path, mimetype=mimetype, as_attachment=True, download_name=os.path.basename(path))
+    summary = profiles.get(request_id)
+    if summary is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify(summary)
+
+def run_batch_document(index, pdf_path, filename, company, period, pending):
+    # One report of a batch; owns and removes the spooled upload. Failures are reported, not raised,
+    # so the other reports still finish
+    started = time.perf_counter()
+    result = {'index': index, 'filename': filename, 'period': period}
+    try:
+        with open(pdf_path, 'rb') as pdf_stream:
+            financial_data, details = process_document(pdf_stream, filename, company=company, period=period,
+                                                       pending=pending)
+        result.update(status='succeeded', data=financial_data, **details)
+    except RequestCancelled as e:
+        result.update(status='failed', error=str(e), status_code=e.status_code, stage=e.stage)
+    except ProcessingError as e:
+        result.update(status='failed', error=str(e), status_code=e.status_code)
+    except Exception as e:
+        logger.error(f"Unexpected error processing {filename} in batch: {str(e)}")
+        result.update(status='failed', error=f'Unexpected error: {str(e)}', status_code=500)
+    finally:
+        try:
+            os.remove(pdf_path)
+        except OSError:
+            pass
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def merge_batch(results):
+    # Period labels for every report (detected, given, or the file name) and the comparative view
+    succeeded = sorted((result for result in results if result['status'] == 'succeeded'),
+                       key=lambda result: result['index'])
+    labels = unique_labels([result['period'] or os.path.splitext(result['filename'])[0] for result in succeeded])
+    for result, label in zip(succeeded, labels):
+        result['period'] = label
+    return build_comparative({label: result['data'] for label, result in zip(labels, succeeded)})
+
+@app.route('/api/batch', methods=['POST'])
+def process_batch():
+    # Several annual reports ("files" fields, optional "periods" labels in the same order) processed
+    # concurrently and merged into one period-indexed dataset
+    with stage('upload_parse'):
+        files = request.files.getlist('files') or request.files.getlist('file')
+    if not files:
+        return jsonify({'error': 'No files provided in request'}), 400
+    if len(files) > MAX_BATCH_FILES:
+        return jsonify({'error': f'At most {MAX_BATCH_FILES} files can be processed together'}), 400
+    periods = [label.strip() or None for label in request.form.get('periods', '').split(',')] \
+        if request.form.get('periods') else []
+    if periods and len(periods) != len(files):
+        return jsonify({'error': 'Provide one period label per file'}), 400
+    for file in files:
+        error = validate_pdf_file(file)
+        if error:
+            return jsonify({'error': error[0], 'filename': file.filename}), error[1]
+
+    streaming = request.form.get('stream') in ('1', 'true') or request.accept_mimetypes.best == 'text/event-stream'
+    # A streamed batch keeps its connection busy with events, so only a client-set budget applies;
+    # either way every report stops once the client has gone
+    try:
+        deadline = request_deadline(default=0 if streaming else REQUEST_DEADLINE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Uploads are copied out of the request so they outlive it while the response streams
+    spooled = [spool_upload(file) for file in files]
+    company = upload_labels()['company']
+    # Line items of the whole batch are stored together once every report has finished
+    pending = []
+    started = time.perf_counter()
+    with deadline_scope(deadline):
+        futures = [batch_executor.submit(contextvars.copy_context().run, run_batch_document, index, path,
+                                         file.filename, company, periods[index] if periods else None, pending)
+                   for index, (file, path) in enumerate(zip(files, spooled))]
+
+    def summary(results):
+        store_statements(pending)
+        return {'comparative': merge_batch(results),
+                'documents': [{key: value for key, value in result.items() if key != 'data'}
+                              for result in sorted(results, key=lambda result: result['index'])],
+                'wall_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    if not streaming:
+        results = [future.result() for future in futures]
+        # Fails as a whole only when no report could be processed
+        succeeded = any(result['status'] == 'succeeded' for result in results)
+        return jsonify(summary(results)), (200 if succeeded else results[0]['status_code'])
+
+    def generate():
+        # A `document` event as each report finishes, then `result` with the merged dataset
+        results = []
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            yield format_sse(result, event='document')
+        yield format_sse(summary(results), event='result')
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Bump whenever build_chat_prompt or COMPANY_INFO changes so cached answers are not reused
+CHAT_PROMPT_VERSION = '1'
+
+# Company information for chat context
+COMPANY_INFO = """
+Shubh Sawariya Industries Private Limited is a manufacturing company based in Jamshedpur, Jharkhand, India.
+Established in 2019 (Jamshedpur location), the company manufactures and supplies food carts, food vans, push carts, and kiosks.
+The company is directed by Mr. Nishant Agarwal with an employee count between 50-100.
+Annual turnover: Below Rs. 0.5 Crore.
+The company holds ISO 9001:2015 certification for quality management.
+"""
+
+def build_chat_prompt(message, context, metrics):
+    # Prepare prompt for financial analysis with company context and markdown formatting.
+    # `context` is the compact rendering from render_context, built once per document, and the
+    # ratios are precomputed so the model explains numbers instead of doing arithmetic.
+    assumptions = metrics['ratios']['wacc_inputs']
+    return f"""Analyze the following financial data for Shubh Sawariya Industries and answer this question: {message}
+
+        Company Context:
+        {COMPANY_INFO}
 
-        For debt-to-equity ratio, calculate Total Debt / Total Equity.
+        Financial Data (amounts per line item, grouped by section):
+        {context}
+
+        Precomputed metrics from book values (WACC uses a {assumptions['cost_of_equity'] * 100:.0f}% cost of equity,
+        a {assumptions['cost_of_debt'] * 100:.2f}% {assumptions['cost_of_debt_source']} cost of debt and a {assumptions['tax_rate'] * 100:.0f}% tax rate).
+        Use these figures rather than recalculating them:
+        {render_metrics(metrics)}
 
         Please provide a clear, concise answer focusing on the specific financial metrics requested.
         Format your response using markdown for better readability:
@@ -460,9 +858,154 @@ def chat():
 
         If the question cannot be answered with the available data, explain what additional information would be needed."""
 
+def stream_text_response(text, **metadata):
+    # SSE for answers that need no model call, in the same shape as stream_chat_response
+    yield format_sse({'text': text}, event='delta')
+    yield format_sse(dict(ttft_ms=0.0, total_ms=0.0, chunks=1, **metadata), event='done')
+
+def usage_counts(response, prompt, output_text):
+    # Token counts from the API when it reports them, otherwise estimated from text length
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        return {'prompt_tokens': getattr(usage, 'prompt_token_count', None),
+                'output_tokens': getattr(usage, 'candidates_token_count', None),
+                'estimated': False}
+    return {'prompt_tokens': estimate_tokens(prompt), 'output_tokens': estimate_tokens(output_text), 'estimated': True}
+
+def stream_chat_response(prompt, on_complete=None, deadline=None, **metadata):
+    # Server-Sent Events: one `delta` event per model chunk, then `done` with token counts and timings.
+    # `on_complete(text)` receives the whole answer once the model has finished
+    started = time.perf_counter()
+    first_chunk_at = None
+    parts = []
+    response = None
+    try:
+        response = llm.generate_stream(prompt, deadline=deadline)
+        for chunk in response:
+            text = chunk.text
+            if not text:
+                continue
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+                registry.observe('brm_llm_ttft_seconds', first_chunk_at - started)
+            parts.append(text)
+            yield format_sse({'text': text}, event='delta')
+    except LLMUnavailableError as e:
+        logger.warning(f"AI service unavailable: {str(e)}")
+        yield format_sse({'error': 'AI service is busy. Please try again shortly.',
+                          'retry_after': round(e.retry_after or 0, 1)}, event='error')
+        return
+    except LLMCancelledError as e:
+        error = deadline.error(e.reason, 'llm_call')
+        logger.warning(f"Stopped request: {str(error)}")
+        yield format_sse(cancelled_response_body(error), event='error')
+        return
+    except Exception as e:
+        logger.error(f"Error streaming AI response: {str(e)}")
+        yield format_sse({'error': 'Failed to generate response'}, event='error')
+        return
+
+    total_ms = round((time.perf_counter() - started) * 1000, 1)
+    ttft_ms = round((first_chunk_at - started) * 1000, 1) if first_chunk_at else None
+    output_text = ''.join(parts)
+    record_stage('llm_call', total_ms / 1000)
+    logger.info("Streamed chat response: ttft %s ms, total %s ms, %d chunks", ttft_ms, total_ms, len(parts))
+    if on_complete and output_text:
+        on_complete(output_text)
+    yield format_sse(dict(metadata, **{
+        'ttft_ms': ttft_ms,
+        'total_ms': total_ms,
+        'chunks': len(parts),
+        'usage': usage_counts(response, prompt, output_text),
+    }), event='done')
+
+def answer_cache_mode(data):
+    # 'use' (default), 'refresh' (ask the model again and store the new answer) or 'off' (neither
+    # read nor write), from the request's "cache" field or its Cache-Control no-cache / no-store
+    if answer_cache is None:
+        return 'off'
+    mode = data.get('cache')
+    if mode in ('use', 'refresh', 'off'):
+        return mode
+    if mode is False or request.cache_control.no_store:
+        return 'off'
+    return 'refresh' if request.cache_control.no_cache else 'use'
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    try:
+        data = request.get_json()
+        if not data or 'message' not in data or ('document_id' not in data and 'financial_data' not in data):
+            return jsonify({'error': 'Invalid request data'}), 400
+
+        message = data['message']
+        if 'document_id' in data:
+            document = document_store.get(data['document_id'])
+            if document is None:
+                return jsonify({'error': 'Document session expired. Please upload the document again.',
+                                'code': 'document_expired'}), 404
+            context, metrics = document['context'], document['metrics']
+            digest = data['document_id']
+        else:
+            # Older clients still send the whole structure with every question
+            context, metrics = render_context(data['financial_data']), compute_metrics(data['financial_data'])
+            digest = document_key(data['financial_data'])
+        streaming = data.get('stream') or request.accept_mimetypes.best == 'text/event-stream'
+
+        # Questions about a single standard metric are answered from the metrics engine directly
+        metric = match_metric_question(message)
+        if metric:
+            answer = answer_metric_question(metric, metrics)
+            if streaming:
+                return Response(stream_text_response(answer, source='metrics', metric=metric),
+                                mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+            return jsonify({'response': answer, 'source': 'metrics', 'metric': metric})
+
+        # Repeat questions about the same statements are answered from the answer cache
+        cache_mode = answer_cache_mode(data)
+        if cache_mode != 'off':
+            answer_key = answer_cache.make_key(digest, normalize_question(message), MODEL_NAME, CHAT_PROMPT_VERSION)
+        if cache_mode == 'use':
+            with stage('answer_cache'):
+                cached, tier = answer_cache.get(answer_key)
+            if cached is not None:
+                cache_info = {'status': 'hit', 'tier': tier}
+                if streaming:
+                    return Response(stream_text_response(cached['response'], source='cache', cache=cache_info),
+                                    mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+                return jsonify({'response': cached['response'], 'source': 'cache', 'cache': cache_info})
+        cache_info = {'status': 'miss' if cache_mode == 'use' else cache_mode}
+
+        def remember(text):
+            if cache_mode != 'off':
+                answer_cache.set(answer_key, {'response': text, 'created_at': time.time()})
+
         try:
-            response = model.generate_content(prompt)
-            return jsonify({'response': response.text})
+            deadline = request_deadline()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with stage('prompt_build'):
+            prompt = build_chat_prompt(message, context, metrics)
+
+        # Streaming is opt-in so existing JSON clients keep working
+        if streaming:
+            if not model:
+                return jsonify({'error': 'AI service is not available. Please check your API key configuration.'}), 503
+            return Response(stream_chat_response(prompt, on_complete=remember, deadline=deadline, cache=cache_info),
+                            mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        try:
+            with stage('llm_call'):
+                response = llm.generate(prompt, deadline=deadline)
+            if response.text:
+                remember(response.text)
+            return jsonify({'response': response.text, 'cache': cache_info})
+        except LLMCancelledError as e:
+            return cancelled_response(deadline.error(e.reason, 'llm_call'))
+        except LLMUnavailableError as e:
+            logger.warning(f"AI service unavailable: {str(e)}")
+            return json_error('AI service is busy. Please try again shortly.', 503, e.retry_after)
         except Exception as e:
             logger.error(f"Error generating AI response: {str(e)}")
             return jsonify({'error': 'Failed to generate response'}), 500
@@ -471,21 +1014,242 @@ def chat():
         logger.error(f"Error in chat endpoint: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/metrics/<document_id>', methods=['GET'])
+def document_metrics(document_id):
+    document = document_store.get(document_id)
+    if document is None:
+        return jsonify({'error': 'Document not found', 'code': 'document_expired'}), 404
+    return jsonify(document['metrics'])
+
+@app.route('/api/metrics', methods=['POST'])
+def metrics():
+    # Accepts a document_id, a financial_data structure, or {"periods": {label: financial_data}},
+    # with optional {"assumptions": {"cost_of_equity", "cost_of_debt", "tax_rate"}}
+    data = request.get_json(silent=True) or {}
+    assumptions = data.get('assumptions') or {}
+    if not isinstance(assumptions, dict) or \
+       not all(key in ('cost_of_equity', 'cost_of_debt', 'tax_rate') and isinstance(value, (int, float))
+               for key, value in assumptions.items()):
+        return jsonify({'error': 'Invalid assumptions'}), 400
+
+    if isinstance(data.get('periods'), dict) and data['periods']:
+        return jsonify(compute_period_metrics(data['periods'], assumptions))
+    if 'document_id' in data:
+        document = document_store.get(data['document_id'])
+        if document is None:
+            return jsonify({'error': 'Document not found', 'code': 'document_expired'}), 404
+        financial_data = document['financial_data']
+    elif isinstance(data.get('financial_data'), dict):
+        financial_data = data['financial_data']
+    else:
+        return jsonify({'error': 'Invalid request data'}), 400
+    return jsonify(compute_metrics(financial_data, assumptions))
+
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    return jsonify({'result_cache': result_cache.stats(), 'document_store': document_store.stats(),
+                    'answer_cache': answer_cache.stats() if answer_cache else None})
+
+@app.route('/api/cache/answers', methods=['DELETE'])
+def invalidate_answers():
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({'invalidated': answer_cache.invalidate() if answer_cache else 0})
+
+@app.route('/api/cache', methods=['DELETE'])
+@app.route('/api/cache/<pdf_digest>', methods=['DELETE'])
+def invalidate_cache(pdf_digest=None):
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    if pdf_digest is None:
+        removed = result_cache.invalidate()
+    else:
+        removed = result_cache.invalidate(result_cache.make_key(pdf_digest, MODEL_NAME, PROMPT_VERSION))
+    return jsonify({'invalidated': removed})
+
+def query_values(name, split=True):
+    # Repeated parameters, or comma-separated values: ?period=FY2023&period=FY2024 or ?period=FY2023,FY2024.
+    # Company names may contain commas, so those are only taken repeated
+    values = request.args.getlist(name)
+    if split:
+        values = [value for raw in values for value in raw.split(',')]
+    return [value.strip() for value in values if value.strip()]
+
+def query_int(name, default, maximum):
+    value = request.args.get(name, '')
+    if not value:
+        return default
+    if not value.isdigit():
+        raise ValueError(f'{name} must be a non-negative integer')
+    return min(int(value), maximum)
+
+def statement_filters():
+    # Filters shared by the /api/statements endpoints; raises ValueError for unknown values
+    filters = {'company': query_values('company', split=False), 'period': query_values('period'),
+               'category': query_values('category'), 'statement': query_values('statement'),
+               'item': query_values('item'), 'document_id': query_values('document_id'),
+               'source_digest': query_values('digest'),
+               # Superseded documents (an older upload of the same company and period) only on request
+               'latest': request.args.get('all') not in ('1', 'true')}
+    unknown = [value for value in filters['category'] if value not in CATEGORIES] + \
+              [value for value in filters['statement'] if value not in STATEMENTS]
+    if unknown:
+        raise ValueError(f"Unknown category or statement: {', '.join(unknown)}")
+    return filters
+
+@app.route('/api/statements', methods=['GET'])
+def query_statements():
+    # Stored line items matching the filters, newest documents first, or with ?group_by=period,category
+    # their count, sum, mean, min and max per group
+    try:
+        filters = statement_filters()
+        group_by = query_values('group_by')
+        if any(name not in GROUP_COLUMNS for name in group_by):
+            raise ValueError(f"group_by accepts {', '.join(GROUP_COLUMNS)}")
+        limit = query_int('limit', 200, 5000)
+        offset = query_int('offset', 0, 10 ** 9)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with stage('statement_query'):
+        if group_by:
+            return jsonify({'group_by': group_by, 'groups': statement_store.aggregate(filters, group_by, limit)})
+        items = statement_store.line_items(filters, limit, offset)
+    return jsonify({'items': items, 'limit': limit, 'offset': offset})
+
+@app.route('/api/statements/documents', methods=['GET'])
+def query_statement_documents():
+    try:
+        filters = statement_filters()
+        limit = query_int('limit', 100, 1000)
+        offset = query_int('offset', 0, 10 ** 9)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with stage('statement_query'):
+        documents = statement_store.documents(filters, limit, offset)
+    return jsonify({'documents': documents, 'limit': limit, 'offset': offset})
+
+@app.route('/api/statements/compare', methods=['GET'])
+def compare_statements():
+    # Stored statements of one company (or of the given documents) aligned across periods with their
+    # metrics, as /api/batch returns them, without reprocessing any report
+    try:
+        filters = statement_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not filters['company'] and not filters['document_id']:
+        return jsonify({'error': 'Provide a company or document_id'}), 400
+    with stage('statement_query'):
+        periods, sources = statement_store.statements(filters)
+    if not periods:
+        return jsonify({'error': 'No stored statements match'}), 404
+    return jsonify(dict(build_comparative(periods), documents=sources))
+
+@app.route('/api/statements/stats', methods=['GET'])
+def statement_stats():
+    return jsonify(statement_store.stats())
+
+@app.route('/api/statements/<document_id>', methods=['DELETE'])
+def delete_statements(document_id):
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({'deleted': statement_store.delete(document_id)})
+
+@app.errorhandler(sqlite3.Error)
+def statement_store_error(e):
+    logger.error(f"Statement store error: {str(e)}")
+    return jsonify({'error': 'Stored statements are unavailable. Please try again shortly.'}), 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Prometheus text format, summed over all gunicorn workers
+    registry.write_snapshot(force=True)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the worker is up and answering; nothing else is checked
+    return jsonify({'status': 'ok', 'pid': os.getpid(), 'uptime_seconds': round(time.time() - STARTED_AT, 1)})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: the model backend can be used and the shared state directories are writable
+    model_ok = bool(model)
+    checks = {'model': dict(model.status(), ok=model_ok)}
+    directories = {'result_cache': result_cache.directory, 'document_store': document_store.directory,
+                   'statement_store': statement_store.directory, 'jobs': job_manager.directory,
+                   'metrics': registry.directory}
+    if answer_cache:
+        directories['answer_cache'] = answer_cache.directory
+    for name, directory in directories.items():
+        checks[name] = {'ok': os.access(directory, os.W_OK)}
+    queue_stats = job_manager.stats()
+    checks['job_queue'] = {'ok': queue_stats['queue_depth'] < queue_stats['max_queue'],
+                           'depth': queue_stats['queue_depth']}
+    # Reported but not failed on: every instance shares the same Gemini quota, so taking
+    # this one out of rotation would not help
+    checks['llm_breaker'] = {'ok': True, 'state': llm.stats()['breaker']}
+
+    ready = all(check['ok'] for check in checks.values())
+    return jsonify({'status': 'ready' if ready else 'unavailable', 'checks': checks,
+                    'warm_up_ms': warm_up_ms}), (200 if ready else 503)
+
 @app.route('/')
 def index():
-    return send_from_directory('.', 'index.html')
+    return static_assets.index.response(REVALIDATE)
+
+@app.route(ASSET_PREFIX + '<name>')
+def serve_asset(name):
+    # Fingerprinted URLs never change content, so browsers keep them for a year
+    asset = static_assets.fingerprinted.get(name)
+    if asset is None:
+        abort(404)
+    return asset.response(IMMUTABLE)
 
 @app.route('/styles.css')
 def serve_css():
-    return send_from_directory('.', 'styles.css')
+    return static_assets.files['styles.css'].response(REVALIDATE)
 
 @app.route('/script.js')
 def serve_js():
-    return send_from_directory('.', 'script.js')
+    return static_assets.files['script.js'].response(REVALIDATE)
 
 @app.route('/shubh_logo.png')
 def serve_logo():
-    return send_from_directory('.', 'shubh_logo.png')
+    return static_assets.files['shubh_logo.png'].response(REVALIDATE)
+
+# A small balance sheet and statement of profit and loss for the warm-up
+WARM_UP_PAGES = [
+    ['Balance Sheet as at 31 March 2024', 'EQUITY AND LIABILITIES', 'Share Capital   50,00,000   50,00,000',
+     'Reserves and Surplus   32,50,000   30,00,000', 'Current Liabilities', 'Trade Payables   21,00,000   19,00,000',
+     'ASSETS', 'Non-Current Assets', 'Property, Plant and Equipment   89,00,000   85,00,000', 'Current Assets',
+     'Inventories   14,50,000   14,00,000'],
+    ['Statement of Profit and Loss for the year ended 31 March 2024',
+     'Revenue from Operations   1,85,00,000   1,70,00,000', 'Other Income   4,20,000   3,00,000', 'Expenses',
+     'Cost of Materials Consumed   98,00,000   90,00,000', 'Finance Costs   5,60,000   5,00,000',
+     'Other Expenses   19,00,000   18,00,000'],
+]
+
+
+def warm_up():
+    # Runs PDF parsing, the local parser, page compaction, JSON normalisation and prompt
+    # building once on a small report, so the first upload does not pay for lazy
+    # imports and cold code paths, and builds the model backend. With a preloading gunicorn
+    # master this happens once before the workers fork and they inherit the result.
+    started = time.perf_counter()
+    pages = list(iter_page_texts(io.BytesIO(text_pdf(WARM_UP_PAGES)), max_workers=1, offload=False))
+    data, _, _ = parse_statements(pages)
+    text, _ = compact_pages(pages, token_budget=PROMPT_TOKEN_BUDGET)
+    estimate_tokens(EXTRACTION_PROMPT + text)
+    if EXTRACTION_MODE == 'split':
+        compact_statement_pages(pages, token_budget=PROMPT_TOKEN_BUDGET)
+    data, _ = normalize_financial_data(parse_model_json(json.dumps(data))[0])
+    build_chat_prompt('warm-up', render_context(data), compute_metrics(data))
+    model.get()
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Warm-up finished in %.1f ms", elapsed_ms)
+    return elapsed_ms
+
+warm_up_ms = warm_up() if STARTUP_WARMUP else None
 
 if __name__ == '__main__':
     logger.info("\n* Server is ready to process PDF uploads and chat! You can now upload your financial documents and ask questions.")
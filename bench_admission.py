@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_load import CHAT_QUESTIONS, free_port, multipart_body, start_server
+from synthetic_pdf import financial_statement_pdf
+
+# Load shedding under gunicorn with the fake model, admission control off and on.
+#
+# "noisy neighbour": one client floods /api/process-pdf while another asks a chat question
+# every half second. Without admission control the flood takes every worker thread and model
+# slot and the chat client waits behind it; with it the flood is answered 429 within
+# milliseconds once its bucket is empty, and the chat client keeps its normal latency.
+# "crowd": many clients upload one report each at the same moment. The global bucket
+# admits its burst, queues what it can serve within ADMISSION_MAX_WAIT and answers 503 to
+# the rest, all with Retry-After. Clients are told apart by X-Forwarded-For.
+#
+# Usage: python bench_admission.py --flood 96 --flood-concurrency 24 --crowd 32 --fake-latency 1.0
+
+
+def send(url, client, body=None, content_type=None, timeout=300):
+    # (status, Retry-After header or None, seconds, parsed body of a 200)
+    request = urllib.request.Request(url, data=body, method='POST' if body is not None else 'GET')
+    request.add_header('X-Forwarded-For', client)
+    if content_type:
+        request.add_header('Content-Type', content_type)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = json.loads(response.read() or b'null')
+            status, retry_after = response.status, None
+    except urllib.error.HTTPError as e:
+        e.read()
+        status, retry_after, body = e.code, e.headers.get('Retry-After'), None
+    return status, retry_after, time.perf_counter() - started, body
+
+
+def summarize(name, results):
+    statuses = {}
+    for status, *_ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def p50(values):
+        return f"{statistics.median(values) * 1000:.0f}" if values else '-'
+
+    admitted = [elapsed for status, _, elapsed, _ in results if status == 200]
+    shed = [elapsed for status, _, elapsed, _ in results if status in (429, 503)]
+    retry_after = sorted({int(value) for _, value, _, _ in results if value})
+    print(f"{name:<22} {json.dumps(statuses):<34} {p50(admitted):>10} {p50(shed):>8}  "
+          f"{', '.join(map(str, retry_after)) or '-'}")
+    return {'statuses': statuses, 'admitted_p50_ms': p50(admitted), 'shed_p50_ms': p50(shed),
+            'retry_after': retry_after}
+
+
+def run(admission, args, reports):
+    state_dir = tempfile.mkdtemp(prefix='brm-bench-')
+    env = dict(os.environ, LLM_BACKEND='fake', FAKE_LLM_LATENCY=str(args.fake_latency), LOCAL_PARSER_THRESHOLD='2',
+               LOG_SAMPLE_RATE='0', WEB_CONCURRENCY=str(args.workers),
+               ADMISSION_ENABLED='1' if admission else '0', ADMISSION_PROXY_HOPS='1',
+               ADMISSION_STATE_PATH=os.path.join(state_dir, 'admission.sqlite3'),
+               STATEMENT_STORE_PATH=os.path.join(state_dir, 'statements.sqlite3'),
+               RESULT_CACHE_DIR=os.path.join(state_dir, 'cache'),
+               DOCUMENT_STORE_DIR=os.path.join(state_dir, 'documents'),
+               JOB_STATE_DIR=os.path.join(state_dir, 'jobs'),
+               METRICS_DIR=os.path.join(state_dir, 'metrics'))
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    server = start_server(port, env)
+    results = {}
+    try:
+        status, _, _, uploaded = send(f'{base}/api/process-pdf', '10.0.0.1', *multipart_body('report.pdf', reports[0]))
+        if status != 200:
+            raise RuntimeError(f'Upload for the chat client failed with {status}')
+        document_id = uploaded['document_id']
+
+        flood = reports[1:args.flood + 1]
+        chat_results, stop = [], threading.Event()
+
+        def chat_client():
+            i = 0
+            while not stop.is_set():
+                payload = json.dumps({'message': f"{CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]} ({i})",
+                                      'document_id': document_id}).encode()
+                chat_results.append(send(f'{base}/api/chat', '10.0.0.2', payload, 'application/json'))
+                i += 1
+                stop.wait(0.5)
+
+        chatter = threading.Thread(target=chat_client)
+        chatter.start()
+        time.sleep(1.0)
+        with ThreadPoolExecutor(max_workers=args.flood_concurrency) as executor:
+            flood_results = list(executor.map(
+                lambda pdf: send(f'{base}/api/process-pdf', '10.0.0.3', *multipart_body('report.pdf', pdf)), flood))
+        stop.set()
+        chatter.join()
+        results['flood'] = summarize('flood (1 client)', flood_results)
+        results['chat'] = summarize('chat during flood', chat_results)
+
+        # Let the global bucket refill before the crowd arrives
+        time.sleep(args.refill_wait if admission else 0)
+        crowd = reports[args.flood + 1:args.flood + 1 + args.crowd]
+        with ThreadPoolExecutor(max_workers=len(crowd)) as executor:
+            crowd_results = list(executor.map(
+                lambda item: send(f'{base}/api/process-pdf', f'10.1.0.{item[0]}', *multipart_body('report.pdf', item[1])),
+                enumerate(crowd)))
+        results['crowd'] = summarize(f'crowd ({len(crowd)} clients)', crowd_results)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show load shedding with admission control off and on')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--flood', type=int, default=96, help='uploads sent by the flooding client')
+    parser.add_argument('--flood-concurrency', type=int, default=24)
+    parser.add_argument('--crowd', type=int, default=32, help='clients uploading at the same moment')
+    parser.add_argument('--fake-latency', type=float, default=1.0)
+    parser.add_argument('--refill-wait', type=float, default=20.0,
+                        help='seconds to let the global bucket refill between the two scenarios')
+    args = parser.parse_args()
+
+    reports = [financial_statement_pdf(5, seed=seed) for seed in range(args.flood + args.crowd + 1)]
+    for admission in (False, True):
+        print(f"\nadmission control {'on' if admission else 'off'}")
+        print(f"{'scenario':<22} {'statuses':<34} {'200 p50 ms':>10} {'shed p50':>8}  Retry-After")
+        run(admission, args, reports)
+
+
+if __name__ == '__main__':
+    main()
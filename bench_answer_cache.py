@@ -0,0 +1,79 @@
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+
+from synthetic_pdf import financial_statement_pdf
+
+# Chat latency with the answer cache against the fake model. Each question is asked once
+# (a miss that calls the model), then again in other phrasings: as asked by a user of
+# another worker (the disk tier, simulated by emptying this worker's memory tier) and of
+# the same worker (memory tier). Phrasings that do not fold to the same key are misses and
+# show up in the hit rate. Metric questions ("what is the D/E ratio") are answered without
+# the model and never reach the cache, so none are asked here.
+#
+# Usage: python bench_answer_cache.py --latency 1.0
+
+QUESTIONS = [
+    ['How has the company funded its assets?', 'how has the company funded its assets',
+     'How has the firm funded its assets ?'],
+    ['Summarise the liquidity position.', 'summarise the liquidity position', 'Please summarise the liquidity position!'],
+    ['What are the main cost drivers?', 'what are the main cost drivers', 'What are the MAIN cost drivers??'],
+    ['Explain the P&L', 'Explain the profit and loss', 'Can you explain the income statement?'],
+    ['How did revenues change?', 'How did turnover change?', 'how did sales change'],
+    ["What's driving the company's profits?", 'What is driving the firm\'s earnings?',
+     'whats driving the business profits'],
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark chat answers served from the answer cache')
+    parser.add_argument('--latency', type=float, default=1.0, help='fake model latency (s)')
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp(prefix='brm-bench-')
+    os.environ.update(LLM_BACKEND='fake', FAKE_LLM_LATENCY=str(args.latency), LOG_SAMPLE_RATE='0',
+                      ADMISSION_ENABLED='0', STATEMENT_STORE_PATH=os.path.join(state_dir, 'statements.sqlite3'))
+    for name, folder in (('RESULT_CACHE_DIR', 'cache'), ('DOCUMENT_STORE_DIR', 'documents'), ('ANSWER_CACHE_DIR', 'answers'),
+                         ('JOB_STATE_DIR', 'jobs'), ('METRICS_DIR', 'metrics')):
+        os.environ[name] = os.path.join(state_dir, folder)
+    # Imported after the environment is set: the app configures itself on import
+    import app
+
+    client = app.app.test_client()
+    document_id = client.post('/api/process-pdf', content_type='multipart/form-data', data={
+        'file': (io.BytesIO(financial_statement_pdf(10)), 'report.pdf', 'application/pdf')}).get_json()['document_id']
+
+    def ask(message):
+        started = time.perf_counter()
+        body = client.post('/api/chat', json={'message': message, 'document_id': document_id}).get_json()
+        return (time.perf_counter() - started) * 1000, body['cache']['status'], body['cache'].get('tier')
+
+    results = {'miss': [], 'disk': [], 'memory': []}
+    hits = asked = 0
+    for phrasings in QUESTIONS:
+        results['miss'].append(ask(phrasings[0])[0])
+        for index, phrasing in enumerate(phrasings[1:]):
+            if index == 0:
+                # Another worker: only the shared directory has the answer
+                app.answer_cache._memory.clear()
+            elapsed, status, tier = ask(phrasing)
+            asked += 1
+            if status == 'hit':
+                hits += 1
+                results[tier].append(elapsed)
+            else:
+                results['miss'].append(elapsed)
+
+    print(f"Fake model latency {args.latency}s")
+    for name, values in results.items():
+        if values:
+            print(f"{name:<8} {len(values):>3} answers  p50 {statistics.median(values):9.1f} ms")
+    print(f"Rephrased questions answered from the cache: {hits}/{asked}")
+    print(f"Cache stats: {app.answer_cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
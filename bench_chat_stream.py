@@ -0,0 +1,63 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+
+# Time-to-first-token versus full-response latency for /api/chat against the fake model.
+# Usage: python bench_chat_stream.py --latency 0.5 --chunk-delay 0.05 --requests 10
+
+os.environ['LLM_BACKEND'] = 'fake'
+os.environ.setdefault('ADMISSION_ENABLED', '0')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark streamed vs buffered chat responses')
+    parser.add_argument('--latency', type=float, default=0.5, help='fake model delay before the first chunk (s)')
+    parser.add_argument('--chunk-delay', type=float, default=0.05, help='fake model delay between chunks (s)')
+    parser.add_argument('--requests', type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ['FAKE_LLM_LATENCY'] = str(args.latency)
+    os.environ['FAKE_LLM_CHUNK_DELAY'] = str(args.chunk_delay)
+    import app
+    logging.getLogger().setLevel(logging.WARNING)
+    client = app.app.test_client()
+
+    from fake_model import SAMPLE_FINANCIAL_DATA
+    body = {'message': 'What is the debt to equity ratio?', 'financial_data': SAMPLE_FINANCIAL_DATA}
+
+    first_chunk, streamed_total, server_ttft = [], [], []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        response = client.post('/api/chat', json=dict(body, stream=True), buffered=False)
+        first = None
+        for piece in response.response:
+            if first is None and b'event: delta' in piece:
+                first = time.perf_counter() - started
+            if b'event: done' in piece:
+                payload = json.loads(piece.split(b'data: ', 1)[1])
+                server_ttft.append(payload['ttft_ms'])
+        streamed_total.append(time.perf_counter() - started)
+        first_chunk.append(first)
+        response.close()
+
+    buffered = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        client.post('/api/chat', json=body)
+        buffered.append(time.perf_counter() - started)
+
+    def ms(values):
+        return f"{statistics.median(values) * 1000:8.1f} ms"
+
+    print(f"Fake model: {args.latency}s to first chunk, {args.chunk_delay}s between chunks")
+    print(f"streamed  time to first token (client) {ms(first_chunk)}")
+    print(f"streamed  time to first token (server) {statistics.median(server_ttft):8.1f} ms")
+    print(f"streamed  full response                {ms(streamed_total)}")
+    print(f"buffered  full response                {ms(buffered)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import tempfile
+
+from bench_load import CHAT_QUESTIONS, free_port, http, multipart_body, run_scenario, start_server
+from synthetic_pdf import financial_statement_pdf
+
+# Concurrency scaling of the gunicorn worker models against a slow fake model. For each
+# worker class, starts gunicorn with gunicorn_config.py and sends chat requests (each with a
+# distinct question, so none share a model call) at increasing client concurrency. With
+# sync workers throughput stops at `workers` requests in flight; with gthread or gevent it
+# keeps growing until threads or model slots run out. "in flight" is requests/sec times
+# the model latency, i.e. how many requests the server was working on at once.
+#
+# Usage: python bench_concurrency.py --worker-classes sync gthread --concurrency 1 2 4 8 16 \
+#            --fake-latency 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare gunicorn worker classes under a slow model')
+    parser.add_argument('--worker-classes', nargs='+', default=['sync', 'gthread'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='threads per gthread worker')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--rounds', type=int, default=3, help='requests per client at each level')
+    parser.add_argument('--fake-latency', type=float, default=1.0)
+    parser.add_argument('--uploads', type=int, default=16,
+                        help='concurrent uploads of distinct reports parsed by the model (0 skips)')
+    args = parser.parse_args()
+
+    results = {}
+    for worker_class in args.worker_classes:
+        state_dir = tempfile.mkdtemp(prefix='brm-bench-')
+        env = dict(os.environ,
+                   LLM_BACKEND='fake',
+                   FAKE_LLM_LATENCY=str(args.fake_latency),
+                   LOCAL_PARSER_THRESHOLD='2',
+                   LOG_SAMPLE_RATE='0',
+                   # Every client is 127.0.0.1; capacity is what is measured, not the rate limits
+                   ADMISSION_ENABLED='0',
+                   GUNICORN_WORKER_CLASS=worker_class,
+                   WEB_CONCURRENCY=str(args.workers),
+                   GUNICORN_THREADS=str(args.threads),
+                   # One model slot per thread, so the worker model is what is measured
+                   LLM_MAX_CONCURRENCY=os.getenv('LLM_MAX_CONCURRENCY', str(args.threads)),
+                   RESULT_CACHE_DIR=os.path.join(state_dir, 'cache'),
+                   DOCUMENT_STORE_DIR=os.path.join(state_dir, 'documents'),
+                   JOB_STATE_DIR=os.path.join(state_dir, 'jobs'),
+                   METRICS_DIR=os.path.join(state_dir, 'metrics'))
+        port = free_port()
+        base = f'http://127.0.0.1:{port}'
+        server = start_server(port, env)
+        print(f"\n{worker_class}: {args.workers} workers"
+              + (f" x {args.threads} threads" if worker_class == 'gthread' else '')
+              + f", model latency {args.fake_latency}s")
+        print(f"{'scenario':<24} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>6}")
+        scenarios = {}
+        try:
+            status, uploaded = http('POST', f'{base}/api/process-pdf', *multipart_body('report.pdf', financial_statement_pdf(10)))
+            if status != 200:
+                raise RuntimeError(f'Upload failed with {status}')
+            document_id = uploaded['document_id']
+
+            for concurrency in args.concurrency:
+                def ask(i):
+                    message = f"{CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]} (request {concurrency}-{i})"
+                    payload = json.dumps({'message': message, 'document_id': document_id})
+                    return http('POST', f'{base}/api/chat', payload.encode(), 'application/json')[0]
+                result = run_scenario(f'chat x{concurrency}', concurrency * args.rounds, concurrency, ask)
+                result['in_flight'] = round(result['rps'] * args.fake_latency, 1)
+                scenarios[f'chat-{concurrency}'] = result
+
+            if args.uploads:
+                reports = [financial_statement_pdf(10, seed=1000 + i) for i in range(args.uploads)]
+
+                def upload(i):
+                    return http('POST', f'{base}/api/process-pdf', *multipart_body('report.pdf', reports[i]))[0]
+                result = run_scenario(f'process-pdf x{args.uploads}', args.uploads, args.uploads, upload)
+                result['in_flight'] = round(result['rps'] * args.fake_latency, 1)
+                scenarios['process-pdf'] = result
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        results[worker_class] = scenarios
+
+    print(f"\nRequests in flight (chat)\n{'clients':<10}" + ''.join(f"{name:>10}" for name in results))
+    for concurrency in args.concurrency:
+        print(f"{concurrency:<10}" + ''.join(f"{scenarios[f'chat-{concurrency}']['in_flight']:>10}"
+                                             for scenarios in results.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import io
+import time
+
+import pdf_extraction
+from synthetic_pdf import financial_statement_pdf
+
+# Pages/sec of extract_text for several pool sizes on a synthetic annual report.
+# Usage: python bench_extraction.py --pages 300 --workers 1 2 4 8
+
+
+def run(pdf_bytes, workers, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        text = pdf_extraction.extract_text(io.BytesIO(pdf_bytes), max_workers=workers)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parallel PDF page extraction')
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    pdf_bytes = financial_statement_pdf(args.pages)
+    print(f"Synthetic PDF: {args.pages} pages, {len(pdf_bytes) / 1024:.0f} KiB")
+    print(f"{'workers':>8} {'seconds':>9} {'pages/sec':>10} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        # Warm the pool so process start-up is not counted
+        pdf_extraction.extract_text(io.BytesIO(pdf_bytes), max_workers=workers)
+        elapsed, _ = run(pdf_bytes, workers, args.repeats)
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>9.3f} {args.pages / elapsed:>10.1f} {baseline / elapsed:>7.2f}x")
+    pdf_extraction.shutdown_pool()
+
+
+if __name__ == '__main__':
+    main()
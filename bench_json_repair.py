@@ -0,0 +1,169 @@
+import argparse
+import copy
+import json
+import random
+import time
+
+from fake_model import SAMPLE_FINANCIAL_DATA
+from response_parser import normalize_financial_data, parse_model_json
+
+# Parse time and recovery rate for model extraction answers. Builds answers from the fake
+# model's statement with the quirks Gemini produces, then runs each through the previous
+# clean-up (strip code fences, swap every ' for ", json.loads, convert amounts) and through
+# response_parser. An answer counts as ok when it parses and every amount read matches the
+# statement it was built from. Timings are the mean per answer, parsing plus validation.
+#
+# Usage: python bench_json_repair.py --items 1 10 --repeats 200
+
+INDIAN_NAMES = ["Shareholders' Funds", "Directors' Remuneration", "Members' Contribution"]
+
+
+def build_statement(multiplier, seed):
+    # The sample statement with every list repeated `multiplier` times
+    rng = random.Random(seed)
+    data = copy.deepcopy(SAMPLE_FINANCIAL_DATA)
+    for statement in data.values():
+        for section in statement.values():
+            groups = [section] if isinstance(section, list) else list(section.values())
+            for items in groups:
+                original = list(items)
+                items.extend({'name': f"{item['name']} {n}", 'value': item['value'] + rng.randrange(1000)}
+                             for n in range(2, multiplier + 1) for item in original)
+    return data
+
+
+def with_apostrophes(data):
+    # Equity items named with apostrophes, as Indian reports often do
+    data = copy.deepcopy(data)
+    data['balance_sheet']['equity'].extend({'name': name, 'value': 100000 * (i + 1)}
+                                           for i, name in enumerate(INDIAN_NAMES))
+    return data
+
+
+def indian_grouping(value):
+    digits = str(int(value))
+    head, tail = digits[:-3], digits[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    return ','.join(([head] if head else []) + groups + [tail])
+
+
+def with_values(data, format_value):
+    data = copy.deepcopy(data)
+    for statement in data.values():
+        for section in statement.values():
+            for items in ([section] if isinstance(section, list) else section.values()):
+                for item in items:
+                    item['value'] = format_value(item['value'])
+    return data
+
+
+def amounts(data):
+    # {item name: value} over every list in the statement
+    return {item['name']: item['value']
+            for statement in ('balance_sheet', 'income_statement')
+            for section in data[statement].values()
+            for items in ([section] if isinstance(section, list) else section.values())
+            for item in items}
+
+
+def variants(data):
+    # name -> (model answer text, expected amounts)
+    text = json.dumps(data, indent=2)
+    named_data = with_apostrophes(data)
+    named = json.dumps(named_data, indent=2)
+    expected, named_expected = amounts(data), amounts(named_data)
+    return {
+        'clean': (text, expected),
+        'fenced_with_prose': (f"Here is the extracted data:\n```json\n{text}\n```\nLet me know if you need more.",
+                              expected),
+        'apostrophes_in_names': (named, named_expected),
+        'single_quotes': (text.replace('"', "'"), expected),
+        'single_quotes_apostrophes': (named.replace('"', "'"), named_expected),
+        'python_literals': (repr(data), expected),
+        'trailing_commas': (text.replace('}\n', '},\n').replace(']\n', '],\n').rstrip(',\n'), expected),
+        'indian_numbers_unquoted': (json.dumps(with_values(data, lambda v: f'@@{indian_grouping(v)}@@'),
+                                               indent=2).replace('"@@', '').replace('@@"', ''), expected),
+        'lakhs_and_crores': (json.dumps(with_values(data, lambda v: f"{v / 1e5} lakhs" if v < 1e7
+                                                    else f"Rs. {v / 1e7} crore"), indent=2), expected),
+        # Amounts are magnitudes whatever the sign notation, as the local parser reads them
+        'bracketed_amounts': (json.dumps(with_values(data, lambda v: f"({indian_grouping(v)})"), indent=2), expected),
+        'minus_signs': (json.dumps(with_values(data, lambda v: -v), indent=2), expected),
+        # Cut inside the last section; the items before the cut should survive
+        'truncated': (text[:int(len(text) * 0.9)], expected),
+    }
+
+
+def legacy_parse(text):
+    # The clean-up parse_financial_data used before response_parser
+    cleaned = text.strip().replace('```json', '').replace('```', '').replace("'", '"')
+    data = json.loads(cleaned)
+
+    def convert_to_numeric(value):
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            cleaned_value = str(value).replace('$', '').replace(',', '').strip()
+            if not cleaned_value or cleaned_value.lower() in ['na', 'n/a', '-']:
+                return 0
+            return float(cleaned_value)
+        except (ValueError, TypeError):
+            return 0
+
+    for statement in ('balance_sheet', 'income_statement'):
+        for section in data[statement].values():
+            for items in ([section] if isinstance(section, list) else section.values()):
+                for item in items:
+                    item['value'] = convert_to_numeric(item.get('value', 0))
+    return data
+
+
+def new_parse(text):
+    data, repairs = parse_model_json(text)
+    return normalize_financial_data(data)[0]
+
+
+def timed(fn, text, expected, repeats):
+    # (mean seconds per call or None when it raised, whether the amounts read are right)
+    try:
+        parsed = amounts(fn(text))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None, False
+    correct = bool(parsed) and all(expected.get(name) == value for name, value in parsed.items())
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn(text)
+    return (time.perf_counter() - started) / repeats, correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parsing and repair of model extraction answers')
+    parser.add_argument('--items', type=int, nargs='+', default=[1, 10],
+                        help='multiples of the sample statement size')
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    for multiplier in args.items:
+        data = build_statement(multiplier, args.seed)
+        answers = variants(data)
+        print(f"\nStatement x{multiplier}: {len(answers['clean'][0]) / 1024:.1f} KiB of JSON")
+        print(f"{'answer':<26} {'before':>7} {'after':>7} {'before us':>10} {'after us':>10}  repairs")
+        recovered = 0
+        for name, (text, expected) in answers.items():
+            legacy_time, legacy_ok = timed(legacy_parse, text, expected, args.repeats)
+            new_time, new_ok = timed(new_parse, text, expected, args.repeats)
+            repairs = parse_model_json(text)[1] if new_time is not None else []
+            recovered += new_ok and not legacy_ok
+
+            def fmt(seconds):
+                return f"{seconds * 1e6:>10.0f}" if seconds is not None else f"{'-':>10}"
+            print(f"{name:<26} {'ok' if legacy_ok else 'FAIL':>7} {'ok' if new_ok else 'FAIL':>7} "
+                  f"{fmt(legacy_time)} {fmt(new_time)}  {', '.join(repairs)}")
+        print(f"Recovered {recovered} of {len(answers)} answers the previous clean-up rejected")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from synthetic_pdf import financial_statement_pdf
+
+# Load test of the real server: starts gunicorn with gunicorn_config.py and the fake model
+# backend, then drives /api/process-pdf with synthetic reports of several sizes and /api/chat
+# with concurrent clients. Reports p50/p95/p99 latency, requests/sec, errors and peak RSS per
+# worker, saves the run as JSON and optionally compares it with an earlier run.
+#
+# Usage: python bench_load.py --pages 10 50 200 --requests 40 --concurrency 8 \
+#            --fake-latency 1.0 --fake-latency-distribution lognormal [--compare bench_results/<run>.json]
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+CHAT_QUESTIONS = [
+    'How has the company funded its assets?',
+    'Summarise the liquidity position.',
+    'What are the main cost drivers?',
+    'Is the company profitable from its core operations?',
+    'What should management watch in the next year?',
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def multipart_body(filename, content):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def http(method, url, body=None, content_type=None, timeout=300):
+    # (status, parsed JSON or None)
+    req = urllib.request.Request(url, data=body, method=method)
+    if content_type:
+        req.add_header('Content-Type', content_type)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b'null')
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code, None
+
+
+def start_server(port, env):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn_config.py', '-b', f'127.0.0.1:{port}'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during start-up')
+        try:
+            if http('GET', f'http://127.0.0.1:{port}/api/cache', timeout=2)[0] == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not become ready within 60s')
+
+
+def worker_pids(master_pid):
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # The command name may contain spaces; the ppid follows the closing parenthesis
+                if int(f.read().rsplit(')', 1)[1].split()[1]) == master_pid:
+                    pids.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return pids
+
+
+def peak_rss_mb(pid):
+    # VmHWM is the process's peak resident set size (Linux only)
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def run_scenario(name, requests, concurrency, send):
+    # `send(i)` performs request i and returns its HTTP status
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            status = send(i)
+        except OSError:
+            status = 'connection_error'
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(share):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * share))] * 1000, 1)
+
+    result = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(count for status, count in statuses.items() if status != '200'),
+        'statuses': statuses,
+        'rps': round(requests / wall, 2),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 1),
+        'max_ms': round(latencies[-1] * 1000, 1),
+    }
+    print(f"{name:<24} {result['rps']:>7.2f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+          f"{result['p99_ms']:>9.1f} {result['errors']:>6}")
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous_path} ({previous.get('revision')}, {previous.get('timestamp')}):")
+    print(f"{'scenario':<24} {'metric':>7} {'before':>9} {'after':>9} {'change':>8}")
+    for name, result in current['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        for metric in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if before.get(metric):
+                change = (result[metric] - before[metric]) / before[metric] * 100
+                print(f"{name:<24} {metric:>7} {before[metric]:>9.1f} {result[metric]:>9.1f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test /api/process-pdf and /api/chat under gunicorn')
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 50, 200], help='report sizes to upload')
+    parser.add_argument('--requests', type=int, default=40, help='uploads per report size')
+    parser.add_argument('--chat-requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--fake-latency', type=float, default=1.0, help='median/mean model latency (s)')
+    parser.add_argument('--fake-latency-distribution', default='lognormal',
+                        choices=['fixed', 'uniform', 'exponential', 'lognormal'])
+    parser.add_argument('--fake-error-rate', type=float, default=0.0)
+    parser.add_argument('--parser', choices=['llm', 'auto'], default='llm',
+                        help='llm sends every upload to the fake model; auto lets the local parser answer')
+    parser.add_argument('--cached', action='store_true', help='upload the same report repeatedly (cache hits)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--admission', action='store_true',
+                        help='keep admission control on; shed requests show up as 429/503 in the statuses')
+    parser.add_argument('--output-dir', default=os.path.join(ROOT, 'bench_results'))
+    parser.add_argument('--label', default='', help='name saved with the run')
+    parser.add_argument('--compare', help='earlier result file to compare with')
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp(prefix='brm-bench-')
+    env = dict(os.environ,
+               LLM_BACKEND='fake',
+               FAKE_LLM_LATENCY=str(args.fake_latency),
+               FAKE_LLM_LATENCY_DISTRIBUTION=args.fake_latency_distribution,
+               FAKE_LLM_ERROR_RATE=str(args.fake_error_rate),
+               FAKE_LLM_SEED=str(args.seed),
+               LOG_SAMPLE_RATE='0',
+               ADMISSION_ENABLED='1' if args.admission else '0',
+               RESULT_CACHE_DIR=os.path.join(state_dir, 'cache'),
+               DOCUMENT_STORE_DIR=os.path.join(state_dir, 'documents'),
+               JOB_STATE_DIR=os.path.join(state_dir, 'jobs'),
+               METRICS_DIR=os.path.join(state_dir, 'metrics'))
+    if args.parser == 'llm':
+        env['LOCAL_PARSER_THRESHOLD'] = '2'
+
+    # Distinct seeds give distinct documents, so every upload misses the result cache
+    rng = random.Random(args.seed)
+    documents = {}
+    for pages in args.pages:
+        count = 1 if args.cached else args.requests
+        documents[pages] = [financial_statement_pdf(pages, seed=rng.randrange(1 << 30)) for _ in range(count)]
+        print(f"Generated {count} report(s) of {pages} pages ({len(documents[pages][0]) / 1024:.0f} KiB each)")
+
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    server = start_server(port, env)
+    try:
+        print(f"\n{'scenario':<24} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>6}")
+        scenarios = {}
+        for pages, pdfs in documents.items():
+            def upload(i, pdfs=pdfs):
+                body, content_type = multipart_body('report.pdf', pdfs[i % len(pdfs)])
+                return http('POST', f'{base}/api/process-pdf', body, content_type)[0]
+            scenarios[f'process-pdf-{pages}p'] = run_scenario(f'process-pdf {pages} pages', args.requests,
+                                                             args.concurrency, upload)
+
+        body, content_type = multipart_body('report.pdf', documents[args.pages[0]][0])
+        status, uploaded = http('POST', f'{base}/api/process-pdf', body, content_type)
+        if status != 200:
+            raise RuntimeError(f'Upload for the chat scenario failed with {status}')
+        document_id = uploaded['document_id']
+
+        def ask(i):
+            payload = json.dumps({'message': CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)], 'document_id': document_id})
+            return http('POST', f'{base}/api/chat', payload.encode(), 'application/json')[0]
+        scenarios['chat'] = run_scenario('chat', args.chat_requests, args.concurrency, ask)
+
+        workers = {pid: peak_rss_mb(pid) for pid in worker_pids(server.pid)}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    print('\nPeak RSS per worker: ' + (', '.join(f"{pid}: {rss} MB" for pid, rss in sorted(workers.items()))
+                                       or 'unavailable'))
+    result = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'label': args.label,
+        'config': vars(args),
+        'scenarios': scenarios,
+        'peak_rss_mb': {str(pid): rss for pid, rss in workers.items()},
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"load-{time.strftime('%Y%m%d-%H%M%S')}{'-' + args.label if args.label else ''}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved {path}")
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == '__main__':
+    main()
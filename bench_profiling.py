@@ -0,0 +1,57 @@
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+
+from synthetic_pdf import financial_statement_pdf
+
+# Cost of request profiling on uploads of a synthetic report, with the fake model and the
+# result cache emptied before every upload: profiling off (the default for every request),
+# sampled stacks only, and cProfile plus sampled stacks.
+#
+# Usage: python bench_profiling.py --pages 50 --repeat 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the overhead of request profiling')
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp(prefix='brm-bench-')
+    os.environ.update(LLM_BACKEND='fake', FAKE_LLM_LATENCY='0', LOG_SAMPLE_RATE='0', ADMISSION_ENABLED='0',
+                      ADMIN_TOKEN='bench', STATEMENT_STORE_PATH=os.path.join(state_dir, 'statements.sqlite3'))
+    for name, folder in (('RESULT_CACHE_DIR', 'cache'), ('DOCUMENT_STORE_DIR', 'documents'), ('ANSWER_CACHE_DIR', 'answers'),
+                         ('JOB_STATE_DIR', 'jobs'), ('METRICS_DIR', 'metrics'), ('PROFILE_DIR', 'profiles')):
+        os.environ[name] = os.path.join(state_dir, folder)
+    # Imported after the environment is set: the app configures itself on import
+    import app
+
+    client = app.app.test_client()
+    pdf = financial_statement_pdf(args.pages)
+
+    def upload(headers):
+        app.result_cache.invalidate()
+        started = time.perf_counter()
+        response = client.post('/api/process-pdf', headers=headers, content_type='multipart/form-data',
+                               data={'file': (io.BytesIO(pdf), 'report.pdf', 'application/pdf')})
+        assert response.status_code == 200, response.get_json()
+        return (time.perf_counter() - started) * 1000
+
+    upload({})
+    print(f"{args.pages}-page upload, {args.repeat} runs each")
+    print(f"{'profiling':<10} {'p50 ms':>8} {'min ms':>8} {'overhead':>9}")
+    baseline = None
+    for mode in ('off', 'sample', 'cprofile'):
+        headers = {} if mode == 'off' else {'X-Profile': mode, 'X-Admin-Token': 'bench'}
+        times = [upload(headers) for _ in range(args.repeat)]
+        p50 = statistics.median(times)
+        baseline = baseline or p50
+        print(f"{mode:<10} {p50:8.1f} {min(times):8.1f} {(p50 / baseline - 1) * 100:8.1f}%")
+    print(f"Profiles saved: {len(app.profiles.recent(1000))}")
+
+
+if __name__ == '__main__':
+    main()
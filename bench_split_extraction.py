@@ -0,0 +1,75 @@
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+
+from synthetic_pdf import financial_statement_pdf
+
+# Upload latency of combined extraction (one prompt for both statements) against split
+# extraction (one prompt per statement, sent concurrently), with the fake model and the
+# result cache emptied before every upload. The local parser is switched off so every upload
+# reaches the model. The fake model's answer time grows with the answer's length, as a real
+# model's does, so the split prompts each answer in about half the time. A second round
+# adds transient model errors, which the LLM client retries per call: a retry in split mode
+# only repeats one statement's call.
+#
+# Usage: python bench_split_extraction.py --pages 50 --repeat 10 --latency 1.0
+
+MODES = ('combined', 'split')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare combined and split model extraction')
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=1.0, help='fake model latency to the first chunk (s)')
+    parser.add_argument('--chunk-delay', type=float, default=0.02, help='fake model delay per answer chunk (s)')
+    parser.add_argument('--error-rate', type=float, default=0.2, help='transient error rate of the second round')
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp(prefix='brm-bench-')
+    os.environ.update(LLM_BACKEND='fake', FAKE_LLM_LATENCY=str(args.latency), FAKE_LLM_CHUNK_DELAY=str(args.chunk_delay),
+                      FAKE_LLM_SEED='7', LOCAL_PARSER_THRESHOLD='2', LOG_SAMPLE_RATE='0',
+                      ADMISSION_ENABLED='0', STATEMENT_STORE_PATH=os.path.join(state_dir, 'statements.sqlite3'))
+    for name, folder in (('RESULT_CACHE_DIR', 'cache'), ('DOCUMENT_STORE_DIR', 'documents'), ('ANSWER_CACHE_DIR', 'answers'),
+                         ('JOB_STATE_DIR', 'jobs'), ('METRICS_DIR', 'metrics')):
+        os.environ[name] = os.path.join(state_dir, folder)
+    # Imported after the environment is set: the app configures itself on import
+    import app
+
+    client = app.app.test_client()
+    pdf = financial_statement_pdf(args.pages)
+    fake = app.model.get()
+
+    def upload():
+        app.result_cache.invalidate()
+        started = time.perf_counter()
+        response = client.post('/api/process-pdf', content_type='multipart/form-data',
+                               data={'file': (io.BytesIO(pdf), 'report.pdf', 'application/pdf')})
+        assert response.status_code == 200, response.get_json()
+        return (time.perf_counter() - started) * 1000, response.get_json()['data']
+
+    print(f"{args.pages}-page upload, {args.repeat} runs each, fake model {args.latency}s + {args.chunk_delay}s/chunk")
+    print(f"{'errors':<7} {'mode':<9} {'p50 ms':>8} {'max ms':>8} {'calls':>6}")
+    results = {}
+    for error_rate in (0.0, args.error_rate):
+        fake.error_rate = error_rate
+        baseline = None
+        for mode in MODES:
+            app.EXTRACTION_MODE = mode
+            calls = fake.calls
+            times = []
+            for _ in range(args.repeat):
+                elapsed, results[mode] = upload()
+                times.append(elapsed)
+            p50 = statistics.median(times)
+            baseline = baseline or p50
+            print(f"{error_rate:<7.2f} {mode:<9} {p50:8.1f} {max(times):8.1f} {fake.calls - calls:6d}"
+                  f"  {(p50 / baseline - 1) * 100:+.1f}%")
+    print(f"Same extracted data in both modes: {results['combined'] == results['split']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_load import ROOT, free_port, http, multipart_body, worker_pids
+from synthetic_pdf import financial_statement_pdf
+
+# Start-up cost of the app. First, in a fresh interpreter: how long importing app takes and
+# how long the first upload takes afterwards, with and without the warm-up. Then under
+# gunicorn with and without preloading: time until /readyz answers, the first upload, and
+# each worker's memory (RSS, PSS, and private memory that is not shared with the master).
+# The Gemini backend is used with a placeholder key so its SDK import is included; the
+# synthetic reports are parsed locally, so no request reaches Gemini.
+#
+# Usage: python bench_startup.py --workers 2
+
+IMPORT_SCRIPT = """
+import io, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+from synthetic_pdf import financial_statement_pdf
+pdf = financial_statement_pdf(20, seed=7)
+client = app.app.test_client()
+started = time.perf_counter()
+response = client.post('/api/process-pdf', content_type='multipart/form-data',
+                       data={'file': (io.BytesIO(pdf), 'report.pdf', 'application/pdf')})
+first = time.perf_counter() - started
+print(f"{imported * 1000:.0f} {first * 1000:.0f} {response.status_code}")
+"""
+
+
+def memory_mb(pid):
+    # (RSS, PSS, private) in MB from smaps_rollup (Linux only)
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+    private = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return tuple(round(value / 1024, 1) for value in (fields.get('Rss', 0), fields.get('Pss', 0), private))
+
+
+def bench_env(state_dir, **extra):
+    env = dict(os.environ, LLM_BACKEND='gemini', GOOGLE_API_KEY=os.getenv('GOOGLE_API_KEY') or 'bench-placeholder',
+               LOG_SAMPLE_RATE='0', ADMISSION_ENABLED='0',
+               RESULT_CACHE_DIR=os.path.join(state_dir, 'cache'),
+               DOCUMENT_STORE_DIR=os.path.join(state_dir, 'documents'),
+               JOB_STATE_DIR=os.path.join(state_dir, 'jobs'),
+               METRICS_DIR=os.path.join(state_dir, 'metrics'))
+    env.update(extra)
+    return env
+
+
+def import_run(warmup):
+    state_dir = tempfile.mkdtemp(prefix='brm-bench-')
+    output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=ROOT, capture_output=True, text=True,
+                            env=bench_env(state_dir, STARTUP_WARMUP='1' if warmup else '0'), check=True)
+    imported, first, status = output.stdout.split()[-3:]
+    return int(imported), int(first), status
+
+
+def gunicorn_run(preload, workers):
+    state_dir = tempfile.mkdtemp(prefix='brm-bench-')
+    env = bench_env(state_dir, GUNICORN_PRELOAD='1' if preload else '0', WEB_CONCURRENCY=str(workers))
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn_config.py', '-b', f'127.0.0.1:{port}'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = None
+        while time.perf_counter() - started < 60:
+            if server.poll() is not None:
+                raise RuntimeError('gunicorn exited during start-up')
+            try:
+                if http('GET', f'{base}/readyz', timeout=2)[0] == 200:
+                    ready = time.perf_counter() - started
+                    break
+            except OSError:
+                pass
+            time.sleep(0.02)
+        if ready is None:
+            raise RuntimeError('gunicorn did not become ready within 60s')
+        # Let every worker finish booting before measuring memory
+        deadline = time.monotonic() + 30
+        while len(worker_pids(server.pid)) < workers and time.monotonic() < deadline:
+            time.sleep(0.1)
+        time.sleep(1.0)
+
+        first_started = time.perf_counter()
+        status = http('POST', f'{base}/api/process-pdf', *multipart_body('report.pdf', financial_statement_pdf(20, seed=7)))[0]
+        first = time.perf_counter() - first_started
+        memory = {pid: memory_mb(pid) for pid in worker_pids(server.pid)}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return ready, first, status, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure start-up time and per-worker memory')
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'single process':<24} {'import ms':>10} {'first upload ms':>16}")
+    for warmup in (False, True):
+        imported, first, status = import_run(warmup)
+        print(f"{'warm-up ' + ('on' if warmup else 'off'):<24} {imported:>10} {first:>16}  (status {status})")
+
+    print(f"\n{'gunicorn':<24} {'ready ms':>10} {'first upload ms':>16} {'worker RSS / PSS / private MB':>32}")
+    for preload in (False, True):
+        ready, first, status, memory = gunicorn_run(preload, args.workers)
+        per_worker = ', '.join(f"{rss}/{pss}/{private}" for rss, pss, private in
+                               (m for m in memory.values() if m)) or 'unavailable'
+        print(f"{'preload ' + ('on' if preload else 'off'):<24} {ready * 1000:>10.0f} {first * 1000:>16.0f} "
+              f"{per_worker:>32}  (status {status})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import time
+
+from local_parser import parse_statements
+from statement_store import StatementStore, line_items
+from synthetic_pdf import financial_statement_pages
+
+# Insert throughput and query latency of the statement store as it grows. Documents are
+# synthetic companies' statements over several periods. Inserts are timed one transaction
+# per line item (autocommit, the naive way) against put_many batches; after each growth
+# step the /api/statements queries are timed at the new size, so flat latencies show the
+# indexes doing their work.
+#
+# Usage: python bench_statement_store.py --sizes 1000 10000 40000 --periods 10
+
+BASE_DATA = parse_statements(['\n'.join(lines) for lines in financial_statement_pages(4)])[0]
+
+
+def scaled(data, factor):
+    # A copy of financial_data with every amount multiplied by `factor`
+    if isinstance(data, dict):
+        return {key: (round(value * factor) if key == 'value' and isinstance(value, (int, float))
+                      else scaled(value, factor)) for key, value in data.items()}
+    if isinstance(data, list):
+        return [scaled(item, factor) for item in data]
+    return data
+
+
+def documents(start, count, periods, rng):
+    # Records for documents start..start+count: company i // periods, period i % periods
+    for i in range(start, start + count):
+        company, period = f"Company {i // periods:05d} Limited", f"FY{2000 + i % periods}"
+        yield {'document_id': hashlib.sha256(f"{company}|{period}".encode()).hexdigest(),
+               'source_digest': hashlib.sha256(f"pdf|{i}".encode()).hexdigest(),
+               'company': company, 'period': period, 'filename': f"report_{i}.pdf", 'parser': 'local',
+               'financial_data': scaled(BASE_DATA, rng.uniform(0.2, 5.0))}
+
+
+def naive_insert(store, records):
+    # The same rows written with one autocommit statement each
+    connection = store._connection()
+    for record in records:
+        rowid = connection.execute(
+            'INSERT INTO documents (document_id, source_digest, company, period, filename, parser, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (record['document_id'], record['source_digest'], record['company'], record['period'],
+             record['filename'], record['parser'], time.time())).lastrowid
+        for category, name, key, value in line_items(record['financial_data']):
+            connection.execute('INSERT INTO line_items (document, category, name, item_key, value) VALUES (?, ?, ?, ?, ?)',
+                               (rowid, category, name, key, value))
+
+
+def timed(fn, repeats):
+    # Median milliseconds per call
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the statement store')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 40000])
+    parser.add_argument('--periods', type=int, default=10, help='periods per company')
+    parser.add_argument('--batch', type=int, default=100, help='documents per put_many transaction')
+    parser.add_argument('--naive', type=int, default=300, help='documents inserted row by row for comparison')
+    parser.add_argument('--repeats', type=int, default=25)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    directory = tempfile.mkdtemp(prefix='brm-bench-')
+    records = list(documents(0, args.naive, args.periods, rng))
+    started = time.perf_counter()
+    naive_insert(StatementStore(os.path.join(directory, 'naive.sqlite3')), records)
+    naive_rate = len(records) / (time.perf_counter() - started)
+    batched_store = StatementStore(os.path.join(directory, 'batched.sqlite3'))
+    started = time.perf_counter()
+    for i in range(0, len(records), args.batch):
+        batched_store.put_many(records[i:i + args.batch])
+    batched_rate = len(records) / (time.perf_counter() - started)
+    store = StatementStore(os.path.join(directory, 'statements.sqlite3'))
+    print(f"Inserts: row by row {naive_rate:.0f} docs/s, put_many x{args.batch} {batched_rate:.0f} docs/s "
+          f"({batched_rate / naive_rate:.1f}x)\n")
+
+    queries = {
+        'items company+period': lambda company, period: store.line_items(
+            {'company': [company], 'period': [period]}),
+        'items category newest': lambda company, period: store.line_items({'category': ['current_assets']}),
+        'item by period (1 co.)': lambda company, period: store.aggregate(
+            {'company': [company], 'item': ['Trade Receivables']}, ['period']),
+        'totals by category': lambda company, period: store.aggregate(
+            {'company': [company], 'period': [period]}, ['category']),
+        'compare (1 co.)': lambda company, period: store.statements({'company': [company]}),
+        'documents of period': lambda company, period: store.documents({'period': [period]}, limit=100),
+    }
+    print(f"{'documents':>10} {'insert docs/s':>14} " + ''.join(f"{name:>24}" for name in queries))
+    stored = 0
+    for size in args.sizes:
+        started = time.perf_counter()
+        batch = []
+        for record in documents(stored, size - stored, args.periods, rng):
+            batch.append(record)
+            if len(batch) == args.batch:
+                store.put_many(batch)
+                batch = []
+        store.put_many(batch)
+        rate = (size - stored) / (time.perf_counter() - started)
+        stored = size
+        company = f"Company {rng.randrange(size // args.periods):05d} Limited"
+        period = f"FY{2000 + rng.randrange(args.periods)}"
+        latencies = [timed(lambda: query(company, period), args.repeats) for query in queries.values()]
+        print(f"{size:>10} {rate:>14.0f} " + ''.join(f"{latency:>21.2f} ms" for latency in latencies))
+    print(f"\nStore size: {store.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from flask import Flask, send_from_directory
+
+from synthetic_pdf import financial_statement_pdf
+
+# Bytes on the wire and handler time for the page, its assets and large API responses.
+# "before" is the previous delivery (send_from_directory on every hit, no compression),
+# "after" the app as configured; both are driven in-process with the Flask test client.
+# A repeat visit counts the requests a browser still makes: with send_from_directory every
+# asset is revalidated, while fingerprinted assets are served from the browser cache.
+#
+# Usage: python bench_static.py --repeats 500
+
+ACCEPT = {'Accept-Encoding': 'gzip, deflate, br'}
+
+
+def legacy_app(root):
+    legacy = Flask('legacy', root_path=root)
+    for name in ('index.html', 'styles.css', 'script.js', 'shubh_logo.png'):
+        legacy.add_url_rule('/' if name == 'index.html' else f'/{name}', name,
+                            lambda name=name: send_from_directory(root, name))
+    return legacy
+
+
+def measure(client, path, repeats, headers=None):
+    # (response, mean handler time in microseconds)
+    response = client.get(path, headers=headers)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        client.get(path, headers=headers).close()
+    return response, (time.perf_counter() - started) / repeats * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark static and API response delivery')
+    parser.add_argument('--repeats', type=int, default=500)
+    parser.add_argument('--pages', type=int, default=20)
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp(prefix='brm-bench-')
+    os.environ.setdefault('LLM_BACKEND', 'fake')
+    os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+    os.environ.setdefault('ADMISSION_ENABLED', '0')
+    for name, folder in (('RESULT_CACHE_DIR', 'cache'), ('DOCUMENT_STORE_DIR', 'documents'),
+                         ('JOB_STATE_DIR', 'jobs'), ('METRICS_DIR', 'metrics')):
+        os.environ.setdefault(name, os.path.join(state_dir, folder))
+    # Imported after the environment is set: the app configures itself on import
+    import app
+
+    before, after = legacy_app(app.app.root_path).test_client(), app.app.test_client()
+    assets = app.static_assets
+
+    print(f"{'first visit':<30} {'before B':>9} {'after B':>9} {'before us':>10} {'after us':>10}")
+    total_before = total_after = 0
+    paths = [('/', '/')] + [(f'/{name}', app.ASSET_PREFIX + asset.fingerprinted)
+                            for name, asset in assets.files.items()]
+    etags = {}
+    for old_path, new_path in paths:
+        old, old_time = measure(before, old_path, args.repeats, ACCEPT)
+        new, new_time = measure(after, new_path, args.repeats, ACCEPT)
+        etags[new_path] = new.headers.get('ETag')
+        total_before += len(old.get_data())
+        total_after += len(new.get_data())
+        print(f"{old_path:<30} {len(old.get_data()):>9} {len(new.get_data()):>9} {old_time:>10.0f} {new_time:>10.0f}")
+    print(f"{'total':<30} {total_before:>9} {total_after:>9}")
+
+    # Repeat visit: the browser revalidates the page; immutable assets are not requested at all
+    revalidated, revalidate_time = measure(after, '/', args.repeats, dict(ACCEPT, **{'If-None-Match': etags['/']}))
+    print(f"\nRepeat visit: before {len(paths)} conditional requests, after 1 "
+          f"(page answered {revalidated.status_code} in {revalidate_time:.0f} us)")
+
+    pdf = financial_statement_pdf(args.pages)
+
+    def upload(headers=None):
+        return after.post('/api/process-pdf', headers=headers, content_type='multipart/form-data',
+                          data={'file': (io.BytesIO(pdf), 'report.pdf', 'application/pdf')})
+
+    document_id = upload().get_json()['document_id']
+    print(f"\n{'api response':<30} {'plain B':>9} {'gzip B':>9} {'plain us':>10} {'gzip us':>10}")
+    for path in (f'/api/metrics/{document_id}', '/api/llm/stats'):
+        plain, plain_time = measure(after, path, args.repeats)
+        compressed, compressed_time = measure(after, path, args.repeats, {'Accept-Encoding': 'gzip'})
+        print(f"{path[:30]:<30} {len(plain.get_data()):>9} {len(compressed.get_data()):>9} "
+              f"{plain_time:>10.0f} {compressed_time:>10.0f}")
+
+    # Repeat uploads of the same report are answered from the result cache
+    timings = {}
+    for label, headers in (('plain', None), ('gzip', {'Accept-Encoding': 'gzip'})):
+        started = time.perf_counter()
+        for _ in range(max(1, args.repeats // 10)):
+            response = upload(headers)
+        timings[label] = ((time.perf_counter() - started) / max(1, args.repeats // 10) * 1e6,
+                          len(response.get_data()))
+    print(f"{'/api/process-pdf (cached)':<30} {timings['plain'][1]:>9} {timings['gzip'][1]:>9} "
+          f"{timings['plain'][0]:>10.0f} {timings['gzip'][0]:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
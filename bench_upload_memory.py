@@ -0,0 +1,101 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from PyPDF2 import PdfReader
+
+from bench_load import free_port, http, multipart_body, peak_rss_mb, start_server, worker_pids
+from pdf_extraction import iter_page_texts
+from synthetic_pdf import financial_statement_pdf
+
+# Memory used by large uploads. Starts gunicorn with gunicorn_config.py and the fake model,
+# sends N concurrent uploads of about --size-mb each plus a few over the limit, and reports
+# each worker's peak RSS before and after. Also compares, in this process, the heap used to
+# parse one such PDF by path (PyPDF2 reads the whole file into memory) with the
+# memory-mapped source used by the app.
+#
+# Usage: python bench_upload_memory.py --uploads 8 --size-mb 9.5 --oversized 4
+
+
+def peak_heap_mb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure worker memory under concurrent large uploads')
+    parser.add_argument('--uploads', type=int, default=8)
+    parser.add_argument('--size-mb', type=float, default=9.5, help='size of each accepted upload')
+    parser.add_argument('--oversized', type=int, default=4, help='uploads above the limit, expected to get 413')
+    parser.add_argument('--pages', type=int, default=40)
+    args = parser.parse_args()
+
+    padding = int(args.size_mb * 1024 * 1024)
+    pdfs = [financial_statement_pdf(args.pages, seed=i, padding_bytes=padding) for i in range(args.uploads)]
+    oversized = financial_statement_pdf(args.pages, padding_bytes=12 * 1024 * 1024)
+    print(f"{args.uploads} uploads of {len(pdfs[0]) / (1024 * 1024):.1f} MB, "
+          f"{args.oversized} of {len(oversized) / (1024 * 1024):.1f} MB")
+
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as f:
+        f.write(pdfs[0])
+        f.flush()
+        by_path = peak_heap_mb(lambda: [page.extract_text() for page in PdfReader(f.name).pages])
+        mapped = peak_heap_mb(lambda: list(iter_page_texts(f.name, max_workers=1)))
+    print(f"Heap to parse one upload: {by_path} MB by path, {mapped} MB memory-mapped")
+
+    state_dir = tempfile.mkdtemp(prefix='brm-bench-')
+    env = dict(os.environ, LLM_BACKEND='fake', LOG_SAMPLE_RATE='0', ADMISSION_ENABLED='0', PDF_EXTRACT_WORKERS='1',
+               RESULT_CACHE_DIR=os.path.join(state_dir, 'cache'),
+               DOCUMENT_STORE_DIR=os.path.join(state_dir, 'documents'),
+               JOB_STATE_DIR=os.path.join(state_dir, 'jobs'),
+               METRICS_DIR=os.path.join(state_dir, 'metrics'))
+    port = free_port()
+    url = f'http://127.0.0.1:{port}/api/process-pdf'
+    server = start_server(port, env)
+    try:
+        # One small upload per worker so imports and first-request allocations are in the baseline
+        small = financial_statement_pdf(args.pages, seed=10_000)
+        for _ in range(4):
+            http('POST', url, *multipart_body('warmup.pdf', small))
+        pids = worker_pids(server.pid)
+        before = {pid: peak_rss_mb(pid) for pid in pids}
+
+        def upload(content):
+            started = time.perf_counter()
+            try:
+                status = http('POST', url, *multipart_body('report.pdf', content))[0]
+            except OSError:
+                # The server may close the connection on an oversized body before it is all sent
+                status = 'closed'
+            return status, time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=args.uploads + args.oversized) as executor:
+            results = list(executor.map(upload, pdfs + [oversized] * args.oversized))
+        after = {pid: peak_rss_mb(pid) for pid in pids}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    accepted, rejected = results[:args.uploads], results[args.uploads:]
+    print(f"Accepted uploads: statuses {sorted(set(str(s) for s, _ in accepted))}, "
+          f"slowest {max(t for _, t in accepted) * 1000:.0f} ms")
+    if rejected:
+        print(f"Oversized uploads: statuses {sorted(set(str(s) for s, _ in rejected))}, "
+              f"slowest {max(t for _, t in rejected) * 1000:.0f} ms")
+    print(f"{'worker':>8} {'peak RSS before':>16} {'peak RSS after':>15} {'growth':>8}")
+    for pid in pids:
+        if before[pid] is None or after[pid] is None:
+            print(f"{pid:>8} {'unavailable':>16}")
+            continue
+        print(f"{pid:>8} {before[pid]:>13.1f} MB {after[pid]:>12.1f} MB {after[pid] - before[pid]:>5.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
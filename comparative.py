@@ -0,0 +1,96 @@
+import re
+
+from document_store import SECTIONS
+from financial_metrics import compute_period_metrics
+
+# Multi-period view: several years of statements for one company merged into one structure,
+# with each line item aligned across periods.
+
+YEAR_PATTERN = re.compile(r'(?<!\d)(?:FY\s?)?((?:19|20)\d{2})(?!\d)', re.IGNORECASE)
+# Phrases that name the reporting period on a report's first pages
+PERIOD_PATTERN = re.compile(r'(?:year\s+ended|as\s+at|annual\s+report|financial\s+year)[^0-9]{0,40}'
+                            r'(?:\d{1,2}(?:st|nd|rd|th)?\s+\w+,?\s+)?((?:19|20)\d{2})', re.IGNORECASE)
+# A line that starts with the company name, as report headers and statement titles do:
+# "Shubh Sawariya Industries Private Limited" or "... Limited - Annual Report 2024"
+COMPANY_PATTERN = re.compile(r"\s*([A-Z][A-Za-z0-9&.,'\- ]{1,80}?\s(?:Limited|Ltd\.?|LLP))\s*(?:$|[-|(,])")
+
+
+def period_label(year):
+    # Indian financial years are named by the year they end in
+    return f"FY{year}"
+
+
+def describe_pages(pages, filename=None):
+    # (company, period) from the text of a report's first pages; the period in the file name wins
+    company = period = None
+    years = YEAR_PATTERN.findall(filename or '')
+    if years:
+        period = period_label(years[-1])
+    for text in pages:
+        if company is None:
+            company = next((match.group(1).strip() for match in map(COMPANY_PATTERN.match, text.splitlines())
+                            if match), None)
+        if period is None:
+            match = PERIOD_PATTERN.search(text)
+            if match:
+                period = period_label(match.group(1))
+        if company is not None and period is not None:
+            break
+    return company, period
+
+
+def item_key(name):
+    # "Trade Receivables", "Trade receivables (net)" and "TRADE RECEIVABLES" align
+    key = re.sub(r'\((?:net|gross)\)', '', name.lower())
+    return re.sub(r'[^a-z0-9]+', ' ', key).strip()
+
+
+def unique_labels(labels):
+    # Keeps labels as given, suffixing repeats: ["FY2024", "FY2024"] -> ["FY2024", "FY2024 (2)"]
+    seen = {}
+    result = []
+    for label in labels:
+        seen[label] = seen.get(label, 0) + 1
+        result.append(label if seen[label] == 1 else f"{label} ({seen[label]})")
+    return result
+
+
+def align_periods(periods):
+    """Merge {label: financial_data} into one structure with the shape of financial_data,
+    where each line item carries a list of values, one per period (None when absent).
+
+    Periods are ordered by label, so FY labels come out chronologically.
+    """
+    labels = sorted(periods)
+    aligned = {}
+    for _, (statement, section, subcategory) in SECTIONS:
+        rows = {}
+        for index, label in enumerate(labels):
+            try:
+                group = periods[label][statement][section]
+                items = group if subcategory is None else group[subcategory]
+            except (KeyError, TypeError):
+                continue
+            for item in items:
+                if not isinstance(item, dict) or 'name' not in item:
+                    continue
+                row = rows.setdefault(item_key(item['name']),
+                                      {'name': item['name'], 'values': [None] * len(labels)})
+                value = item.get('value')
+                if isinstance(value, (int, float)):
+                    # Items that map to the same key within a period are added up
+                    row['values'][index] = (row['values'][index] or 0) + value
+        target = aligned.setdefault(statement, {})
+        if subcategory is None:
+            target[section] = list(rows.values())
+        else:
+            target.setdefault(section, {})[subcategory] = list(rows.values())
+    return {'periods': labels, 'statements': aligned}
+
+
+def build_comparative(periods, assumptions=None):
+    # Aligned statements plus the standard metrics for each period
+    comparative = align_periods(periods)
+    comparative['metrics'] = compute_period_metrics({label: periods[label] for label in comparative['periods']},
+                                                    assumptions)
+    return comparative
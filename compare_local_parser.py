@@ -0,0 +1,123 @@
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import time
+
+from document_store import SECTIONS
+from local_parser import parse_statements
+from pdf_extraction import iter_page_texts
+from synthetic_pdf import financial_statement_pdf
+
+# Compares the rule-based parser with the LLM path over a corpus of statements.
+#
+# The corpus is a directory of PDFs; `report.pdf` is compared with `report.json`, a saved
+# response from /api/process-pdf (or its `data` field). Documents without a saved reference
+# are sent through the configured model when --call-model is given, and the answer is saved
+# next to the PDF so later runs are free. Without a directory the synthetic sample corpus is
+# used. test_local_parser.py runs the comparison on a corpus given in LOCAL_PARSER_CORPUS.
+#
+# Usage: python compare_local_parser.py [corpus_dir] [--call-model] [--threshold 0.85]
+
+# Synthetic sample corpus: (pages, year, seed) of each report
+SYNTHETIC_REPORTS = [(3, 2024, 0), (4, 2022, 1), (50, 2023, 2), (300, 2024, 3)]
+
+
+def _normalise(name):
+    return re.sub(r'[^a-z]+', ' ', name.lower()).strip()
+
+
+def line_items(data):
+    # {(section, normalised name): value}
+    items = {}
+    for _, (statement, section, subcategory) in SECTIONS:
+        entries = data[statement][section] if subcategory is None else data[statement][section][subcategory]
+        for entry in entries:
+            items[(f"{statement}.{section}.{subcategory or ''}", _normalise(entry['name']))] = entry['value']
+    return items
+
+
+def compare(local, reference, tolerance=0.005):
+    local_items, reference_items = line_items(local), line_items(reference)
+    matched = 0
+    for key, value in local_items.items():
+        expected = reference_items.get(key)
+        if expected is not None and abs(float(expected) - float(value)) <= tolerance * max(1.0, abs(float(expected))):
+            matched += 1
+    precision = matched / len(local_items) if local_items else 0.0
+    recall = matched / len(reference_items) if reference_items else 0.0
+    return precision, recall
+
+
+def load_reference(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        saved = json.load(f)
+    return saved.get('data', saved)
+
+
+def reference_from_model(pages):
+    # Imported lazily: the app module configures the model backend on import
+    import app
+    text, _ = app.compact_pages(pages, token_budget=app.PROMPT_TOKEN_BUDGET)
+    return app.parse_financial_data(text)
+
+
+def iter_corpus(directory):
+    if directory is None:
+        for pages, year, seed in SYNTHETIC_REPORTS:
+            yield f'synthetic-{pages}-pages-{year}', io.BytesIO(financial_statement_pdf(pages, year=year, seed=seed)), None
+        return
+    for filename in sorted(os.listdir(directory)):
+        if filename.lower().endswith('.pdf'):
+            path = os.path.join(directory, filename)
+            yield filename, path, os.path.splitext(path)[0] + '.json'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the local statement parser with the LLM path')
+    parser.add_argument('corpus', nargs='?', help='directory of PDFs with saved reference JSON')
+    parser.add_argument('--call-model', action='store_true', help='call the configured model when no reference is saved')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('LOCAL_PARSER_THRESHOLD', '0.85')))
+    args = parser.parse_args()
+
+    print(f"{'document':<40} {'conf':>5} {'ms':>7} {'precision':>9} {'recall':>7}  path")
+    rows = []
+    for name, source, reference_path in iter_corpus(args.corpus):
+        pages = list(iter_page_texts(source))
+        started = time.perf_counter()
+        local, confidence, _ = parse_statements(pages)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        reference = None
+        if reference_path and os.path.exists(reference_path):
+            reference = load_reference(reference_path)
+        elif reference_path and args.call_model:
+            reference = reference_from_model(pages)
+            with open(reference_path, 'w', encoding='utf-8') as f:
+                json.dump({'data': reference}, f, indent=2)
+        elif reference_path is None:
+            # The canned fake-model answer is the ground truth for synthetic reports
+            from fake_model import SAMPLE_FINANCIAL_DATA
+            reference = SAMPLE_FINANCIAL_DATA
+
+        path = 'local' if confidence >= args.threshold else 'llm'
+        if reference is None:
+            print(f"{name[:40]:<40} {confidence:>5.2f} {elapsed_ms:>7.1f} {'-':>9} {'-':>7}  {path} (no reference)")
+            continue
+        precision, recall = compare(local, reference)
+        rows.append((confidence, precision, recall, path))
+        print(f"{name[:40]:<40} {confidence:>5.2f} {elapsed_ms:>7.1f} {precision:>9.2f} {recall:>7.2f}  {path}")
+
+    if rows:
+        local_rows = [row for row in rows if row[3] == 'local']
+        print(f"\n{len(local_rows)}/{len(rows)} documents would skip the model at threshold {args.threshold}")
+        if local_rows:
+            print(f"Precision on those: {sum(row[1] for row in local_rows) / len(local_rows):.2f}, "
+                  f"recall: {sum(row[2] for row in local_rows) / len(local_rows):.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
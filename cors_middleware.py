@@ -1,28 +1,23 @@
 from flask import make_response, request
 
 def add_cors_headers(response):
-    print(f"Adding CORS headers to response with status code: {response.status_code}")
     response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Accept, X-Requested-With, Origin, Authorization'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, DELETE, OPTIONS'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Accept, X-Requested-With, Origin, Authorization, X-Admin-Token, X-Request-ID'
+    response.headers['Access-Control-Expose-Headers'] = 'X-Request-ID'
     response.headers['Access-Control-Allow-Credentials'] = 'true'
     response.headers['Access-Control-Max-Age'] = '3600'
-    print(f"CORS headers added: {dict(response.headers)}")
     return response
 
 def setup_cors_middleware(app):
     @app.after_request
     def after_request(response):
-        print(f"\n=== After Request Processing ===\nRequest Method: {request.method}\nEndpoint: {request.endpoint}\nMIME Type: {response.mimetype}")
         # Apply CORS headers to all responses
-        print("Adding CORS headers to response")
         return add_cors_headers(response)
 
     @app.before_request
     def handle_preflight():
-        print(f"\n=== Before Request Processing ===\nRequest Method: {request.method}\nHeaders: {dict(request.headers)}\nEndpoint: {request.endpoint}")
         if request.method == 'OPTIONS':
-            print("Handling OPTIONS preflight request")
             response = make_response()
             add_cors_headers(response)
             return response
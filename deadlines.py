@@ -0,0 +1,165 @@
+import contextvars
+import logging
+import os
+import socket
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+from observability import current_timings, registry
+
+logger = logging.getLogger(__name__)
+
+# Time budgets for requests. A view opens a deadline scope; the pipeline calls checkpoint()
+# between stages (and between pages), which raises RequestCancelled once the budget is spent
+# or the client has closed its connection, and the model call is given only what is left.
+# The budget counts from the start of the request, so time spent waiting for admission or
+# reading the upload is included.
+
+# Seconds a request may take (0 for no limit); below GUNICORN_TIMEOUT and the proxy's timeout,
+# so the client gets an answer saying what ran out instead of a dropped connection
+REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '100'))
+# The model is not called with less time than this left; such a call would only be abandoned
+MIN_LLM_SECONDS = float(os.getenv('DEADLINE_MIN_LLM_SECONDS', '5'))
+# Clients may ask for a shorter budget, in seconds
+TIMEOUT_HEADER = 'X-Request-Timeout'
+# Seconds between checks of the client connection; each is one non-blocking recv
+DISCONNECT_CHECK_INTERVAL = 0.5
+
+_deadline = contextvars.ContextVar('deadline', default=None)
+
+
+class RequestCancelled(Exception):
+    # The request's budget ran out ('deadline') or its client went away ('disconnected'); `stage` did not finish
+    def __init__(self, reason, stage, elapsed, budget):
+        super().__init__(f"Request {'out of time' if reason == 'deadline' else 'abandoned by its client'} at {stage} "
+                         f"after {elapsed:.1f}s")
+        self.reason = reason
+        self.stage = stage
+        self.elapsed = elapsed
+        self.budget = budget
+        # 499 is nginx's "client closed request"; nobody reads it, but logs and metrics do
+        self.status_code = 504 if reason == 'deadline' else 499
+
+
+class Deadline:
+    """A time budget plus, optionally, a way to tell that the client has gone away.
+
+    `budget` is in seconds (None for no limit) and counts from `started` (time.monotonic()).
+    `probe()` returns True once the client's connection is closed.
+    """
+
+    def __init__(self, budget=None, probe=None, started=None):
+        self.budget = budget
+        self.started = time.monotonic() if started is None else started
+        self.expires = self.started + budget if budget else None
+        self._probe = probe
+        self._probed_at = 0.0
+        self._disconnected = False
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        # Seconds left, or None without a limit
+        return None if self.expires is None else max(0.0, self.expires - time.monotonic())
+
+    def cancelled(self):
+        # 'deadline', 'disconnected' or None; the connection is checked at most every DISCONNECT_CHECK_INTERVAL
+        now = time.monotonic()
+        if self.expires is not None and now >= self.expires:
+            return 'deadline'
+        if self._probe is not None and not self._disconnected and now - self._probed_at >= DISCONNECT_CHECK_INTERVAL:
+            self._probed_at = now
+            self._disconnected = self._probe()
+        return 'disconnected' if self._disconnected else None
+
+    def check(self, stage, reserve=0.0):
+        # Raises RequestCancelled unless the client is still there and `reserve` seconds are left
+        reason = self.cancelled()
+        if reason is None and reserve and self.remaining() is not None and self.remaining() < reserve:
+            reason = 'deadline'
+        if reason is not None:
+            raise self.error(reason, stage)
+
+    def error(self, reason, stage):
+        # The RequestCancelled to raise, also for work abandoned elsewhere (an LLMCancelledError)
+        registry.inc('brm_requests_cancelled_total', reason=reason, stage=stage)
+        return RequestCancelled(reason, stage, self.elapsed(), self.budget)
+
+
+def connection_probe(environ):
+    # A check for a closed client connection, or None when the server does not expose the socket
+    sock = environ.get('gunicorn.socket') or environ.get('werkzeug.socket')
+    if sock is None:
+        return None
+
+    def closed():
+        try:
+            # An orderly close reads as b''; a pipelined next request reads as data
+            return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+        except BlockingIOError:
+            return False
+        except ValueError:
+            # TLS sockets refuse recv flags; the connection cannot be checked
+            return False
+        except OSError:
+            return True
+
+    return closed
+
+
+def current_deadline():
+    return _deadline.get()
+
+
+def checkpoint(stage, reserve=0.0):
+    # Called between pipeline stages; does nothing outside a deadline scope
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.check(stage, reserve)
+
+
+@contextmanager
+def deadline_scope(deadline):
+    # Work submitted with contextvars.copy_context() inside the scope shares the deadline
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def request_deadline(default=REQUEST_DEADLINE):
+    """The deadline of the current request: `default` seconds, or less if the client asks.
+
+    Raises ValueError for a malformed X-Request-Timeout header.
+    """
+    budget = default or None
+    asked = request.headers.get(TIMEOUT_HEADER)
+    if asked:
+        try:
+            asked = float(asked)
+        except ValueError:
+            raise ValueError(f'{TIMEOUT_HEADER} must be a number of seconds')
+        if not asked > 0:
+            raise ValueError(f'{TIMEOUT_HEADER} must be a number of seconds')
+        budget = min(budget, asked) if budget else asked
+    return Deadline(budget, connection_probe(request.environ), g.get('deadline_started'))
+
+
+def cancelled_response_body(error):
+    # Error body naming the stage that did not run, with the timings of the stages that did
+    return {'error': 'The request took too long and was stopped. Please try again or use /api/jobs for large reports.'
+            if error.reason == 'deadline' else 'The client closed the connection.',
+            'code': 'deadline_exceeded' if error.reason == 'deadline' else 'client_disconnected',
+            'stage': error.stage, 'elapsed_ms': round(error.elapsed * 1000, 1),
+            'budget_ms': round(error.budget * 1000, 1) if error.budget else None, 'timings': current_timings()}
+
+
+def setup_deadlines(app):
+    # Registered before the admission control so that a queued request's wait counts against its budget
+    @app.before_request
+    def start_clock():
+        g.deadline_started = time.monotonic()
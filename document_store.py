@@ -0,0 +1,91 @@
+import json
+import re
+import time
+
+from financial_metrics import compute_metrics
+from result_cache import ResultCache
+
+# Server-side sessions for processed documents. Chat requests refer to a document by id
+# instead of re-sending its data; the compact prompt context and the standard metrics
+# are computed once at upload.
+
+SECTIONS = [
+    ('Current assets', ('balance_sheet', 'assets', 'current')),
+    ('Non-current assets', ('balance_sheet', 'assets', 'non_current')),
+    ('Current liabilities', ('balance_sheet', 'liabilities', 'current')),
+    ('Non-current liabilities', ('balance_sheet', 'liabilities', 'non_current')),
+    ('Equity', ('balance_sheet', 'equity', None)),
+    ('Operating revenue', ('income_statement', 'revenue', 'operating')),
+    ('Non-operating revenue', ('income_statement', 'revenue', 'non_operating')),
+    ('Operating expenses', ('income_statement', 'expenses', 'operating')),
+    ('Non-operating expenses', ('income_statement', 'expenses', 'non_operating')),
+]
+
+DOCUMENT_ID_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+def document_key(financial_data, source_digest=None):
+    # Content digest of the statements, and of the source PDF when there is one: reports that
+    # parse to the same figures stay separate documents, each with its own company and period
+    parts = [json.dumps(financial_data, sort_keys=True, separators=(',', ':'))]
+    if source_digest is not None:
+        parts.append(source_digest)
+    return ResultCache.make_key(*parts)
+
+
+def _format_number(value):
+    return f"{value:.0f}" if float(value).is_integer() else f"{value:.2f}"
+
+
+def render_context(financial_data):
+    # One line per section, e.g. "Equity (total 8250000): Share Capital 5000000; Reserves and Surplus 3250000"
+    lines = []
+    for label, (statement, section, subcategory) in SECTIONS:
+        try:
+            group = financial_data[statement][section]
+            items = group if subcategory is None else group[subcategory]
+        except (KeyError, TypeError):
+            continue
+        values = [(item.get('name', ''), item.get('value', 0) or 0) for item in items if isinstance(item, dict)]
+        total = sum(value for _, value in values if isinstance(value, (int, float)))
+        details = '; '.join(f"{name} {_format_number(value)}" for name, value in values
+                            if isinstance(value, (int, float)))
+        lines.append(f"{label} (total {_format_number(total)}): {details or 'none'}")
+    return '\n'.join(lines)
+
+
+class DocumentStore:
+    """Stores processed documents under a content-derived id.
+
+    Backed by a ResultCache, so records live in a bounded in-process LRU in front of
+    a directory shared by all workers, and expire with the cache TTL.
+    """
+
+    def __init__(self, cache):
+        self._cache = cache
+
+    @property
+    def directory(self):
+        return self._cache.directory
+
+    def put(self, financial_data, source_digest=None):
+        # Re-uploads of the same PDF reuse the existing session
+        document_id = document_key(financial_data, source_digest)
+        if self._cache.get(document_id)[0] is None:
+            self._cache.set(document_id, {
+                'financial_data': financial_data,
+                'context': render_context(financial_data),
+                'metrics': compute_metrics(financial_data),
+                'source_digest': source_digest,
+                'created_at': time.time(),
+            })
+        return document_id
+
+    def get(self, document_id):
+        # Ids come from clients and end up in file paths, so only well-formed ids are looked up
+        if not isinstance(document_id, str) or not DOCUMENT_ID_PATTERN.fullmatch(document_id):
+            return None
+        return self._cache.get(document_id)[0]
+
+    def stats(self):
+        return self._cache.stats()
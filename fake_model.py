@@ -0,0 +1,183 @@
+import json
+import random
+import re
+import threading
+import time
+
+# Stand-in for genai.GenerativeModel used in tests, benchmarks and local runs (LLM_BACKEND=fake).
+# It never touches the network and answers with canned, valid outputs; the canned
+# statement matches the reports generated by synthetic_pdf.py. With a `seed`, latencies
+# and injected failures follow the same sequence on every run. An extraction prompt that
+# shows the shape of one statement only gets that statement, so split extraction produces
+# shorter answers, as it does with Gemini.
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'lognormal')
+
+SAMPLE_FINANCIAL_DATA = {
+    "balance_sheet": {
+        "assets": {
+            "current": [
+                {"name": "Inventories", "value": 2600000},
+                {"name": "Trade Receivables", "value": 2900000},
+                {"name": "Cash and Cash Equivalents", "value": 1150000},
+                {"name": "Short-Term Loans and Advances", "value": 760000}
+            ],
+            "non_current": [
+                {"name": "Property, Plant and Equipment", "value": 8900000},
+                {"name": "Intangible Assets", "value": 350000},
+                {"name": "Long-Term Loans and Advances", "value": 420000}
+            ]
+        },
+        "liabilities": {
+            "current": [
+                {"name": "Short-Term Borrowings", "value": 1500000},
+                {"name": "Trade Payables", "value": 2100000},
+                {"name": "Other Current Liabilities", "value": 640000},
+                {"name": "Short-Term Provisions", "value": 210000}
+            ],
+            "non_current": [
+                {"name": "Long-Term Borrowings", "value": 4200000},
+                {"name": "Deferred Tax Liabilities (Net)", "value": 180000}
+            ]
+        },
+        "equity": [
+            {"name": "Share Capital", "value": 5000000},
+            {"name": "Reserves and Surplus", "value": 3250000}
+        ]
+    },
+    "income_statement": {
+        "revenue": {
+            "operating": [
+                {"name": "Revenue from Operations", "value": 18500000}
+            ],
+            "non_operating": [
+                {"name": "Other Income", "value": 420000}
+            ]
+        },
+        "expenses": {
+            "operating": [
+                {"name": "Cost of Materials Consumed", "value": 9800000},
+                {"name": "Changes in Inventories of Finished Goods and Work-in-Progress", "value": 310000},
+                {"name": "Employee Benefits Expense", "value": 2700000},
+                {"name": "Other Expenses", "value": 1900000}
+            ],
+            "non_operating": [
+                {"name": "Finance Costs", "value": 560000},
+                {"name": "Depreciation and Amortization Expense", "value": 890000}
+            ]
+        }
+    }
+}
+
+SAMPLE_CHAT_ANSWER = """## Debt to Equity
+
+- **Total Debt**: 5,700,000
+- **Total Equity**: 8,250,000
+- **Debt to Equity**: **0.69**
+
+The company relies more on equity than on borrowings to fund its assets."""
+
+
+def fenced_json(data):
+    return f"```json\n{json.dumps(data, indent=2)}\n```"
+
+
+def json_in(text):
+    # The JSON object of a canned answer, with or without a code fence; None if there is none
+    try:
+        data = json.loads(re.sub(r'^\s*```(?:json)?|```\s*$', '', text))
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class FakeModelError(Exception):
+    # Mirrors google.api_core errors, which carry the HTTP status as `code`
+    def __init__(self, code=429, message='Resource has been exhausted (fake)'):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    # `latency` is the delay before the answer (or its first streamed chunk); `chunk_delay`
+    # is the gap between streamed chunks of `chunk_words` words. With a `latency_distribution`
+    # other than "fixed", each call draws its delay with `latency` as the median ("lognormal",
+    # spread `latency_sigma`) or the mean ("uniform" over 0..2x, "exponential").
+    # Errors can be injected: the first `fail_first` calls fail, and after that each call
+    # fails with `error_rate` probability, raising FakeModelError(`error_code`) before any output
+    def __init__(self, latency=0.0, extraction_text=None, chat_text=None, chunk_delay=0.0, chunk_words=4,
+                 error_rate=0.0, error_code=429, fail_first=0, seed=None, latency_distribution='fixed',
+                 latency_sigma=0.5):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.chunk_delay = chunk_delay
+        self.chunk_words = chunk_words
+        self.extraction_text = extraction_text or fenced_json(SAMPLE_FINANCIAL_DATA)
+        self._extraction_data = json_in(self.extraction_text)
+        self.chat_text = chat_text or SAMPLE_CHAT_ANSWER
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.fail_first = fail_first
+        self.calls = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        # (fail, latency) for the next call
+        with self._lock:
+            self.calls += 1
+            fail = self.calls <= self.fail_first or (self.error_rate and self._random.random() < self.error_rate)
+            self.failures += bool(fail)
+            if not self.latency or self.latency_distribution == 'fixed':
+                latency = self.latency
+            elif self.latency_distribution == 'uniform':
+                latency = self._random.uniform(0, 2 * self.latency)
+            elif self.latency_distribution == 'exponential':
+                latency = self._random.expovariate(1 / self.latency)
+            else:
+                latency = self.latency * self._random.lognormvariate(0, self.latency_sigma)
+        return fail, latency
+
+    def _answer(self, prompt):
+        if not prompt.lstrip().startswith('Extract financial data'):
+            return self.chat_text
+        requested = [key for key in self._extraction_data or {} if f'"{key}": {{' in prompt]
+        if len(requested) == 1:
+            return fenced_json({requested[0]: self._extraction_data[requested[0]]})
+        return self.extraction_text
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        fail, latency = self._draw()
+        text = self._answer(prompt)
+        if stream:
+            return self._stream(text, fail, latency)
+        # A buffered answer costs as long as generating every chunk would
+        chunks = -(-len(re.findall(r'\S+\s*', text)) // self.chunk_words)
+        delay = latency + self.chunk_delay * max(0, chunks - 1)
+        if fail:
+            # Failures come back after the initial latency, like a rejected request would
+            time.sleep(latency)
+            raise FakeModelError(self.error_code)
+        if delay:
+            time.sleep(delay)
+        return FakeResponse(text)
+
+    def _stream(self, text, fail=False, latency=0.0):
+        if latency:
+            time.sleep(latency)
+        if fail:
+            raise FakeModelError(self.error_code)
+        words = re.findall(r'\S+\s*', text)
+        for start in range(0, len(words), self.chunk_words):
+            if start and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield FakeResponse(''.join(words[start:start + self.chunk_words]))
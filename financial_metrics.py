@@ -0,0 +1,265 @@
+import re
+
+# Standard ratios computed from the parse_financial_data structure, so chat can answer
+# metric questions (or hand the model finished numbers) instead of asking it to do arithmetic.
+
+DEFAULT_ASSUMPTIONS = {
+    'cost_of_equity': 0.12,
+    # Used when the cost of debt cannot be implied from finance costs / borrowings
+    'cost_of_debt': 0.09,
+    'tax_rate': 0.30,
+}
+
+SECTIONS = {
+    'current_assets': ('balance_sheet', 'assets', 'current'),
+    'non_current_assets': ('balance_sheet', 'assets', 'non_current'),
+    'current_liabilities': ('balance_sheet', 'liabilities', 'current'),
+    'non_current_liabilities': ('balance_sheet', 'liabilities', 'non_current'),
+    'equity': ('balance_sheet', 'equity', None),
+    'operating_revenue': ('income_statement', 'revenue', 'operating'),
+    'non_operating_revenue': ('income_statement', 'revenue', 'non_operating'),
+    'operating_expenses': ('income_statement', 'expenses', 'operating'),
+    'non_operating_expenses': ('income_statement', 'expenses', 'non_operating'),
+}
+
+# Line items picked out by name, as (total name, sections searched, pattern)
+NAMED_ITEMS = [
+    ('cash', ('current_assets',), re.compile(r'cash|bank balance', re.I)),
+    ('inventories', ('current_assets',), re.compile(r'inventor|stock', re.I)),
+    ('receivables', ('current_assets',), re.compile(r'receivable|debtors', re.I)),
+    ('borrowings', ('current_liabilities', 'non_current_liabilities'),
+     re.compile(r'borrowing|loan|debt|debenture|bonds?\b|lease liabilit', re.I)),
+    ('finance_costs', ('operating_expenses', 'non_operating_expenses'),
+     re.compile(r'finance cost|interest', re.I)),
+    ('depreciation', ('operating_expenses', 'non_operating_expenses'),
+     re.compile(r'depreciation|amorti[sz]ation', re.I)),
+]
+
+METRIC_LABELS = {
+    'current_ratio': 'Current Ratio',
+    'quick_ratio': 'Quick Ratio',
+    'cash_ratio': 'Cash Ratio',
+    'debt_to_equity': 'Debt to Equity',
+    'liabilities_to_equity': 'Total Liabilities to Equity',
+    'debt_ratio': 'Debt Ratio',
+    'operating_margin': 'Operating Margin',
+    'ebitda_margin': 'EBITDA Margin',
+    'net_margin': 'Net Margin (before tax)',
+    'interest_coverage': 'Interest Coverage',
+    'return_on_equity': 'Return on Equity',
+    'return_on_assets': 'Return on Assets',
+    'wacc': 'WACC',
+}
+PERCENT_METRICS = {'operating_margin', 'ebitda_margin', 'net_margin', 'return_on_equity', 'return_on_assets', 'wacc'}
+
+
+def _items(financial_data, path):
+    statement, section, subcategory = path
+    try:
+        group = financial_data[statement][section]
+        items = group if subcategory is None else group[subcategory]
+    except (KeyError, TypeError):
+        return []
+    return [item for item in items if isinstance(item, dict) and isinstance(item.get('value'), (int, float))]
+
+
+def section_totals(financial_data):
+    # Section sums and named-item sums in a single walk over the line items
+    totals = {name: 0.0 for name in SECTIONS}
+    totals.update({name: 0.0 for name, _, _ in NAMED_ITEMS})
+    for section, path in SECTIONS.items():
+        for item in _items(financial_data, path):
+            value = float(item['value'])
+            totals[section] += value
+            for name, sections, pattern in NAMED_ITEMS:
+                if section in sections and pattern.search(item.get('name', '')):
+                    totals[name] += value
+    totals['total_assets'] = totals['current_assets'] + totals['non_current_assets']
+    totals['total_liabilities'] = totals['current_liabilities'] + totals['non_current_liabilities']
+    totals['total_revenue'] = totals['operating_revenue'] + totals['non_operating_revenue']
+    totals['total_expenses'] = totals['operating_expenses'] + totals['non_operating_expenses']
+    return totals
+
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def ratios(totals, assumptions=None):
+    assumptions = dict(DEFAULT_ASSUMPTIONS, **(assumptions or {}))
+    t = totals
+    profit_before_tax = t['total_revenue'] - t['total_expenses']
+    ebit = profit_before_tax + t['finance_costs']
+    operating_profit = t['operating_revenue'] - t['operating_expenses']
+    ebitda = ebit + t['depreciation']
+    net_income = profit_before_tax * (1 - assumptions['tax_rate']) if profit_before_tax > 0 else profit_before_tax
+
+    # Prefer interest-bearing debt; fall back to all liabilities when no borrowings are itemised
+    debt = t['borrowings'] or t['total_liabilities']
+    implied_cost_of_debt = _ratio(t['finance_costs'], t['borrowings']) if t['borrowings'] else None
+    cost_of_debt = implied_cost_of_debt if implied_cost_of_debt else assumptions['cost_of_debt']
+    capital = t['equity'] + debt
+    wacc = None
+    if capital > 0:
+        wacc = round(t['equity'] / capital * assumptions['cost_of_equity'] +
+                     debt / capital * cost_of_debt * (1 - assumptions['tax_rate']), 4)
+
+    return {
+        'current_ratio': _ratio(t['current_assets'], t['current_liabilities']),
+        'quick_ratio': _ratio(t['current_assets'] - t['inventories'], t['current_liabilities']),
+        'cash_ratio': _ratio(t['cash'], t['current_liabilities']),
+        'debt_to_equity': _ratio(debt, t['equity']),
+        'liabilities_to_equity': _ratio(t['total_liabilities'], t['equity']),
+        'debt_ratio': _ratio(t['total_liabilities'], t['total_assets']),
+        'operating_margin': _ratio(operating_profit, t['operating_revenue']),
+        'ebitda_margin': _ratio(ebitda, t['total_revenue']),
+        'net_margin': _ratio(profit_before_tax, t['total_revenue']),
+        'interest_coverage': _ratio(ebit, t['finance_costs']),
+        'return_on_equity': _ratio(net_income, t['equity']),
+        'return_on_assets': _ratio(net_income, t['total_assets']),
+        'wacc': wacc,
+        'wacc_inputs': {
+            'equity': t['equity'],
+            'debt': debt,
+            'debt_basis': 'borrowings' if t['borrowings'] else 'total_liabilities',
+            'cost_of_equity': assumptions['cost_of_equity'],
+            'cost_of_debt': cost_of_debt,
+            'cost_of_debt_source': 'implied' if implied_cost_of_debt else 'assumed',
+            'tax_rate': assumptions['tax_rate'],
+        },
+        'profit_before_tax': round(profit_before_tax, 2),
+        'ebit': round(ebit, 2),
+        'ebitda': round(ebitda, 2),
+    }
+
+
+def compute_metrics(financial_data, assumptions=None):
+    totals = section_totals(financial_data)
+    return {'totals': {name: round(value, 2) for name, value in totals.items()},
+            'ratios': ratios(totals, assumptions)}
+
+
+def compute_period_metrics(periods, assumptions=None):
+    """Metrics for several periods at once, laid out column-wise.
+
+    `periods` maps a period label (e.g. "FY2024") to its financial data. Returns
+    {'periods': [labels], 'totals': {name: [value per period]}, 'ratios': {...}}.
+    """
+    labels = list(periods)
+    per_period = [compute_metrics(periods[label], assumptions) for label in labels]
+    result = {'periods': labels, 'totals': {}, 'ratios': {}}
+    for group in ('totals', 'ratios'):
+        for name in per_period[0][group] if per_period else []:
+            if name == 'wacc_inputs':
+                continue
+            result[group][name] = [metrics[group][name] for metrics in per_period]
+    return result
+
+
+def format_metric(name, value):
+    if value is None:
+        return 'n/a'
+    if name in PERCENT_METRICS:
+        return f"{value * 100:.2f}%"
+    return f"{value:.2f}"
+
+
+def render_metrics(metrics):
+    # Compact "Name: value" list for prompts
+    return '\n'.join(f"- {label}: {format_metric(name, metrics['ratios'].get(name))}"
+                     for name, label in METRIC_LABELS.items())
+
+
+# Question phrasings that map to a single metric
+QUESTION_PATTERNS = [
+    ('wacc', re.compile(r'\bwacc\b|weighted average cost of capital', re.I)),
+    ('debt_to_equity', re.compile(r'debt[\s-]*(to|/)[\s-]*equity|\bd/?e ratio\b|gearing', re.I)),
+    ('current_ratio', re.compile(r'current ratio', re.I)),
+    ('quick_ratio', re.compile(r'quick ratio|acid[\s-]test', re.I)),
+    ('cash_ratio', re.compile(r'cash ratio', re.I)),
+    ('interest_coverage', re.compile(r'interest coverage|times interest earned', re.I)),
+    ('operating_margin', re.compile(r'operating (profit )?margin', re.I)),
+    ('ebitda_margin', re.compile(r'ebitda margin', re.I)),
+    ('net_margin', re.compile(r'net (profit )?margin|profit margin', re.I)),
+    ('return_on_equity', re.compile(r'\broe\b|return on equity', re.I)),
+    ('return_on_assets', re.compile(r'\broa\b|return on assets', re.I)),
+    ('debt_ratio', re.compile(r'debt ratio', re.I)),
+]
+# Questions that ask for more than a number (comparisons, advice, explanations) go to the model
+OPEN_QUESTION = re.compile(r'\b(why|how (can|could|should|to)|improve|compare|explain|trend|should|recommend|suggest)\b', re.I)
+
+
+def _within(span, spans):
+    # True when `span` lies inside a longer one of `spans`
+    return any(start <= span[0] and span[1] <= end and (start, end) != span for start, end in spans)
+
+
+def match_metric_question(message):
+    # Returns the metric name when the question asks for exactly one known metric, else None
+    if OPEN_QUESTION.search(message):
+        return None
+    spans = {name: [match.span() for match in pattern.finditer(message)] for name, pattern in QUESTION_PATTERNS}
+    # The most specific phrasing wins: "profit margin" inside "operating profit margin" is not
+    # a second metric
+    found = {name for name, own in spans.items() if own and not all(
+        any(_within(span, other_spans) for other, other_spans in spans.items() if other != name) for span in own)}
+    # "debt ratio" also matches inside "debt to equity ratio" phrasings
+    if 'debt_to_equity' in found:
+        found.discard('debt_ratio')
+    return found.pop() if len(found) == 1 else None
+
+
+def answer_metric_question(metric, metrics):
+    # Markdown answer in the same style the model is asked to use
+    value = metrics['ratios'][metric]
+    t = metrics['totals']
+    label = METRIC_LABELS[metric]
+    if value is None:
+        return (f"## {label}\n\nThe {label.lower()} cannot be calculated from the extracted statements "
+                f"because a required figure is zero or missing.")
+
+    lines = [f"## {label}", '', f"**{label}: {format_metric(metric, value)}**", '']
+    if metric == 'wacc':
+        inputs = metrics['ratios']['wacc_inputs']
+        lines += [
+            'WACC = (E/V) * Re + (D/V) * Rd * (1 - Tc)',
+            '',
+            f"- **E** (book equity): {inputs['equity']:,.0f}",
+            f"- **D** ({inputs['debt_basis'].replace('_', ' ')}): {inputs['debt']:,.0f}",
+            f"- **Re** (assumed cost of equity): {inputs['cost_of_equity'] * 100:.1f}%",
+            f"- **Rd** ({inputs['cost_of_debt_source']} cost of debt): {inputs['cost_of_debt'] * 100:.2f}%",
+            f"- **Tc** (assumed tax rate): {inputs['tax_rate'] * 100:.0f}%",
+            '',
+            'Book values are used in place of market values.',
+        ]
+    elif metric == 'debt_to_equity':
+        inputs = metrics['ratios']['wacc_inputs']
+        lines += [f"- **Total Debt** ({inputs['debt_basis'].replace('_', ' ')}): {inputs['debt']:,.0f}",
+                  f"- **Total Equity**: {t['equity']:,.0f}"]
+    elif metric in ('current_ratio', 'quick_ratio', 'cash_ratio'):
+        numerator = {'current_ratio': ('Current Assets', t['current_assets']),
+                     'quick_ratio': ('Current Assets less Inventories', t['current_assets'] - t['inventories']),
+                     'cash_ratio': ('Cash and Equivalents', t['cash'])}[metric]
+        lines += [f"- **{numerator[0]}**: {numerator[1]:,.0f}",
+                  f"- **Current Liabilities**: {t['current_liabilities']:,.0f}"]
+    elif metric == 'interest_coverage':
+        lines += [f"- **EBIT**: {metrics['ratios']['ebit']:,.0f}", f"- **Finance Costs**: {t['finance_costs']:,.0f}"]
+    elif metric in ('operating_margin', 'ebitda_margin', 'net_margin'):
+        # The numerator and denominator each margin is computed from, as (label, note, value)
+        r = metrics['ratios']
+        terms = {
+            'operating_margin': [('Operating Profit', 'operating revenue less operating expenses',
+                                  t['operating_revenue'] - t['operating_expenses']),
+                                 ('Operating Revenue', None, t['operating_revenue'])],
+            'ebitda_margin': [('EBITDA', 'profit before tax plus finance costs and depreciation', r['ebitda']),
+                              ('Total Revenue', None, t['total_revenue'])],
+            'net_margin': [('Profit before Tax', None, r['profit_before_tax']), ('Total Revenue', None, t['total_revenue'])],
+        }[metric]
+        lines += [f"- **{name}**{f' ({note})' if note else ''}: {amount:,.0f}" for name, note, amount in terms]
+    elif metric in ('return_on_equity', 'return_on_assets'):
+        lines += [f"- **Profit before Tax**: {metrics['ratios']['profit_before_tax']:,.0f}",
+                  f"- **Denominator**: {t['equity'] if metric == 'return_on_equity' else t['total_assets']:,.0f}",
+                  f"- Profit is taken after an assumed {metrics['ratios']['wacc_inputs']['tax_rate'] * 100:.0f}% tax"]
+    elif metric == 'debt_ratio':
+        lines += [f"- **Total Liabilities**: {t['total_liabilities']:,.0f}", f"- **Total Assets**: {t['total_assets']:,.0f}"]
+    return '\n'.join(lines)
@@ -1,3 +1,22 @@
+import os
+
 bind = "0.0.0.0:10000"
-workers = 2
-timeout = 120
\ No newline at end of file
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+# Import the app (and run its warm-up) once in the master; forked workers share that memory
+# copy-on-write and start serving immediately. The model client is still built per worker.
+preload_app = os.getenv('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+
+# Requests spend most of their time waiting on Gemini, so each worker serves several at once.
+# gthread (default) runs GUNICORN_THREADS requests per worker on threads; gevent runs up to
+# GUNICORN_WORKER_CONNECTIONS on greenlets and needs the gevent package; sync is one request
+# per worker, as before.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# gunicorn silently switches sync workers to gthread when threads > 1
+threads = int(os.getenv('GUNICORN_THREADS', '8')) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '100'))
+
+if worker_class == 'gevent':
+    # Page extraction would block every greenlet of the worker while it runs, so every
+    # document goes to the extraction process pool
+    os.environ.setdefault('PDF_EXTRACT_OFFLOAD', '1')
@@ -0,0 +1,205 @@
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobManager:
+    """Runs jobs on a bounded thread pool and records their progress.
+
+    Each job's state is written to `directory` as JSON after every event, so any
+    gunicorn worker can answer status and event-stream requests for a job that
+    another worker is running.
+    """
+
+    def __init__(self, directory, max_workers=2, max_queue=16, ttl=3600):
+        self.directory = directory
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._queued = 0
+        self._running = 0
+        self._counters = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'rejected': 0}
+        # Recent wait/run durations in seconds, for sizing the pool
+        self._wait_times = deque(maxlen=500)
+        self._run_times = deque(maxlen=500)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def submit(self, fn, *args, **kwargs):
+        # `fn(progress, *args, **kwargs)` must return a JSON-serializable result
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._counters['rejected'] += 1
+                raise QueueFullError(f"Job queue is full ({self._queued} waiting)")
+            job_id = uuid.uuid4().hex
+            job = {
+                'id': job_id,
+                'status': 'queued',
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'events': [],
+                'result': None,
+                'error': None,
+                'status_code': None,
+            }
+            self._jobs[job_id] = job
+            self._queued += 1
+            self._counters['submitted'] += 1
+        self._record(job_id, 'queued', queue_depth=self._queued)
+        # The job keeps the submitting request's context, so its log lines carry the same request id
+        self._executor.submit(contextvars.copy_context().run, self._run, job_id, fn, args, kwargs)
+        self._prune()
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        with self._lock:
+            job = self._jobs[job_id]
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+            self._queued -= 1
+            self._running += 1
+            wait_time = job['started_at'] - job['created_at']
+            self._wait_times.append(wait_time)
+        self._record(job_id, 'started', wait_ms=round(wait_time * 1000, 1))
+
+        def progress(stage, **details):
+            self._record(job_id, stage, **details)
+
+        try:
+            result = fn(progress, *args, **kwargs)
+            status, error, status_code = 'succeeded', None, 200
+        except Exception as e:
+            result, status, error = None, 'failed', str(e)
+            status_code = getattr(e, 'status_code', 500)
+            logger.error(f"Job {job_id} failed: {error}")
+
+        finished_at = time.time()
+        run_time = finished_at - job['started_at']
+        with self._lock:
+            self._run_times.append(run_time)
+            self._running -= 1
+            self._counters[status] += 1
+        logger.info(f"Job {job_id} {status}: waited {wait_time:.2f}s, ran {run_time:.2f}s")
+        # The terminal event and the final state land together so readers never see one without the other
+        self._record(job_id, status, updates={'finished_at': finished_at, 'status': status, 'result': result,
+                                              'error': error, 'status_code': status_code},
+                     run_ms=round(run_time * 1000, 1))
+
+    def _record(self, job_id, stage, updates=None, **details):
+        with self._lock:
+            job = self._jobs[job_id]
+            if updates:
+                job.update(updates)
+            job['events'].append(dict(stage=stage, time=round(time.time(), 3), **details))
+            # Persisting under the lock keeps snapshots on disk in event order
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(job, f, separators=(',', ':'))
+                os.replace(tmp_path, self._path(job_id))
+            except OSError as e:
+                logger.warning(f"Could not persist job {job_id}: {str(e)}")
+            self._changed.notify_all()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return json.loads(json.dumps(job))
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def iter_events(self, job_id, heartbeat=15.0, poll_interval=0.5):
+        """Yield job events as they happen; yields None as a keep-alive when idle.
+
+        Local jobs are followed through a condition variable, jobs owned by other
+        workers by polling their state file.
+        """
+        sent = 0
+        last_activity = time.monotonic()
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            events = job['events']
+            for event in events[sent:]:
+                yield event
+            if len(events) > sent:
+                last_activity = time.monotonic()
+            sent = len(events)
+            if job['status'] in ('succeeded', 'failed'):
+                return
+            if time.monotonic() - last_activity >= heartbeat:
+                last_activity = time.monotonic()
+                yield None
+            with self._lock:
+                local = self._jobs.get(job_id)
+                if local is not None and len(local['events']) == sent:
+                    self._changed.wait(timeout=min(heartbeat, 5.0))
+                    continue
+            if local is None:
+                time.sleep(poll_interval)
+
+    def stats(self):
+        with self._lock:
+            wait_times = sorted(self._wait_times)
+            run_times = sorted(self._run_times)
+            stats = dict(self._counters)
+            stats.update(queue_depth=self._queued, running=self._running,
+                         max_workers=self.max_workers, max_queue=self.max_queue)
+
+        def summary(values):
+            if not values:
+                return {'count': 0}
+            return {
+                'count': len(values),
+                'avg_ms': round(sum(values) / len(values) * 1000, 1),
+                'p50_ms': round(values[len(values) // 2] * 1000, 1),
+                'p95_ms': round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 1),
+                'max_ms': round(values[-1] * 1000, 1),
+            }
+
+        stats['wait_time'] = summary(wait_times)
+        stats['run_time'] = summary(run_times)
+        return stats
+
+    def _prune(self):
+        # Forget finished jobs older than the TTL, both in memory and on disk
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job['finished_at'] and job['finished_at'] < cutoff]:
+                del self._jobs[job_id]
+        try:
+            for filename in os.listdir(self.directory):
+                path = os.path.join(self.directory, filename)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+        except OSError:
+            pass
@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+import time
+
+from fake_model import FakeGenerativeModel
+
+logger = logging.getLogger(__name__)
+
+# Model backends selected with LLM_BACKEND. A backend is any object with
+# `generate_content(prompt, stream=False)` returning a response with `.text`, or with
+# stream=True an iterable of such chunks, like genai.GenerativeModel.
+
+
+def _read_text(path):
+    if not path:
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def create_gemini_model(model_name):
+    # Imported here so the fake backend works without the Gemini SDK configured
+    import google.generativeai as genai
+
+    logger.info("Initializing Gemini AI model...")
+    api_key = os.getenv('GOOGLE_API_KEY')
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY environment variable not found")
+
+    genai.configure(api_key=api_key)
+    # No connection is opened until the first call, so this is safe before gunicorn forks
+    model = genai.GenerativeModel(model_name)
+    logger.info("Successfully initialized Gemini AI model")
+    return model
+
+
+def create_fake_model(model_name=None):
+    # Deterministic local model for tests and load benchmarks, configured from FAKE_LLM_* variables
+    seed = os.getenv('FAKE_LLM_SEED')
+    model = FakeGenerativeModel(
+        latency=float(os.getenv('FAKE_LLM_LATENCY', '0')),
+        latency_distribution=os.getenv('FAKE_LLM_LATENCY_DISTRIBUTION', 'fixed'),
+        latency_sigma=float(os.getenv('FAKE_LLM_LATENCY_SIGMA', '0.5')),
+        chunk_delay=float(os.getenv('FAKE_LLM_CHUNK_DELAY', '0')),
+        error_rate=float(os.getenv('FAKE_LLM_ERROR_RATE', '0')),
+        error_code=int(os.getenv('FAKE_LLM_ERROR_CODE', '429')),
+        seed=int(seed) if seed else None,
+        extraction_text=_read_text(os.getenv('FAKE_LLM_EXTRACTION_FILE')),
+        chat_text=_read_text(os.getenv('FAKE_LLM_CHAT_FILE')),
+    )
+    logger.info("Using local fake model backend (%s latency %.3fs, error rate %.2f)",
+                model.latency_distribution, model.latency, model.error_rate)
+    return model
+
+
+BACKENDS = {
+    'gemini': create_gemini_model,
+    'fake': create_fake_model,
+}
+
+
+# Seconds before building a backend that failed is tried again
+INIT_RETRY_INTERVAL = float(os.getenv('LLM_INIT_RETRY_INTERVAL', '30'))
+
+
+class LazyModel:
+    """The configured backend, built on first use in each process.
+
+    Stands in for the model object: it is falsy while the backend cannot be built (the
+    reason is kept in `error` and reported by /readyz) and building is retried every
+    INIT_RETRY_INTERVAL seconds instead of leaving the worker without a model for good.
+    A model built before gunicorn forks is rebuilt in each worker.
+    """
+
+    def __init__(self, backend, model_name):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown LLM_BACKEND '{backend}', expected one of: {', '.join(sorted(BACKENDS))}")
+        self.backend = backend
+        self.model_name = model_name
+        self.error = None
+        self._model = None
+        self._pid = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        # The backend model, or None while it cannot be built
+        if self._model is not None and self._pid == os.getpid():
+            return self._model
+        with self._lock:
+            if self._pid == os.getpid():
+                if self._model is not None:
+                    return self._model
+                if self._failed_at is not None and time.monotonic() - self._failed_at < INIT_RETRY_INTERVAL:
+                    return None
+            self._pid = os.getpid()
+            try:
+                self._model = BACKENDS[self.backend](self.model_name)
+                self.error = self._failed_at = None
+            except Exception as e:
+                logger.error(f"Error initializing {self.backend} model: {str(e)}")
+                self._model = None
+                self.error = str(e)
+                self._failed_at = time.monotonic()
+            return self._model
+
+    def __bool__(self):
+        return self.get() is not None
+
+    def __getattr__(self, name):
+        # Backend attributes (e.g. the fake model's counters) pass through
+        model = self.get()
+        if model is None:
+            raise AttributeError(name)
+        return getattr(model, name)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        model = self.get()
+        if model is None:
+            raise RuntimeError(f"The {self.backend} model is not available: {self.error}")
+        return model.generate_content(prompt, stream=stream, **kwargs)
+
+    def status(self):
+        built = self._model is not None and self._pid == os.getpid()
+        return {'backend': self.backend, 'model': self.model_name, 'available': built, 'error': self.error}
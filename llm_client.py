@@ -0,0 +1,392 @@
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+
+from page_index import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# HTTP-style codes that are worth retrying; google.api_core exceptions expose them as `.code`
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    # The model cannot take the call right now (busy, rate limited or circuit open);
+    # `retry_after` is a hint in seconds for the client
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMTimeoutError(TimeoutError):
+    pass
+
+
+class LLMCancelledError(Exception):
+    # The caller gave up: its deadline passed ('deadline') or its client went away ('disconnected').
+    # Not retried and not held against the service by the circuit breaker
+    def __init__(self, reason):
+        super().__init__(f"AI call abandoned ({reason})")
+        self.reason = reason
+
+
+def is_retryable(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, 'code', None) in RETRYABLE_CODES
+
+
+class LLMClient:
+    """Wraps a generative model with the limits every call should go through.
+
+    - at most `max_concurrency` upstream calls at once, waiting up to `queue_timeout` for a slot
+    - a prompt token budget per minute (`tokens_per_minute`, 0 for none)
+    - up to `max_retries` retries of transient errors with full-jitter exponential backoff
+    - a circuit breaker that fails fast for `breaker_cooldown` seconds after
+      `breaker_threshold` consecutive transient failures, then lets one trial call through
+    - single-flight: identical prompts already in flight share one upstream call
+    - hedging: when `hedge_after` > 0 and a call is still running after that many seconds,
+      a second identical call is sent if a slot is free and the first answer wins
+
+    Calls may pass a `deadline`: an object with `remaining()` (seconds left, or None) and
+    `cancelled()` (the reason the caller gave up, or None). Waits for a slot, for the token
+    budget, for retries and for the answer are cut to what is left, and a caller that gives
+    up while waiting gets LLMCancelledError. An upstream call already sent cannot be stopped;
+    it keeps its slot until it returns.
+    """
+
+    # Seconds between checks of a caller's deadline while waiting for an answer
+    CANCEL_POLL_INTERVAL = 0.25
+
+    def __init__(self, model, max_concurrency=4, tokens_per_minute=0, max_retries=3, backoff_base=0.5,
+                 backoff_max=8.0, call_timeout=60.0, queue_timeout=30.0, breaker_threshold=5,
+                 breaker_cooldown=30.0, hedge_after=0.0):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.call_timeout = call_timeout
+        self.queue_timeout = queue_timeout
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.hedge_after = hedge_after
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # Every running call holds a slot, so the pool never needs more threads than slots
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._token_balance = float(tokens_per_minute)
+        self._token_refilled_at = time.monotonic()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._latencies = deque(maxlen=1000)
+        self._counters = {
+            'calls': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'transient_errors': 0,
+            'timeouts': 0, 'single_flight_joins': 0, 'hedges': 0, 'hedge_wins': 0,
+            'rejected_busy': 0, 'rejected_rate': 0, 'rejected_open': 0, 'breaker_opens': 0,
+            'cancelled': 0, 'throttled_seconds': 0.0,
+        }
+
+    def generate(self, prompt, deadline=None):
+        # Buffered call; returns the model's response object
+        key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        with self._lock:
+            self._counters['calls'] += 1
+            shared = self._in_flight.get(key)
+            if shared is None:
+                shared = self._in_flight[key] = Future()
+                leader = True
+            else:
+                self._counters['single_flight_joins'] += 1
+                leader = False
+        if not leader:
+            try:
+                return self._wait(shared, deadline)
+            except LLMCancelledError:
+                if deadline is not None and deadline.cancelled():
+                    raise
+                # The leader gave up on its own budget; this caller still has time to ask itself
+                return self.generate(prompt, deadline)
+
+        try:
+            response = self._generate_with_retries(prompt, deadline)
+        except BaseException as e:
+            shared.set_exception(e)
+            raise
+        else:
+            shared.set_result(response)
+            return response
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def generate_stream(self, prompt, deadline=None):
+        # Streamed call; retries happen only before the first chunk, and the slot is held
+        # until the caller finishes (or closes) the stream. The deadline is checked before
+        # each attempt, but the wait for the first chunk is not cut short
+        with self._lock:
+            self._counters['calls'] += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._before_attempt(prompt, deadline)
+                self._acquire_slot(deadline=deadline)
+            except LLMCancelledError as e:
+                self._after_failure(e, attempt)
+            started = time.monotonic()
+            try:
+                response = self.model.generate_content(prompt, stream=True)
+                chunks = iter(response)
+                first = next(chunks, None)
+            except Exception as e:
+                self._slots.release()
+                self._after_failure(e, attempt, deadline)
+                continue
+            self._after_success()
+            return StreamedResponse(response, chunks, first, lambda: self._finish_stream(started))
+
+    def _finish_stream(self, started):
+        self._slots.release()
+        with self._lock:
+            self._latencies.append(time.monotonic() - started)
+
+    def _generate_with_retries(self, prompt, deadline=None):
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                self._before_attempt(prompt, deadline)
+                response = self._call_hedged(prompt, deadline)
+            except Exception as e:
+                self._after_failure(e, attempt, deadline)
+                continue
+            self._after_success()
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+            return response
+
+    def _before_attempt(self, prompt, deadline=None):
+        self._check_cancelled(deadline)
+        self._check_breaker()
+        self._take_tokens(estimate_tokens(prompt), deadline)
+
+    @staticmethod
+    def _check_cancelled(deadline):
+        reason = deadline.cancelled() if deadline is not None else None
+        if reason is not None:
+            raise LLMCancelledError(reason)
+
+    @staticmethod
+    def _cap(timeout, deadline):
+        # `timeout` cut to the time the caller has left
+        remaining = deadline.remaining() if deadline is not None else None
+        return timeout if remaining is None else min(timeout, remaining)
+
+    def _wait(self, future, deadline=None):
+        # future.result(), giving up with LLMCancelledError when the caller does
+        if deadline is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=self._cap(self.CANCEL_POLL_INTERVAL, deadline))
+            except FutureTimeoutError:
+                self._check_cancelled(deadline)
+
+    def _after_failure(self, error, attempt, deadline=None):
+        # Re-raises unless the error is transient and retries are left; otherwise sleeps the backoff
+        if isinstance(error, LLMCancelledError):
+            with self._lock:
+                self._counters['cancelled'] += 1
+                # A half-open trial that was abandoned says nothing about the service
+                self._trial_running = False
+            raise error
+        if isinstance(error, LLMUnavailableError):
+            # Rejected locally (no slot or budget), the service itself was not reached
+            raise error
+        transient = is_retryable(error)
+        with self._lock:
+            if not transient:
+                self._counters['failed'] += 1
+                # The service answered, so the breaker treats it as healthy
+                self._consecutive_failures = 0
+                self._trial_running = False
+                self._opened_at = None
+            else:
+                self._counters['transient_errors'] += 1
+                self._counters['timeouts'] += isinstance(error, TimeoutError)
+                self._consecutive_failures += 1
+                if self._trial_running or self._consecutive_failures >= self.breaker_threshold:
+                    if self._opened_at is None or self._trial_running:
+                        self._counters['breaker_opens'] += 1
+                        logger.warning("LLM circuit opened after %d consecutive failures: %s",
+                                       self._consecutive_failures, error)
+                    self._opened_at = time.monotonic()
+                    self._trial_running = False
+        if not transient:
+            raise error
+        if attempt >= self.max_retries:
+            with self._lock:
+                self._counters['failed'] += 1
+            raise LLMUnavailableError(f"AI service unavailable after {attempt + 1} attempts: {error}",
+                                      retry_after=self.backoff_max) from error
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if self._cap(delay, deadline) < delay:
+            # No time left for another attempt
+            with self._lock:
+                self._counters['failed'] += 1
+                self._counters['cancelled'] += 1
+            raise LLMCancelledError('deadline') from error
+        with self._lock:
+            self._counters['retries'] += 1
+        logger.info("Retrying LLM call in %.2fs after %s", delay, error)
+        time.sleep(delay)
+
+    def _after_success(self):
+        with self._lock:
+            self._counters['succeeded'] += 1
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def _check_breaker(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.breaker_cooldown - (time.monotonic() - self._opened_at)
+            if remaining <= 0 and not self._trial_running:
+                # Half-open: this call is the trial, everyone else keeps failing fast
+                self._trial_running = True
+                return
+            self._counters['rejected_open'] += 1
+        raise LLMUnavailableError('AI service is temporarily unavailable', retry_after=max(1.0, remaining))
+
+    def _take_tokens(self, tokens, deadline=None):
+        if not self.tokens_per_minute:
+            return
+        tokens = min(tokens, self.tokens_per_minute)
+        rate = self.tokens_per_minute / 60.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._token_balance = min(self.tokens_per_minute,
+                                          self._token_balance + (now - self._token_refilled_at) * rate)
+                self._token_refilled_at = now
+                if self._token_balance >= tokens:
+                    self._token_balance -= tokens
+                    self._counters['throttled_seconds'] += waited
+                    return
+                delay = (tokens - self._token_balance) / rate
+                if waited + delay > self._cap(self.queue_timeout, deadline):
+                    self._counters['rejected_rate'] += 1
+                    self._trial_running = False
+                    raise LLMUnavailableError('AI token budget exhausted, please retry shortly', retry_after=delay)
+            time.sleep(delay)
+            waited += delay
+
+    def _acquire_slot(self, blocking=True, deadline=None):
+        timeout = self._cap(self.queue_timeout, deadline)
+        if self._slots.acquire(timeout=timeout) if blocking else self._slots.acquire(blocking=False):
+            return True
+        if blocking and timeout < self.queue_timeout:
+            raise LLMCancelledError('deadline')
+        if blocking:
+            with self._lock:
+                self._counters['rejected_busy'] += 1
+                self._trial_running = False
+            raise LLMUnavailableError('AI service is busy, please retry shortly', retry_after=self.backoff_max)
+        return False
+
+    def _submit(self, prompt):
+        future = self._executor.submit(self.model.generate_content, prompt)
+        # A call abandoned after a timeout keeps its slot until the upstream call returns
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _call_hedged(self, prompt, caller_deadline=None):
+        self._acquire_slot(deadline=caller_deadline)
+        primary = self._submit(prompt)
+        deadline = time.monotonic() + self.call_timeout
+        pending = {primary}
+        if self.hedge_after > 0:
+            done, _ = wait(pending, timeout=min(self.hedge_after, self.call_timeout))
+            if not done and self._acquire_slot(blocking=False):
+                pending.add(self._submit(prompt))
+                with self._lock:
+                    self._counters['hedges'] += 1
+
+        error = None
+        while pending:
+            timeout = max(0.0, deadline - time.monotonic())
+            if caller_deadline is not None:
+                timeout = self._cap(min(timeout, self.CANCEL_POLL_INTERVAL), caller_deadline)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if time.monotonic() >= deadline:
+                    raise LLMTimeoutError(f"AI call timed out after {self.call_timeout:g}s")
+                self._check_cancelled(caller_deadline)
+                continue
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        with self._lock:
+                            self._counters['hedge_wins'] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            latencies = sorted(self._latencies)
+            if self._opened_at is None:
+                stats['breaker'] = 'closed'
+            else:
+                stats['breaker'] = 'half_open' if self._trial_running else 'open'
+            stats['in_flight_prompts'] = len(self._in_flight)
+        stats['throttled_seconds'] = round(stats['throttled_seconds'], 3)
+        stats['max_concurrency'] = self.max_concurrency
+        stats['tokens_per_minute'] = self.tokens_per_minute
+
+        def percentile(share):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * share))] * 1000, 1)
+
+        stats['latency'] = {'count': len(latencies)}
+        if latencies:
+            stats['latency'].update(p50_ms=percentile(0.5), p95_ms=percentile(0.95), p99_ms=percentile(0.99),
+                                    max_ms=round(latencies[-1] * 1000, 1))
+        return stats
+
+
+class StreamedResponse:
+    # Iterates the model's chunks (starting with the one already read) and tells the
+    # client when the stream is finished; exposes the model response's usage metadata
+    def __init__(self, response, chunks, first, on_close):
+        self._response = response
+        self._chunks = chunks
+        self._first = first
+        self._on_close = on_close
+        self._closed = False
+
+    @property
+    def usage_metadata(self):
+        return getattr(self._response, 'usage_metadata', None)
+
+    def __iter__(self):
+        try:
+            if self._first is not None:
+                yield self._first
+            yield from self._chunks
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._on_close()
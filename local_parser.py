@@ -0,0 +1,194 @@
+import re
+
+from page_index import clean_pages, find_statement_pages
+
+# Rule-based parser for Indian Schedule III / Ind AS statements. It maps recognised
+# line items straight into the structure parse_financial_data produces, and reports
+# how confident it is so the caller can decide whether Gemini is still needed.
+
+BS_ASSETS_CURRENT = ('balance_sheet', 'assets', 'current')
+BS_ASSETS_NON_CURRENT = ('balance_sheet', 'assets', 'non_current')
+BS_LIABILITIES_CURRENT = ('balance_sheet', 'liabilities', 'current')
+BS_LIABILITIES_NON_CURRENT = ('balance_sheet', 'liabilities', 'non_current')
+BS_EQUITY = ('balance_sheet', 'equity', None)
+IS_REVENUE_OPERATING = ('income_statement', 'revenue', 'operating')
+IS_REVENUE_NON_OPERATING = ('income_statement', 'revenue', 'non_operating')
+IS_EXPENSES_OPERATING = ('income_statement', 'expenses', 'operating')
+IS_EXPENSES_NON_OPERATING = ('income_statement', 'expenses', 'non_operating')
+
+# Labels whose placement does not depend on the surrounding heading
+FIXED_RULES = [
+    (r'(equity )?share capital|money received against share warrants|share application money', BS_EQUITY),
+    (r'reserves (and|&) surplus|other equity', BS_EQUITY),
+    (r'long[- ]term borrowings', BS_LIABILITIES_NON_CURRENT),
+    (r'other long[- ]term liabilities|long[- ]term provisions', BS_LIABILITIES_NON_CURRENT),
+    (r'short[- ]term borrowings', BS_LIABILITIES_CURRENT),
+    (r'trade payables?|sundry creditors', BS_LIABILITIES_CURRENT),
+    (r'other current liabilities|short[- ]term provisions|current tax liabilities( \(net\))?', BS_LIABILITIES_CURRENT),
+    (r'property,? plant (and|&) equipment|tangible assets|fixed assets', BS_ASSETS_NON_CURRENT),
+    (r'intangible assets( under development)?|goodwill|right[- ]of[- ]use assets|investment property', BS_ASSETS_NON_CURRENT),
+    (r'capital work[- ]in[- ]progress|non[- ]current investments|long[- ]term loans (and|&) advances', BS_ASSETS_NON_CURRENT),
+    (r'deferred tax assets( \(net\))?|other non[- ]current assets', BS_ASSETS_NON_CURRENT),
+    (r'current investments|inventories|trade receivables|sundry debtors', BS_ASSETS_CURRENT),
+    (r'cash (and|&) cash equivalents|cash (and|&) bank balances|bank balances other than.*', BS_ASSETS_CURRENT),
+    (r'short[- ]term loans (and|&) advances|other current assets|current tax assets( \(net\))?', BS_ASSETS_CURRENT),
+    (r'revenue from operations|sales|income from operations|net sales', IS_REVENUE_OPERATING),
+    (r'other income|interest income|dividend income', IS_REVENUE_NON_OPERATING),
+    (r'cost of materials? consumed|purchases? of stock[- ]in[- ]trade|cost of goods sold', IS_EXPENSES_OPERATING),
+    (r'changes in inventories.*', IS_EXPENSES_OPERATING),
+    (r'employees? benefits? expenses?|salaries (and|&) wages', IS_EXPENSES_OPERATING),
+    (r'other expenses|manufacturing expenses|administrative expenses', IS_EXPENSES_OPERATING),
+    (r'finance costs?|interest expenses?', IS_EXPENSES_NON_OPERATING),
+    (r'depreciation (and|&) amorti[sz]ation expenses?|depreciation', IS_EXPENSES_NON_OPERATING),
+]
+
+# Labels placed by the heading they appear under (Ind AS layouts repeat these in both halves)
+CONTEXT_RULES = [
+    r'borrowings', r'lease liabilities', r'provisions', r'other financial liabilities',
+    r'deferred tax liabilities( \(net\))?', r'other liabilities', r'investments', r'loans',
+    r'other financial assets', r'other assets',
+]
+
+HEADINGS = [
+    (re.compile(r'^non[- ]current liabilities'), 'non_current_liabilities'),
+    (re.compile(r'^current liabilities'), 'current_liabilities'),
+    (re.compile(r'^non[- ]current assets'), 'non_current_assets'),
+    (re.compile(r'^current assets'), 'current_assets'),
+    (re.compile(r"^(shareholders'? funds|equity)$"), 'equity'),
+]
+CONTEXT_TARGETS = {
+    'non_current_liabilities': BS_LIABILITIES_NON_CURRENT,
+    'current_liabilities': BS_LIABILITIES_CURRENT,
+    'non_current_assets': BS_ASSETS_NON_CURRENT,
+    'current_assets': BS_ASSETS_CURRENT,
+}
+
+COMPILED_FIXED = [(re.compile(rf'^(?:{pattern})$'), target) for pattern, target in FIXED_RULES]
+COMPILED_CONTEXT = re.compile(rf"^(?:{'|'.join(CONTEXT_RULES)})$")
+
+# "Trade Payables 5 21,00,000 18,90,000" -> label, optional note number, amounts
+AMOUNT = r'\(?-?\d[\d,]*(?:\.\d+)?\)?'
+LINE_PATTERN = re.compile(rf'^(?P<label>[A-Za-z(][^\d]*?)\s+(?P<amounts>(?:{AMOUNT}\s*)+)$')
+AMOUNT_PATTERN = re.compile(AMOUNT)
+LABEL_NOISE = re.compile(r'^(\(?[a-z]{1,4}\)|[a-z]{1,3}\.|[ivx]+\.)\s+|\s*\(refer note.*?\)|\s*note\s*\d*$', re.I)
+SKIP_PATTERN = re.compile(r'^(total|sub[- ]total|profit|loss|earnings per share|tax expense|current tax|deferred tax$|'
+                          r'as at|for the year|particulars|note)', re.I)
+
+# Items whose absence makes a parse suspicious
+ANCHORS = [BS_EQUITY, BS_ASSETS_CURRENT, BS_LIABILITIES_CURRENT, IS_REVENUE_OPERATING, IS_EXPENSES_OPERATING]
+# Share of numeric statement lines that must be recognised. Nothing cross-checks the P&L the
+# way the balance check does the balance sheet, so a single unrecognised P&L line (which
+# would be dropped, overstating profit) also sends the document to the model
+MIN_COVERAGE = 0.98
+# Confidence reported for such parses: below any threshold worth running with
+UNSAFE_CONFIDENCE = 0.5
+
+
+def parse_amount(text):
+    # The output schema only carries positive values, so brackets and minus signs are dropped
+    digits = text.strip('()').replace(',', '').lstrip('-')
+    try:
+        value = float(digits)
+    except ValueError:
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def _clean_label(label):
+    return LABEL_NOISE.sub('', label.strip()).strip(' :-')
+
+
+def _empty_structure():
+    return {
+        'balance_sheet': {
+            'assets': {'current': [], 'non_current': []},
+            'liabilities': {'current': [], 'non_current': []},
+            'equity': [],
+        },
+        'income_statement': {
+            'revenue': {'operating': [], 'non_operating': []},
+            'expenses': {'operating': [], 'non_operating': []},
+        },
+    }
+
+
+def _items(data, target):
+    statement, section, subcategory = target
+    return data[statement][section] if subcategory is None else data[statement][section][subcategory]
+
+
+def _total(data, *targets):
+    return sum(item['value'] for target in targets for item in _items(data, target))
+
+
+def parse_statements(pages):
+    """Parse statement pages into the parse_financial_data structure.
+
+    Returns (data, confidence, unmapped) where confidence is between 0 and 1 and
+    unmapped lists the numeric lines on statement pages that no rule recognised.
+    """
+    cleaned = clean_pages(pages)
+    found = find_statement_pages(cleaned)
+    statement_pages = sorted({i for indices in found.values() for i in indices})
+    income_pages = set(found.get('income_statement', []))
+
+    data = _empty_structure()
+    seen = set()
+    unmapped = []
+    unmapped_income = 0
+    candidates = 0
+    for i in statement_pages:
+        context = None
+        for line in cleaned[i].splitlines():
+            lowered = line.lower().strip()
+            for pattern, heading in HEADINGS:
+                if pattern.match(lowered):
+                    context = heading
+                    break
+
+            match = LINE_PATTERN.match(line)
+            if not match:
+                continue
+            label = _clean_label(match.group('label'))
+            if not label or SKIP_PATTERN.match(label):
+                continue
+            amounts = AMOUNT_PATTERN.findall(match.group('amounts'))
+            # A leading small bare integer is the "Note No." column, not an amount
+            if len(amounts) > 1 and re.fullmatch(r'\d{1,2}', amounts[0]):
+                amounts = amounts[1:]
+            value = parse_amount(amounts[0])
+            if value is None:
+                continue
+            candidates += 1
+
+            key = label.lower()
+            target = next((target for pattern, target in COMPILED_FIXED if pattern.match(key)), None)
+            if target is None and COMPILED_CONTEXT.match(key):
+                target = CONTEXT_TARGETS.get(context)
+            if target is None:
+                unmapped.append(line)
+                unmapped_income += i in income_pages
+                continue
+            if (target, key) in seen:
+                continue
+            seen.add((target, key))
+            _items(data, target).append({'name': label, 'value': value})
+
+    return data, _confidence(data, candidates, len(unmapped), unmapped_income), unmapped
+
+
+def _confidence(data, candidates, unmapped_count, unmapped_income=0):
+    if not candidates:
+        return 0.0
+    anchors = sum(1 for target in ANCHORS if _items(data, target)) / len(ANCHORS)
+    coverage = 1 - unmapped_count / candidates
+
+    assets = _total(data, BS_ASSETS_CURRENT, BS_ASSETS_NON_CURRENT)
+    funding = _total(data, BS_LIABILITIES_CURRENT, BS_LIABILITIES_NON_CURRENT, BS_EQUITY)
+    # A balance sheet that balances is strong evidence nothing was missed or misread
+    balanced = 1.0 if assets and abs(assets - funding) <= 0.02 * assets else 0.0
+
+    score = round(0.3 * anchors + 0.4 * balanced + 0.3 * coverage, 3)
+    if unmapped_income or coverage < MIN_COVERAGE:
+        return min(score, UNSAFE_CONFIDENCE)
+    return score
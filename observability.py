@@ -0,0 +1,318 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, request
+
+# Request ids, sampled logging, stage timers and a Prometheus-style /metrics exposition.
+#
+# Metrics are kept per process and each process periodically writes a snapshot to a shared
+# directory, so a scrape answered by any gunicorn worker reports the sum over all workers.
+
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'brm-metrics'))
+# Share of requests whose INFO/DEBUG logs are emitted; warnings and errors are always kept
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+# "text" or "json" (one object per line)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+SNAPSHOT_INTERVAL = 1.0
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+_request_id = contextvars.ContextVar('request_id', default='-')
+_log_sampled = contextvars.ContextVar('log_sampled', default=True)
+_stage_timings = contextvars.ContextVar('stage_timings', default=None)
+
+DESCRIPTIONS = {
+    'brm_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status'),
+    'brm_http_errors_total': ('counter', 'HTTP responses with a 5xx status or an unhandled exception'),
+    'brm_http_requests_in_flight': ('gauge', 'HTTP requests currently being handled'),
+    'brm_http_request_duration_seconds': ('histogram', 'Time until the response (or its first byte when streamed)'),
+    'brm_stage_duration_seconds': ('histogram', 'Time spent in each pipeline stage'),
+    'brm_stage_errors_total': ('counter', 'Pipeline stages that raised'),
+    'brm_llm_ttft_seconds': ('histogram', 'Time to the first streamed model chunk'),
+    'brm_llm_json_total': ('counter', 'Model extraction answers parsed cleanly, repaired or unreadable'),
+    'brm_llm_json_repairs_total': ('counter', 'Fixes applied to model extraction answers by kind'),
+    'brm_llm_json_values_total': ('counter', 'Extracted amounts converted from text, defaulted to 0 or dropped'),
+    'brm_extraction_section_retries_total': ('counter', 'Split extraction calls asked again after an unusable answer, by statement'),
+    'brm_requests_cancelled_total': ('counter', 'Requests stopped by their deadline or a client disconnect, by stage'),
+    'brm_admission_total': ('counter', 'Requests admitted at once, after queueing, or shed by the admission control'),
+    'brm_statement_store_writes_total': ('counter', 'Documents written to the statement store: new, updated labels or failed'),
+    'brm_profiles_total': ('counter', 'Request profiles saved, discarded as too fast, or not saved because of an error'),
+    'brm_result_cache_hits_total': ('counter', 'Result cache hits by tier'),
+    'brm_result_cache_misses_total': ('counter', 'Result cache misses'),
+    'brm_answer_cache_hits_total': ('counter', 'Chat answers served from the answer cache by tier'),
+    'brm_answer_cache_misses_total': ('counter', 'Chat questions not found in the answer cache'),
+    'brm_job_queue_depth': ('gauge', 'Jobs waiting for a worker'),
+    'brm_jobs_running': ('gauge', 'Jobs being processed'),
+    'brm_jobs_rejected_total': ('counter', 'Jobs rejected because the queue was full'),
+}
+
+
+class Metrics:
+    """Counters, gauges and fixed-bucket histograms for one process."""
+
+    def __init__(self, directory=METRICS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+        self._last_snapshot = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add(self, name, amount, **labels):
+        # Gauges move both ways, e.g. requests in flight
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(DURATION_BUCKETS), 0.0, 0]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    def register_collector(self, collect):
+        # `collect()` returns [(name, kind, value, labels)] read at snapshot time, for numbers
+        # that other components already keep (cache hits, queue depth)
+        self._collectors.append(collect)
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                'gauges': [[name, dict(labels), value] for (name, labels), value in self._gauges.items()],
+                'histograms': [[name, dict(labels)] + [list(buckets), total, count]
+                               for (name, labels), (buckets, total, count) in self._histograms.items()],
+            }
+        for collect in self._collectors:
+            try:
+                for name, kind, value, labels in collect():
+                    snapshot['counters' if kind == 'counter' else 'gauges'].append([name, labels, value])
+            except Exception as e:
+                logging.getLogger(__name__).warning("Metrics collector failed: %s", e)
+        return snapshot
+
+    def write_snapshot(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_snapshot < SNAPSHOT_INTERVAL:
+            return
+        self._last_snapshot = now
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _live_snapshots(self):
+        yield self.snapshot()
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                pid = int(filename[:-5])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                # Worker exited; its counters go with it, as they would on a restart
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4, summed over all live workers
+        counters, gauges, histograms = {}, {}, {}
+        for snapshot in self._live_snapshots():
+            for target, rows in ((counters, snapshot['counters']), (gauges, snapshot['gauges'])):
+                for name, labels, value in rows:
+                    key = self._key(name, labels)
+                    target[key] = target.get(key, 0) + value
+            for name, labels, buckets, total, count in snapshot['histograms']:
+                key = self._key(name, labels)
+                merged = histograms.setdefault(key, [[0] * len(DURATION_BUCKETS), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+                merged[2] += count
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                help_text = DESCRIPTIONS.get(name, (kind, name.replace('_', ' ')))[1]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for kind, series in (('counter', counters), ('gauge', gauges)):
+            for (name, labels), value in sorted(series.items()):
+                describe(name, kind)
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, bucket in zip(DURATION_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for key, value in labels)
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else f"{value:.6f}"
+
+
+registry = Metrics()
+
+
+@contextmanager
+def stage(name):
+    # Times a pipeline stage into brm_stage_duration_seconds and the current request's timings
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.inc('brm_stage_errors_total', stage=name)
+        raise
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def record_stage(name, elapsed):
+    # For stages whose start and end are not in one block; `elapsed` is in seconds
+    registry.observe('brm_stage_duration_seconds', elapsed, stage=name)
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[name] = round(timings.get(name, 0.0) + elapsed * 1000, 2)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def current_timings():
+    # Milliseconds per stage for the request being handled, e.g. {'pdf_extract': 812.4}
+    return dict(_stage_timings.get() or {})
+
+
+class RequestContextFilter(logging.Filter):
+    # Adds `request_id` to every record and drops INFO/DEBUG records of unsampled requests
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return record.levelno >= logging.WARNING or _log_sampled.get()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def configure_logging(level=logging.INFO):
+    logging.basicConfig(level=level)
+    formatter = JsonFormatter() if LOG_FORMAT == 'json' else \
+        logging.Formatter('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s')
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(RequestContextFilter())
+        handler.setFormatter(formatter)
+
+
+def setup_observability(app):
+    logger = logging.getLogger(__name__)
+
+    @app.before_request
+    def start_request():
+        # A well-formed X-Request-ID from a proxy is kept so logs can be joined across hops
+        incoming = request.headers.get('X-Request-ID', '')
+        _request_id.set(incoming if REQUEST_ID_PATTERN.fullmatch(incoming) else uuid.uuid4().hex[:16])
+        _log_sampled.set(LOG_SAMPLE_RATE >= 1.0 or random.random() < LOG_SAMPLE_RATE)
+        _stage_timings.set({})
+        g.observability_started = time.perf_counter()
+        registry.add('brm_http_requests_in_flight', 1)
+
+    @app.after_request
+    def tag_response(response):
+        response.headers['X-Request-ID'] = _request_id.get()
+        g.observability_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request(error=None):
+        started = g.pop('observability_started', None)
+        if started is None:
+            return
+        registry.add('brm_http_requests_in_flight', -1)
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        status = 500 if error is not None else g.pop('observability_status', 500)
+        registry.inc('brm_http_requests_total', endpoint=endpoint, method=request.method, status=status)
+        registry.observe('brm_http_request_duration_seconds', elapsed, endpoint=endpoint)
+        if status >= 500:
+            registry.inc('brm_http_errors_total', endpoint=endpoint)
+        logger.info("%s %s %s %.1fms stages=%s", request.method, request.path, status, elapsed * 1000,
+                    _stage_timings.get())
+        registry.write_snapshot()
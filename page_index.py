@@ -0,0 +1,189 @@
+import re
+from collections import Counter
+
+# Phrases that mark the statements themselves, and line items that show up on them
+TITLE_PATTERNS = {
+    'balance_sheet': re.compile(r'balance\s+sheet|statement\s+of\s+financial\s+position', re.I),
+    'income_statement': re.compile(r'profit\s+(and|&)\s+loss|statement\s+of\s+(profit|income|operations)|income\s+statement', re.I),
+}
+KEYWORDS = {
+    'balance_sheet': [
+        'share capital', 'reserves and surplus', 'borrowings', 'trade payables', 'trade receivables',
+        'inventories', 'cash and cash equivalents', 'property, plant', 'current liabilities',
+        'current assets', 'non-current', 'provisions', 'equity and liabilities', 'total assets',
+        'intangible assets', 'capital work-in-progress', 'loans and advances',
+    ],
+    'income_statement': [
+        'revenue from operations', 'other income', 'total income', 'cost of materials consumed',
+        'employee benefit', 'finance cost', 'depreciation', 'amortisation', 'amortization',
+        'other expenses', 'profit before tax', 'tax expense', 'profit for the year', 'earnings per share',
+        'changes in inventories', 'purchases of stock',
+    ],
+}
+# Boilerplate that looks numeric but never holds the statements
+PENALTY_PATTERN = re.compile(r"auditor'?s'? report|independent auditor|annexure|cash flow|"
+                             r'notes to (the )?financial statements|significant accounting policies', re.I)
+
+NUMBER_PATTERN = re.compile(r'\(?-?\d[\d,]*(?:\.\d+)?\)?')
+HORIZONTAL_SPACE = re.compile(r'[ \t ]+')
+DIGITS = re.compile(r'\d+')
+
+# Pages scoring below this are not worth budget even when there is room left
+MIN_FILL_SCORE = 4.0
+
+# Lines within this distance of the top or bottom of a page are header/footer candidates
+EDGE_LINES = 3
+
+
+def estimate_tokens(text):
+    # Rough count for budgeting; Gemini averages about four characters per token on English text
+    return (len(text) + 3) // 4
+
+
+def collapse_whitespace(text):
+    lines = (HORIZONTAL_SPACE.sub(' ', line).strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def strip_repeated_lines(pages, min_share=0.5):
+    # Drop header/footer lines that repeat on most pages; digits are masked so "Page 7" matches "Page 8"
+    if len(pages) < 3:
+        return [page.splitlines() for page in pages]
+    split_pages = [page.splitlines() for page in pages]
+    counts = Counter()
+    for lines in split_pages:
+        edge = lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+        counts.update({DIGITS.sub('#', line.strip()) for line in edge if line.strip()})
+    threshold = max(2, int(len(pages) * min_share))
+    repeated = {line for line, count in counts.items() if count >= threshold}
+    if not repeated:
+        return split_pages
+
+    cleaned = []
+    for lines in split_pages:
+        last = len(lines) - EDGE_LINES
+        cleaned.append([line for i, line in enumerate(lines)
+                        if not ((i < EDGE_LINES or i >= last) and DIGITS.sub('#', line.strip()) in repeated)])
+    return cleaned
+
+
+def score_page(text):
+    # Returns (score, statement) where statement is the statement the page most looks like, if any
+    lowered = text.lower()
+    lines = [line for line in text.splitlines() if line.strip()]
+    numbers = NUMBER_PATTERN.findall(text)
+    numeric_density = len(numbers) / max(1, len(lines))
+
+    best_statement, best_score = None, 0.0
+    for statement, keywords in KEYWORDS.items():
+        hits = sum(1 for keyword in keywords if keyword in lowered)
+        score = hits * 2.0
+        if TITLE_PATTERNS[statement].search(text[:400]):
+            score += 10.0
+        if score > best_score:
+            best_statement, best_score = statement, score
+
+    score = best_score + min(numeric_density, 4.0) * 2.0
+    if PENALTY_PATTERN.search(text[:400]):
+        score *= 0.3
+    return score, best_statement
+
+
+def clean_pages(pages):
+    # Header/footer stripping and whitespace collapsing, page by page
+    return [collapse_whitespace('\n'.join(lines)) for lines in strip_repeated_lines(pages)]
+
+
+def find_statement_pages(cleaned, scores=None):
+    # Maps each statement to its best-scoring page plus the page after it, where statements usually spill over
+    if scores is None:
+        scores = [score_page(text) if text else (0.0, None) for text in cleaned]
+    found = {}
+    for statement in TITLE_PATTERNS:
+        candidates = [(score, i) for i, (score, kind) in enumerate(scores) if kind == statement]
+        if candidates:
+            _, best = max(candidates)
+            found[statement] = [best] + ([best + 1] if best + 1 < len(cleaned) and cleaned[best + 1] else [])
+    return found
+
+
+def compact_pages(pages, token_budget=30000):
+    """Select and compact the pages worth sending to the model.
+
+    Repeated headers/footers are stripped and whitespace collapsed on every page.
+    The balance sheet and profit & loss pages from find_statement_pages are always
+    kept; the rest of the budget is filled by score. Pages are returned in document
+    order. Documents that already fit, or a budget of 0, keep every non-empty page.
+
+    Returns (compacted_text, stats).
+    """
+    cleaned = clean_pages(pages)
+
+    scores = [score_page(text) if text else (0.0, None) for text in cleaned]
+    total_tokens = sum(estimate_tokens(text) for text in cleaned)
+    if token_budget and 0 < token_budget < total_tokens:
+        selected = {i for indices in find_statement_pages(cleaned, scores).values() for i in indices}
+        used = sum(estimate_tokens(cleaned[i]) for i in selected)
+        for i in sorted(range(len(cleaned)), key=lambda i: -scores[i][0]):
+            if i in selected or scores[i][0] < MIN_FILL_SCORE:
+                continue
+            cost = estimate_tokens(cleaned[i])
+            if used + cost > token_budget:
+                continue
+            selected.add(i)
+            used += cost
+    else:
+        selected = {i for i, text in enumerate(cleaned) if text}
+
+    text = render_pages(cleaned, selected)
+    return text, compaction_stats(pages, selected, text)
+
+
+def render_pages(cleaned, selected):
+    return '\n\n'.join(f"[Page {i + 1}]\n{cleaned[i]}" for i in sorted(selected))
+
+
+def compaction_stats(pages, selected, text):
+    original_chars = sum(len(page) for page in pages)
+    return {
+        'pages_total': len(pages),
+        'pages_selected': len(selected),
+        'chars_before': original_chars,
+        'chars_after': len(text),
+        'tokens_before': (original_chars + 3) // 4,
+        'tokens_after': estimate_tokens(text),
+    }
+
+
+def compact_statement_pages(pages, token_budget=30000):
+    """Select and compact the pages for each statement, to extract them with separate prompts.
+
+    Each statement gets its pages from find_statement_pages and every page titled as it,
+    then the pages that look most like it by score, within an equal share of
+    `token_budget` (0 for no limit). Returns {statement: (compacted_text, stats)}, or None
+    when a statement's pages cannot be found and the document should go to the model whole.
+    """
+    cleaned = clean_pages(pages)
+    scores = [score_page(text) if text else (0.0, None) for text in cleaned]
+    found = find_statement_pages(cleaned, scores)
+    if len(found) < len(TITLE_PATTERNS):
+        return None
+
+    share = token_budget // len(found) if token_budget else 0
+    sections = {}
+    for statement, indices in found.items():
+        # Small reports often print both statements on one page, which then goes to both prompts
+        titled = [i for i, text in enumerate(cleaned) if TITLE_PATTERNS[statement].search(text[:400])]
+        selected = set(indices)
+        used = sum(estimate_tokens(cleaned[i]) for i in selected)
+        fill = sorted((i for i, (score, kind) in enumerate(scores) if kind == statement and score >= MIN_FILL_SCORE),
+                      key=lambda i: -scores[i][0])
+        for i in titled + fill:
+            cost = estimate_tokens(cleaned[i])
+            if i in selected or (share and used + cost > share):
+                continue
+            selected.add(i)
+            used += cost
+        text = render_pages(cleaned, selected)
+        sections[statement] = (text, compaction_stats(pages, selected, text))
+    return sections
@@ -0,0 +1,412 @@
+import ctypes
+import io
+import logging
+import mmap
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from PyPDF2 import PdfReader
+
+logger = logging.getLogger(__name__)
+
+# Worker count for page extraction; 1 keeps everything on the calling thread
+DEFAULT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Seconds allowed per page before it is skipped (0 disables the limit)
+DEFAULT_PAGE_TIMEOUT = float(os.getenv('PDF_PAGE_TIMEOUT', '10'))
+# Documents shorter than this are not worth the inter-process round trip
+MIN_PAGES_FOR_POOL = int(os.getenv('PDF_MIN_PAGES_FOR_POOL', '16'))
+# Send every document to the pool, however short, so no parsing happens on the request
+# thread (set for gevent workers, where it would block all requests of the worker)
+OFFLOAD = os.getenv('PDF_EXTRACT_OFFLOAD', '0').lower() in ('1', 'true', 'yes')
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# Times the remaining pages of a document without a deadline go to a new pool after the
+# pool broke under them; documents with a deadline are resubmitted until it passes
+MAX_RESUBMITS = int(os.getenv('PDF_MAX_RESUBMITS', '5'))
+
+# Documents kept open in each pool worker, so concurrent uploads whose batches interleave
+# do not re-parse each other's documents
+READER_CACHE_SIZE = int(os.getenv('PDF_READER_CACHE_SIZE', '4'))
+
+# Per-process reader cache used inside pool workers: (path, inode, size, mtime) -> (file, mapping, reader)
+_worker_readers = OrderedDict()
+
+
+class PageTimeout(Exception):
+    pass
+
+
+def _get_pool(max_workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # forkserver avoids forking a multi-threaded web worker
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+            _pool = ProcessPoolExecutor(max_workers=max_workers,
+                                        mp_context=multiprocessing.get_context(method))
+            _pool_workers = max_workers
+        return _pool
+
+
+def _recycle_pool(pool):
+    # Kills the workers of a pool that is stuck on a page the page timeout could not interrupt
+    # (one spent in C code), so the slot is not lost for good, or drops a pool that broke; the
+    # next batch starts a new pool. Batches of other uploads still in it are resubmitted by their callers
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    terminate = getattr(pool, 'terminate_workers', None)
+    if terminate is not None:
+        terminate()
+    else:
+        # No public way to stop the workers before Python 3.14
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def _map_file(fileobj):
+    # Read-only mapping of a real file, or None for in-memory streams and empty files
+    try:
+        return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+
+
+def _close_mapping(mapping):
+    try:
+        mapping.close()
+    except BufferError:
+        # Still referenced by a parsed object; released when that is collected
+        pass
+
+
+@contextmanager
+def open_pdf_source(pdf_file):
+    """Yield a stream PdfReader can parse without copying the document into the heap.
+
+    Given a path, PyPDF2 reads the whole file into a BytesIO, so paths and file-backed
+    streams are memory-mapped instead; pages are then read straight from the page cache,
+    shared between processes. In-memory streams are yielded as they are.
+    """
+    opened = open(pdf_file, 'rb') if isinstance(pdf_file, (str, os.PathLike)) else None
+    try:
+        mapping = _map_file(opened or pdf_file)
+        try:
+            yield mapping if mapping is not None else (opened or pdf_file)
+        finally:
+            if mapping is not None:
+                _close_mapping(mapping)
+    finally:
+        if opened:
+            opened.close()
+
+
+def _document_key(path):
+    # A path names another document once its file is replaced or a temp name is reused
+    st = os.stat(path)
+    return path, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _close_reader(key):
+    fileobj, mapping, _ = _worker_readers.pop(key)
+    if mapping is not None:
+        _close_mapping(mapping)
+    fileobj.close()
+
+
+def _worker_reader(path):
+    key = _document_key(path)
+    cached = _worker_readers.get(key)
+    if cached is None:
+        # Keep the most recently used documents open in each worker
+        while len(_worker_readers) >= READER_CACHE_SIZE:
+            _close_reader(next(iter(_worker_readers)))
+        fileobj = open(path, 'rb')
+        mapping = _map_file(fileobj)
+        cached = _worker_readers[key] = (fileobj, mapping, PdfReader(mapping if mapping is not None else fileobj))
+    _worker_readers.move_to_end(key)
+    return cached[2]
+
+
+@contextmanager
+def _time_limit(seconds):
+    # Interrupts the block after `seconds` with PageTimeout; pool workers run tasks on their
+    # main thread, where the timer signal is delivered
+    if not seconds:
+        yield
+        return
+    if threading.current_thread() is not threading.main_thread():
+        with _thread_time_limit(seconds):
+            yield
+        return
+
+    def expired(signum, frame):
+        raise PageTimeout()
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+@contextmanager
+def _thread_time_limit(seconds):
+    # Request threads get no signals: a timer raises PageTimeout in the thread instead, at its
+    # next bytecode, which interrupts the pure-Python page parser just as the signal does
+    thread_id = ctypes.c_ulong(threading.get_ident())
+    lock = threading.Lock()
+    state = {'armed': True, 'fired': False}
+
+    def expired():
+        with lock:
+            if state['armed']:
+                state['fired'] = True
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id, ctypes.py_object(PageTimeout))
+
+    timer = threading.Timer(seconds, expired)
+    timer.daemon = True
+    timer.start()
+    try:
+        yield
+    finally:
+        timer.cancel()
+        with lock:
+            state['armed'] = False
+            if state['fired']:
+                # The block finished before the exception was raised; drop it
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id, None)
+
+
+def _page_count(path):
+    return len(_worker_reader(path).pages)
+
+
+def _extract_page_range(path, start, stop, page_timeout=0):
+    # (texts, pages skipped) for pages start..stop-1; a page past `page_timeout` seconds reads as ''
+    reader = _worker_reader(path)
+    texts, skipped = [], []
+    for i in range(start, stop):
+        try:
+            with _time_limit(page_timeout):
+                texts.append(reader.pages[i].extract_text() or '')
+        except PageTimeout:
+            texts.append('')
+            skipped.append(i)
+    if skipped:
+        # An interrupted parse may leave the reader's object cache half-filled
+        _close_reader(_document_key(path))
+    return texts, skipped
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def text_pdf(pages, extra_streams=()):
+    # Bytes of a minimal PDF whose pages show the given lists of text lines, e.g. to warm up
+    # the parser. `extra_streams` are added as unreferenced streams (bulk that no page shows)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    page_count = len(pages)
+    font_id = 3 + 2 * page_count
+    kids = ' '.join(f"{3 + 2 * i} 0 R" for i in range(page_count))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode())
+    for i, lines in enumerate(pages):
+        objects.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                        f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>").encode())
+        content = ('BT /F1 8 Tf 36 770 Td 10 TL ' +
+                   ' '.join(f"({_escape(line)}) '" for line in lines) + ' ET').encode('latin-1', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for stream in extra_streams:
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def _spool_to_file(pdf_file):
+    # Pool workers open the document themselves, so uploads are written to a temp file first
+    tmp = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    with tmp:
+        pdf_file.seek(0)
+        shutil.copyfileobj(pdf_file, tmp, 1024 * 1024)
+    pdf_file.seek(0)
+    return tmp.name
+
+
+def iter_page_texts(pdf_file, max_workers=None, page_timeout=None, offload=None, stop_at=None):
+    """Yield the text of each page in order.
+
+    `pdf_file` is a path or a seekable binary file. Pages are fanned out over a
+    process pool when the document is long enough, or always with `offload`
+    (default PDF_EXTRACT_OFFLOAD); a page that takes longer than `page_timeout`
+    seconds is logged and yields an empty string, whether it is parsed on the
+    calling thread or in a pool worker; a pool whose batch is still running well past
+    its time is recycled, and other documents' batches in it go to a new pool. Pages
+    stop at `stop_at` (a time.monotonic() value), and callers that stop consuming early
+    also stop the queued batches.
+    """
+    max_workers = DEFAULT_WORKERS if max_workers is None else max(1, max_workers)
+    page_timeout = DEFAULT_PAGE_TIMEOUT if page_timeout is None else page_timeout
+    offload = OFFLOAD if offload is None else offload
+
+    if not offload:
+        with open_pdf_source(pdf_file) as source:
+            reader = PdfReader(source)
+            page_count = len(reader.pages)
+            logger.info(f"Extracting {page_count} pages with up to {max_workers} worker(s)")
+
+            if max_workers == 1 or page_count < MIN_PAGES_FOR_POOL:
+                for i, page in enumerate(reader.pages):
+                    limit = page_timeout
+                    if stop_at is not None:
+                        left = stop_at - time.monotonic()
+                        if left <= 0:
+                            logger.warning(f"Stopped extraction at page {i + 1} of {page_count}: out of time")
+                            return
+                        limit = min(limit, left) if limit else left
+                    try:
+                        with _time_limit(limit):
+                            text = page.extract_text() or ''
+                    except PageTimeout:
+                        logger.warning(f"Timed out extracting page {i + 1}; skipping it")
+                        text = ''
+                    yield text
+                return
+            del reader
+
+    spooled_path = None
+    if isinstance(pdf_file, (str, os.PathLike)):
+        path = os.fspath(pdf_file)
+    else:
+        path = spooled_path = _spool_to_file(pdf_file)
+
+    try:
+        resubmits = 0
+
+        def may_resubmit():
+            # Whether pages whose pool broke under them (recycled for another upload's stuck
+            # page, or a worker died) go to a new pool: while the document has time left
+            if stop_at is not None:
+                return time.monotonic() < stop_at
+            return resubmits < MAX_RESUBMITS
+
+        if offload:
+            # Even the page count is read in the pool, which keeps the parsed reader for the pages
+            while True:
+                pool = _get_pool(max_workers)
+                try:
+                    page_count = pool.submit(_page_count, path).result()
+                    break
+                except BrokenProcessPool:
+                    if not may_resubmit():
+                        raise
+                    _recycle_pool(pool)
+                    resubmits += 1
+            logger.info(f"Extracting {page_count} pages in the pool with up to {max_workers} worker(s)")
+        # A few batches per worker keeps the pool busy without paying IPC per page
+        batch_size = max(1, -(-page_count // (max_workers * 4)))
+        batches = [(start, min(start + batch_size, page_count)) for start in range(0, page_count, batch_size)]
+
+        def submit(batches):
+            pool = _get_pool(max_workers)
+            return [(start, stop, pool, pool.submit(_extract_page_range, path, start, stop, page_timeout))
+                    for start, stop in batches]
+
+        futures = submit(batches)
+        try:
+            index = 0
+            while index < len(futures):
+                start, stop, pool, future = futures[index]
+                # A worker spends at most page_timeout on each page of the batch, and the batch
+                # may wait for one other batch in the pool's call queue first
+                timeout = 2 * page_timeout * (stop - start) if page_timeout else None
+                left = stop_at - time.monotonic() if stop_at is not None else None
+                try:
+                    texts, skipped = future.result(
+                        timeout=timeout if left is None else max(0.0, min(timeout or left, left)))
+                except BrokenProcessPool:
+                    if not may_resubmit():
+                        raise
+                    logger.warning(f"Extraction pool broke at page {start + 1} of {page_count}; resubmitting")
+                    _recycle_pool(pool)
+                    resubmits += 1
+                    futures[index:] = submit(batches[index:])
+                    continue
+                except FutureTimeoutError:
+                    if left is not None and time.monotonic() >= stop_at:
+                        logger.warning(f"Stopped extraction at page {start + 1} of {page_count}: out of time")
+                        return
+                    if future.running():
+                        # Stuck where the worker's own page limit cannot interrupt it, holding a
+                        # pool slot until the worker is stopped
+                        logger.warning(f"Timed out extracting pages {start + 1}-{stop}; skipping them "
+                                       f"and recycling the pool")
+                        _recycle_pool(pool)
+                        futures[index + 1:] = submit(batches[index + 1:])
+                    else:
+                        logger.warning(f"Timed out waiting for pages {start + 1}-{stop}; skipping them")
+                        future.cancel()
+                    texts, skipped = [''] * (stop - start), []
+                for page in skipped:
+                    logger.warning(f"Timed out extracting page {page + 1}; skipping it")
+                yield from texts
+                index += 1
+        finally:
+            # Stop queued batches if the consumer bails out early
+            for _, _, _, future in futures:
+                future.cancel()
+    finally:
+        if spooled_path:
+            try:
+                os.remove(spooled_path)
+            except OSError:
+                pass
+
+
+def extract_text(pdf_file, max_workers=None, page_timeout=None, on_page=None):
+    # Single join at the end instead of growing a string page by page.
+    # `on_page(pages_done)` is called after each page for progress reporting.
+    parts = []
+    for page_text in iter_page_texts(pdf_file, max_workers, page_timeout):
+        parts.append(page_text)
+        if on_page:
+            on_page(len(parts))
+    parts.append('')
+    return '\n'.join(parts)
@@ -0,0 +1,239 @@
+import cProfile
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+from observability import REQUEST_ID_PATTERN, current_request_id, current_timings, registry
+
+logger = logging.getLogger(__name__)
+
+# Opt-in profiling of single requests. An admin sends `X-Profile: cprofile` (or `sample`), or
+# PROFILE_SAMPLE_RATE picks requests at random; everything else only pays for one header
+# lookup. A profiled request is sampled by a background thread reading its stack every
+# PROFILE_INTERVAL seconds, which gives collapsed stacks for flame graphs at little cost;
+# `cprofile` also runs cProfile on the request thread for exact call counts (pstats), at the
+# price of making Python-heavy code several times slower while it runs. Profiles are written
+# to PROFILE_DIR under the request id, so every worker sees every profile.
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'brm-profiles'))
+# Share of requests profiled with the sampler; only those slower than PROFILE_MIN_SECONDS are kept
+SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+MIN_SECONDS = float(os.getenv('PROFILE_MIN_SECONDS', '1.0'))
+INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.01'))
+# Profiles kept on disk; the oldest are removed first
+KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+
+MODES = {'1': 'cprofile', 'true': 'cprofile', 'cprofile': 'cprofile', 'sample': 'sample'}
+FORMATS = {'pstats': ('.pstats', 'application/octet-stream'), 'collapsed': ('.collapsed', 'text/plain')}
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    # "outer;...;inner" for one stack, the format read by flamegraph.pl and speedscope
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Counts the stacks of one thread, read every `interval` seconds from another thread."""
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.counts[collapse(frame)] += 1
+            # Dropped right away so the sampled thread's frames are not kept alive
+            frame = None
+
+
+class ProfileStore:
+    """Saved profiles: <request id>.json with the summary, plus .collapsed and .pstats files."""
+
+    def __init__(self, directory=PROFILE_DIR, keep=KEEP):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, request_id, suffix):
+        return os.path.join(self.directory, request_id + suffix)
+
+    def _write(self, path, write, mode='w'):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, mode) as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def save(self, summary, stacks, profiler=None):
+        request_id = summary['request_id']
+        self._write(self._path(request_id, '.collapsed'), lambda f: f.writelines(
+            f"{stack} {count}\n" for stack, count in stacks.most_common()))
+        if profiler is not None:
+            stats = pstats.Stats(profiler)
+            summary['top'] = top_functions(stats)
+            # What pstats.Stats.dump_stats writes, so `python -m pstats` and snakeviz read it
+            self._write(self._path(request_id, '.pstats'), lambda f: marshal.dump(stats.stats, f), mode='wb')
+        # The summary goes last: a profile is listed once all its files are in place
+        self._write(self._path(request_id, '.json'), lambda f: json.dump(summary, f))
+        self._prune()
+
+    def _prune(self):
+        summaries = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')),
+                           key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in summaries[self.keep:]:
+            request_id = entry.name[:-len('.json')]
+            for suffix in ('.json', '.collapsed', '.pstats'):
+                try:
+                    os.remove(self._path(request_id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def recent(self, limit=20):
+        summaries = []
+        for entry in sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')),
+                            key=lambda entry: entry.stat().st_mtime, reverse=True)[:limit]:
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summary.pop('top', None)
+            summaries.append(summary)
+        return summaries
+
+    def get(self, request_id):
+        if not REQUEST_ID_PATTERN.fullmatch(request_id):
+            return None
+        try:
+            with open(self._path(request_id, '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def file(self, request_id, kind):
+        # (path, mimetype) of a saved .pstats or .collapsed file, or None
+        suffix, mimetype = FORMATS[kind]
+        path = self._path(request_id, suffix)
+        if not REQUEST_ID_PATTERN.fullmatch(request_id) or not os.path.exists(path):
+            return None
+        return path, mimetype
+
+
+def top_functions(stats, limit=15):
+    # The functions with the most cumulative time, for a first look without pstats tooling
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{'function': f"{name} ({os.path.basename(filename)}:{line})", 'calls': calls,
+             'self_ms': round(own * 1000, 2), 'cumulative_ms': round(cumulative * 1000, 2)}
+            for (filename, line, name), (_, calls, own, cumulative, _) in rows]
+
+
+class RequestProfile:
+    def __init__(self, mode):
+        self.mode = mode
+        self.request_id = current_request_id()
+        self.method, self.path, self.endpoint = request.method, request.path, request.endpoint
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.sampler = StackSampler(threading.get_ident()).start()
+        self.profiler = None
+        if mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def finish(self, store, status, min_seconds=0.0):
+        # Stops both profilers; saves the profile if the request took at least `min_seconds`
+        if self.profiler is not None:
+            self.profiler.disable()
+        stacks = self.sampler.stop()
+        elapsed = time.perf_counter() - self.started
+        if elapsed < min_seconds:
+            registry.inc('brm_profiles_total', mode=self.mode, result='discarded')
+            return
+        summary = {'request_id': self.request_id, 'mode': self.mode, 'method': self.method, 'path': self.path,
+                   'endpoint': self.endpoint, 'status': status, 'started_at': round(self.started_at, 3),
+                   'duration_ms': round(elapsed * 1000, 1), 'samples': sum(stacks.values()),
+                   'interval_ms': self.sampler.interval * 1000, 'stages': current_timings()}
+        try:
+            store.save(summary, stacks, self.profiler)
+        except OSError as e:
+            logger.warning(f"Could not save profile {self.request_id}: {str(e)}")
+            registry.inc('brm_profiles_total', mode=self.mode, result='failed')
+            return
+        registry.inc('brm_profiles_total', mode=self.mode, result='saved')
+        logger.info("Saved %s profile of %s %s (%.0f ms)", self.mode, self.method, self.path, elapsed * 1000)
+
+
+def setup_profiling(app, allowed=lambda: False, exempt=()):
+    # Registered right after setup_observability, so the request id is set when a profile starts
+    # and the profile covers the other hooks. `allowed()` is true for requests that may ask for
+    # a profile (admin calls); endpoints in `exempt` are never profiled
+    store = ProfileStore()
+
+    @app.before_request
+    def start_profile():
+        header = request.headers.get('X-Profile')
+        if header is not None:
+            mode, min_seconds = MODES.get(header.lower()) if allowed() else None, 0.0
+        elif SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+            mode, min_seconds = 'sample', MIN_SECONDS
+        else:
+            return
+        if mode and request.endpoint not in exempt:
+            g.profile = (RequestProfile(mode), min_seconds)
+
+    @app.after_request
+    def finish_profile(response):
+        session = g.pop('profile', None)
+        if session is not None:
+            profile, min_seconds = session
+            if response.is_streamed:
+                # A streamed body is produced after this hook, on the same thread
+                response.call_on_close(lambda: profile.finish(store, response.status_code, min_seconds))
+            else:
+                profile.finish(store, response.status_code, min_seconds)
+        return response
+
+    @app.teardown_request
+    def abandon_profile(error=None):
+        # Only reached with a profile still running when no response was made
+        session = g.pop('profile', None)
+        if session is not None:
+            session[0].finish(store, 500, session[1])
+
+    return store
@@ -0,0 +1,355 @@
+import json
+import re
+
+from document_store import SECTIONS
+
+# Turns the model's extraction answer into the parse_financial_data structure. Clean JSON
+# is parsed directly; anything else goes through one repair pass that fixes the usual
+# model quirks (code fences, prose around the object, single quotes, apostrophes inside
+# names, trailing or missing commas, Python literals, unquoted values, truncation), then
+# one pass over the schema validates the structure and normalises every amount.
+
+NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+LITERALS = {'true': 'true', 'false': 'false', 'null': 'null',
+            'True': 'true', 'False': 'false', 'None': 'null'}
+# Runs of string characters that need no attention
+STRING_RUN = re.compile(r'[^"\'\\\x00-\x1f]+')
+# A bare key or array element, e.g. {name: ...}
+BARE_TOKEN = re.compile(r'[^\s,:{}\[\]"\']+')
+JSON_ESCAPES = set('"\\/bfnrtu')
+WHITESPACE = re.compile(r'\s+')
+
+# Amounts: "1,23,456", "(1,234)", "-12.5", "Rs. 3.2 crore", "₹ 45 lakhs", "12 Cr."
+CURRENCY = re.compile(r'rs\.?|inr|usd|₹|\$', re.IGNORECASE)
+AMOUNT = re.compile(r'(?P<sign>[-+])?(?P<number>\d[\d,]*(?:\.\d*)?|\.\d+)(?P<unit>[a-z]*)\.?')
+MISSING_AMOUNTS = {'', '-', '--', 'na', 'n/a', 'nil', 'none', 'null'}
+UNIT_SCALES = {
+    'thousand': 1e3, 'thousands': 1e3, 'k': 1e3,
+    'lakh': 1e5, 'lakhs': 1e5, 'lac': 1e5, 'lacs': 1e5,
+    'million': 1e6, 'millions': 1e6, 'mn': 1e6,
+    'crore': 1e7, 'crores': 1e7, 'cr': 1e7, 'crs': 1e7,
+    'billion': 1e9, 'billions': 1e9, 'bn': 1e9,
+}
+# Top-level keys the model sometimes adds to say every amount is in e.g. lakhs
+UNIT_KEYS = ('unit', 'units')
+
+# (statement, section) -> subcategories, or None for a plain list (equity)
+SCHEMA = {}
+for _, (_statement, _section, _subcategory) in SECTIONS:
+    if _subcategory is None:
+        SCHEMA[(_statement, _section)] = None
+    else:
+        SCHEMA.setdefault((_statement, _section), []).append(_subcategory)
+STATEMENTS = list(dict.fromkeys(statement for statement, _ in SCHEMA))
+
+
+def _skip_space(text, i):
+    space = WHITESPACE.match(text, i)
+    return space.end() if space else i
+
+
+def _read_string(text, i, out, repairs):
+    # Copies the string starting at text[i] as a JSON string; returns the index after it
+    quote = text[i]
+    parts = ['"']
+    i += 1
+    while i < len(text):
+        run = STRING_RUN.match(text, i)
+        if run:
+            parts.append(run.group())
+            i = run.end()
+            continue
+        ch = text[i]
+        if ch == '\\':
+            escaped = text[i + 1:i + 2]
+            if escaped == "'":
+                parts.append("'")
+            elif escaped and escaped in JSON_ESCAPES:
+                parts.append('\\' + escaped)
+            else:
+                parts.append('\\\\' + escaped)
+                repairs.add('invalid_escape')
+            i += 2
+        elif ch == quote:
+            # Only a quote followed by a delimiter (or, after a space, the next string) closes
+            # the string, so "Shareholders' Funds" in a single-quoted string, or an inner
+            # unescaped double quote, stays in the text
+            after = _skip_space(text, i + 1)
+            if after >= len(text) or text[after] in ',:}]' or (after > i + 1 and text[after] == quote):
+                parts.append('"')
+                out.append(''.join(parts))
+                return i + 1
+            parts.append('\\"' if quote == '"' else "'")
+            if quote == '"':
+                repairs.add('unescaped_quote')
+            i += 1
+        elif ch == '"':
+            parts.append('\\"')
+            i += 1
+        elif ch == "'":
+            parts.append("'")
+            i += 1
+        else:
+            parts.append(json.dumps(ch)[1:-1])
+            repairs.add('control_character')
+            i += 1
+    repairs.add('truncated')
+    parts.append('"')
+    out.append(''.join(parts))
+    return i
+
+
+def _bare_value(token, repairs):
+    if NUMBER.fullmatch(token):
+        return token
+    if token in LITERALS:
+        if LITERALS[token] != token:
+            repairs.add('python_literal')
+        return LITERALS[token]
+    # Amounts such as 1,23,456 or (1,234) are kept as strings and parsed by the normaliser
+    repairs.add('bare_value')
+    return json.dumps(token)
+
+
+def _read_raw_value(text, i):
+    # An unquoted value ends at a closing bracket, a line break, or a comma not followed by a
+    # digit (commas inside "1,23,456" are digit grouping)
+    j = i
+    while j < len(text):
+        ch = text[j]
+        if ch in '}]\n\r' or (ch == ',' and not text[j + 1:j + 2].isdigit()):
+            break
+        j += 1
+    return text[i:j].strip(), j
+
+
+def repair_json(text):
+    """Rewrite near-JSON model output as strict JSON.
+
+    Returns (json_text, repairs) where repairs is the set of fixes applied. Only the first
+    top-level object is kept; raises ValueError when the text contains no object.
+    """
+    start = text.find('{')
+    if start < 0:
+        raise ValueError('No JSON object found in the response')
+    out, repairs, stack = [], set(), []
+    # Kind of the last token written: 'open', 'comma', 'colon', 'key' or 'value'
+    last = None
+    # (output length, open brackets) after the last complete array element or container,
+    # where a cut-off answer can be closed without keeping a half-written item
+    complete = None
+    i = start
+    while i < len(text):
+        ch = text[i]
+        if ch.isspace():
+            i = WHITESPACE.match(text, i).end()
+            continue
+        if ch in '}]':
+            if last == 'comma':
+                out.pop()
+                repairs.add('trailing_comma')
+            elif last == 'colon':
+                out.append('null')
+                repairs.add('missing_value')
+            if ch != stack[-1]:
+                repairs.add('brackets')
+            out.append(stack.pop())
+            i += 1
+            last = 'value'
+            if not stack:
+                break
+            complete = (len(out), stack[:])
+            continue
+        if ch == ',':
+            if last in ('comma', 'open'):
+                repairs.add('extra_comma')
+            else:
+                out.append(',')
+                last = 'comma'
+            i += 1
+            continue
+        if ch == ':':
+            out.append(':')
+            last = 'colon'
+            i += 1
+            continue
+
+        # Anything else starts a key or a value
+        if last == 'key':
+            out.append(':')
+            repairs.add('missing_colon')
+            last = 'colon'
+        elif last == 'value':
+            out.append(',')
+            repairs.add('missing_comma')
+            last = 'comma'
+        is_key = bool(stack) and stack[-1] == '}' and last in ('open', 'comma')
+        if ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            out.append(ch)
+            last = 'open'
+            i += 1
+            # An empty list or section is complete; an empty item is not
+            if ch == '[' or len(stack) == 1 or stack[-2] == '}':
+                complete = (len(out), stack[:])
+        elif ch in '"\'':
+            if ch == "'":
+                repairs.add('single_quotes')
+            i = _read_string(text, i, out, repairs)
+            last = 'key' if is_key else 'value'
+            if stack[-1] == ']' and i < len(text):
+                complete = (len(out), stack[:])
+        elif last == 'colon':
+            token, i = _read_raw_value(text, i)
+            out.append(_bare_value(token, repairs))
+            last = 'value'
+        else:
+            token = BARE_TOKEN.match(text, i).group()
+            i += len(token)
+            if is_key:
+                out.append(json.dumps(token))
+                repairs.add('bare_key')
+                last = 'key'
+            else:
+                out.append(_bare_value(token, repairs))
+                last = 'value'
+
+    if stack:
+        # The response was cut off: go back to the last complete item and close what is open
+        repairs.add('truncated')
+        if complete:
+            del out[complete[0]:]
+            stack = complete[1]
+        elif last == 'colon':
+            out.append('null')
+        elif last == 'key':
+            out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+        elif last == 'comma':
+            out.pop()
+        out.extend(reversed(stack))
+    elif text[i:].strip(' \t\r\n`'):
+        repairs.add('extra_text')
+    return ''.join(out), repairs
+
+
+def parse_model_json(text):
+    """Parse the model's answer into a dict.
+
+    Returns (data, repairs); repairs is an empty list when the answer was valid JSON apart
+    from code fences or text around the object. Raises ValueError when it cannot be parsed.
+    """
+    start, end = text.find('{'), text.rfind('}')
+    if start < 0:
+        raise ValueError('No JSON object found in the response')
+    try:
+        data = json.loads(text[start:end + 1])
+        repairs = set()
+    except ValueError:
+        repaired, repairs = repair_json(text)
+        try:
+            data = json.loads(repaired)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON format: {str(e)}")
+    if not isinstance(data, dict):
+        raise ValueError('Invalid JSON format: expected an object')
+    return data, sorted(repairs)
+
+
+def parse_amount(value, scale=1):
+    # Number from a model-provided amount, or None when it is missing or unreadable. Like the
+    # local parser and the prompt, amounts are positive magnitudes whose sign is implied by
+    # their section, so brackets and minus signs are dropped
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = abs(value) * scale
+    elif isinstance(value, str):
+        text = CURRENCY.sub('', value).replace(' ', '').lower()
+        if text.startswith('(') and text.endswith(')'):
+            text = text[1:-1]
+        if text in MISSING_AMOUNTS:
+            return None
+        match = AMOUNT.fullmatch(text)
+        if not match:
+            return None
+        unit = match.group('unit')
+        if unit and unit not in UNIT_SCALES:
+            return None
+        number = float(match.group('number').replace(',', '')) * (UNIT_SCALES[unit] if unit else scale)
+    else:
+        return None
+    if number != number or number in (float('inf'), float('-inf')):
+        return None
+    number = round(number, 2)
+    return int(number) if float(number).is_integer() else number
+
+
+def _unit_scale(data):
+    for key in UNIT_KEYS:
+        unit = data.pop(key, None)
+        if isinstance(unit, str):
+            words = re.findall(r'[a-z]+', CURRENCY.sub('', unit).lower())
+            for word in words:
+                if word in UNIT_SCALES:
+                    return UNIT_SCALES[word]
+    return 1
+
+
+def normalize_financial_data(data, statements=STATEMENTS):
+    """Validate the structure and normalise every line item in one pass.
+
+    Missing subcategories become empty lists, amounts become numbers (0 when unreadable)
+    and entries without a name are dropped. Returns (data, counts) where counts has the
+    number of values 'converted' from text, 'defaulted' to 0 and items 'dropped'.
+    Raises ValueError when a statement or section is missing or of the wrong type. Only
+    `statements` are checked, for answers that hold a single statement.
+    """
+    counts = {'converted': 0, 'defaulted': 0, 'dropped': 0}
+    scale = _unit_scale(data)
+    for statement in statements:
+        if statement not in data:
+            raise ValueError(f"Missing required section: {statement}")
+        if not isinstance(data[statement], dict):
+            raise ValueError(f"Invalid format for section: {statement}")
+
+    for (statement, section), subcategories in SCHEMA.items():
+        if statement not in statements:
+            continue
+        group = data[statement]
+        if section not in group:
+            raise ValueError(f"Missing subsection '{section}' in {statement}")
+        if subcategories is None:
+            if not isinstance(group[section], list):
+                raise ValueError(f"Invalid format for '{section}' in {statement}")
+            group[section] = _normalize_items(group[section], scale, counts)
+            continue
+        if not isinstance(group[section], dict):
+            raise ValueError(f"Invalid format for '{section}' in {statement}")
+        for subcategory in subcategories:
+            items = group[section].setdefault(subcategory, [])
+            if not isinstance(items, list):
+                raise ValueError(f"Invalid format for '{subcategory}' in {section}")
+            group[section][subcategory] = _normalize_items(items, scale, counts)
+    return data, counts
+
+
+def _normalize_items(items, scale, counts):
+    normalized = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('name'):
+            counts['dropped'] += 1
+            continue
+        raw = item.get('value')
+        if scale == 1 and type(raw) in (int, float) and raw == raw and raw >= 0:
+            value = raw
+        else:
+            value = parse_amount(raw, scale)
+        if value is None:
+            value = 0
+            counts['defaulted'] += 1
+        elif not isinstance(raw, (int, float)):
+            counts['converted'] += 1
+        normalized.append({'name': str(item['name']).strip(), 'value': value})
+    return normalized
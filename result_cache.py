@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Share of max_disk_bytes left after the disk tier is trimmed
+TRIM_TO = 0.9
+
+
+def digest_stream(stream, chunk_size=1024 * 1024):
+    # SHA-256 of a file-like object, read in chunks and rewound afterwards
+    hasher = hashlib.sha256()
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        hasher.update(chunk)
+    stream.seek(0)
+    return hasher.hexdigest()
+
+
+class ResultCache:
+    """Two-tier cache: an in-process LRU in front of a directory shared by all workers.
+
+    Values must be JSON serializable. Entries expire after `ttl` seconds in both
+    tiers, and the disk tier is trimmed oldest-first once it grows past `max_disk_bytes`.
+    Writes keep a running estimate of the directory's size; the directory itself is only
+    walked when that estimate passes the limit, or every `trim_interval` seconds to drop
+    expired entries and count what other workers have written.
+    """
+
+    def __init__(self, directory, max_memory_entries=128, max_disk_bytes=256 * 1024 * 1024,
+                 ttl=7 * 24 * 3600, name='result', trim_interval=300):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.name = name
+        self.trim_interval = trim_interval
+        self._memory = OrderedDict()
+        # Bytes on disk at the last walk plus this worker's writes since; None before the first walk
+        self._disk_bytes = None
+        self._trimmed_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0,
+                       'invalidations': 0, 'evictions': 0}
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        # Returns (value, tier) where tier is 'memory', 'disk' or None on a miss
+        now = time.time()
+        path = self._path(key)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                # The disk file doubles as the validity marker, so an invalidation
+                # made by another worker is honoured here too
+                if now - stored_at < self.ttl and os.path.exists(path):
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return value, 'memory'
+                del self._memory[key]
+
+        try:
+            stored_at = os.path.getmtime(path)
+            if now - stored_at >= self.ttl:
+                self._remove_file(path)
+                raise FileNotFoundError(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats['misses'] += 1
+            return None, None
+
+        with self._lock:
+            self._remember(key, stored_at, value)
+            self._stats['disk_hits'] += 1
+        return value, 'disk'
+
+    def set(self, key, value):
+        now = time.time()
+        path = self._path(key)
+        written = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so other workers never read a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+            written = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Could not write {self.name} cache entry {key[:12]}: {str(e)}")
+
+        with self._lock:
+            self._remember(key, now, value)
+            self._stats['sets'] += 1
+            # Overwritten entries are counted twice, which only brings the next walk forward
+            if self._disk_bytes is not None:
+                self._disk_bytes += written
+            trim = (self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+                    or now - self._trimmed_at >= self.trim_interval)
+            if trim:
+                # Other threads writing meanwhile do not start a walk of their own
+                self._trimmed_at = now
+        if trim:
+            self._trim_disk()
+
+    def invalidate(self, key=None):
+        # Drop one entry, or everything when no key is given. Returns the number of disk entries removed.
+        removed = 0
+        with self._lock:
+            if key is None:
+                self._memory.clear()
+            else:
+                self._memory.pop(key, None)
+            self._stats['invalidations'] += 1
+
+        if key is not None:
+            removed += self._remove_file(self._path(key))
+        else:
+            for path, _, _ in self._disk_entries():
+                removed += self._remove_file(path)
+            with self._lock:
+                self._disk_bytes = 0
+        logger.info(f"Invalidated {removed} {self.name} cache entr{'y' if removed == 1 else 'ies'}")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _remember(self, key, stored_at, value):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _disk_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if not filename.endswith('.json'):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_mtime, st.st_size))
+        return entries
+
+    def _trim_disk(self):
+        entries = self._disk_entries()
+        now = time.time()
+        live = []
+        for path, mtime, size in entries:
+            if now - mtime >= self.ttl:
+                self._remove_file(path)
+            else:
+                live.append((path, mtime, size))
+
+        total = sum(size for _, _, size in live)
+        if total > self.max_disk_bytes:
+            # Trimmed below the limit so a full cache is not walked again on its next write
+            target = self.max_disk_bytes * TRIM_TO
+            live.sort(key=lambda entry: entry[1])
+            for path, _, size in live:
+                if total <= target:
+                    break
+                total -= size
+                self._remove_file(path)
+                with self._lock:
+                    self._stats['evictions'] += 1
+        with self._lock:
+            self._disk_bytes = total
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
@@ -60,8 +60,9 @@ function processPDF() {
         // Parse the financial data from the response
         const financialData = data.data;
         
-        // Store the financial data for chat functionality
+        // Store the financial data for chat functionality; chat only needs the server-side document id
         window.lastProcessedData = financialData;
+        window.lastDocumentId = data.document_id;
         
         // Validate required data structure
         if (!financialData || !financialData.income_statement || !financialData.balance_sheet) {
@@ -218,6 +219,13 @@ function processPDF() {
         
         drawSankeyDiagram();
         addUploadStatus('Financial data extracted and visualized successfully!');
+
+        // Post the headline ratios computed on the server to the chat
+        if (data.document_id) {
+            fetchFinancialMetrics(data.document_id)
+            .then(metrics => addChatMessage('AI', formatMetricsSummary(metrics.ratios), true))
+            .catch(error => console.error('Error fetching financial metrics:', error));
+        }
     })
     .catch(error => {
         console.error('Error processing PDF:', error);
@@ -707,6 +715,7 @@ function processUserMessage(message) {
     
     // Show loading message
     addChatMessage('AI', 'Analyzing your question...', true);
+    const loadingMessage = document.querySelector('.chat-body').lastChild;
     
     // Send the message and financial data to the backend API
     // Get the base URL dynamically (works both locally and when deployed)
@@ -714,15 +723,32 @@ function processUserMessage(message) {
         ? 'http://localhost:5000' 
         : window.location.origin;
         
-    fetch(`${baseUrl}/api/chat`, {
+    // Send only the document id when the server has a session for it; fall back to the
+    // full data if the session has expired
+    const sendChatRequest = (includeData) => fetch(`${baseUrl}/api/chat`, {
         method: 'POST',
         headers: {
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
         },
-        body: JSON.stringify({
+        body: JSON.stringify(includeData || !window.lastDocumentId ? {
             message: message,
-            financial_data: financialData
+            financial_data: financialData,
+            stream: true
+        } : {
+            message: message,
+            document_id: window.lastDocumentId,
+            stream: true
         })
+    });
+
+    sendChatRequest(false)
+    .then(response => {
+        if (response.status === 404 && window.lastDocumentId) {
+            window.lastDocumentId = null;
+            return sendChatRequest(true);
+        }
+        return response;
     })
     .then(response => {
         if (!response.ok) {
@@ -730,88 +756,122 @@ function processUserMessage(message) {
                 throw new Error(data.error || `Server error: ${response.status}`);
             });
         }
-        return response.json();
-    })
-    .then(data => {
         // Remove the loading message
-        const chatBody = document.querySelector('.chat-body');
-        chatBody.removeChild(chatBody.lastChild);
-        
-        // Add the AI response to the chat
-        addChatMessage('AI', data.response, true);
+        loadingMessage.remove();
+
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.includes('text/event-stream') || !response.body) {
+            return response.json().then(data => addChatMessage('AI', data.response, true));
+        }
+        return renderStreamedResponse(response);
     })
     .catch(error => {
         console.error('Error processing message:', error);
         
         // Remove the loading message
-        const chatBody = document.querySelector('.chat-body');
-        chatBody.removeChild(chatBody.lastChild);
+        if (loadingMessage.parentNode) {
+            loadingMessage.remove();
+        }
         
         // Add error message to chat
         addChatMessage('AI', `Sorry, I encountered an error: ${error.message}`, true);
     });
 }
 
-function calculateFinancialMetrics(data) {
-    const metrics = {
-        wacc: 0,
-        costOfDebt: 0,
-        taxRate: 0,
-        debtToEquity: 0,
-        profit: 0
-    };
-    
-    // Calculate WACC
-    const totalDebt = data.balance_sheet.liabilities.current.reduce((sum, item) => sum + item.value, 0) +
-                      data.balance_sheet.liabilities.non_current.reduce((sum, item) => sum + item.value, 0);
-    const totalEquity = data.balance_sheet.equity.reduce((sum, item) => sum + item.value, 0);
-    const totalCapital = totalDebt + totalEquity;
-    
-    // Assume cost of equity is 10% and cost of debt is 5% (these should be calculated based on actual data)
-    const costOfEquity = 0.10;
-    metrics.costOfDebt = 0.05;
-    
-    // Calculate tax rate based on income and profit
-    const totalRevenue = data.income_statement.revenue.operating.reduce((sum, item) => sum + item.value, 0) +
-                        data.income_statement.revenue.non_operating.reduce((sum, item) => sum + item.value, 0);
-    const totalExpenses = data.income_statement.expenses.operating.reduce((sum, item) => sum + item.value, 0) +
-                         data.income_statement.expenses.non_operating.reduce((sum, item) => sum + item.value, 0);
-    metrics.profit = totalRevenue - totalExpenses;
-    
-    // Assume standard corporate tax rate of 30%
-    metrics.taxRate = 0.30;
-    
-    // Calculate WACC
-    metrics.wacc = (totalEquity / totalCapital) * costOfEquity +
-                   (totalDebt / totalCapital) * metrics.costOfDebt * (1 - metrics.taxRate);
-    
-    // Calculate Debt to Equity ratio
-    metrics.debtToEquity = totalDebt / totalEquity;
-    
-    return metrics;
-}
+// Render a Server-Sent Events chat response into a single AI message as chunks arrive
+function renderStreamedResponse(response) {
+    addChatMessage('AI', '', true);
+    const chatBody = document.querySelector('.chat-body');
+    const contentSpan = chatBody.lastChild.querySelector('.chat-content');
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
 
-function generateAIResponse(message, metrics) {
-    const query = message.toLowerCase();
-    
-    if (query.includes('wacc')) {
-        return `The Weighted Average Cost of Capital (WACC) is ${(metrics.wacc * 100).toFixed(2)}%. This represents the average rate that the company is expected to pay to finance its assets.`;
-    }
-    else if (query.includes('debt') && query.includes('equity')) {
-        return `The Debt to Equity ratio is ${metrics.debtToEquity.toFixed(2)}. This indicates the proportion of debt and equity the company is using to finance its assets.`;
-    }
-    else if (query.includes('tax')) {
-        return `The effective tax rate is ${(metrics.taxRate * 100).toFixed(2)}%. This represents the percentage of profit that goes to tax payments.`;
-    }
-    else if (query.includes('profit')) {
-        return `The current profit is ${metrics.profit.toFixed(2)}. This is calculated as the difference between total revenue and total expenses.`;
-    }
-    else if (query.includes('cost of debt')) {
-        return `The cost of debt is ${(metrics.costOfDebt * 100).toFixed(2)}%. This represents the effective interest rate the company pays on its borrowings.`;
+    function handleEvent(rawEvent) {
+        let eventName = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                eventName = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data += line.slice(5).trim();
+            }
+        });
+        if (!data) return;
+        const payload = JSON.parse(data);
+        if (eventName === 'delta') {
+            answer += payload.text;
+            contentSpan.innerHTML = marked.parse(answer);
+            chatBody.scrollTop = chatBody.scrollHeight;
+        } else if (eventName === 'done') {
+            console.log(`Chat response: first token ${payload.ttft_ms} ms, total ${payload.total_ms} ms`, payload.usage);
+        } else if (eventName === 'error') {
+            throw new Error(payload.error);
+        }
     }
-    else {
-        return `I can provide information about various financial metrics including WACC, debt to equity ratio, tax rate, profit, and cost of debt. What would you like to know about?`;
+
+    function pump() {
+        return reader.read().then(({ done, value }) => {
+            if (done) return;
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            events.forEach(handleEvent);
+            return pump();
+        });
     }
+
+    return pump().catch(error => {
+        contentSpan.innerHTML = marked.parse(`${answer}\n\nSorry, I encountered an error: ${error.message}`);
+    });
+}
+
+// Fetch the standard ratio set (liquidity, leverage, margins, coverage, WACC) computed on the server
+function fetchFinancialMetrics(documentId, assumptions = {}) {
+    const baseUrl = window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1' 
+        ? 'http://localhost:5000' 
+        : window.location.origin;
+
+    return fetch(`${baseUrl}/api/metrics`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            document_id: documentId,
+            assumptions: assumptions
+        })
+    })
+    .then(response => {
+        if (!response.ok) {
+            return response.json().then(data => {
+                throw new Error(data.error || `Server error: ${response.status}`);
+            });
+        }
+        return response.json();
+    });
+}
+
+// Headline ratios shown after an upload; the full set is in the /api/metrics response
+const SUMMARY_METRICS = [
+    ['current_ratio', 'Current Ratio', false],
+    ['quick_ratio', 'Quick Ratio', false],
+    ['debt_to_equity', 'Debt to Equity', false],
+    ['interest_coverage', 'Interest Coverage', false],
+    ['operating_margin', 'Operating Margin', true],
+    ['net_margin', 'Net Margin (before tax)', true],
+    ['return_on_equity', 'Return on Equity', true]
+];
+
+function formatMetricsSummary(ratios) {
+    const lines = SUMMARY_METRICS.map(([name, label, percent]) => {
+        const value = ratios[name];
+        const shown = value === null || value === undefined ? 'n/a'
+            : percent ? `${(value * 100).toFixed(2)}%` : value.toFixed(2);
+        return `- **${label}:** ${shown}`;
+    });
+    return `Key ratios for this document:\n\n${lines.join('\n')}\n\nAsk about any of them for details.`;
 }
 
 // Modify processPDF function to store the last processed data
@@ -0,0 +1,281 @@
+import os
+import sqlite3
+import threading
+import time
+
+from comparative import item_key
+from document_store import SECTIONS
+
+# Persistent store of every processed document's line items, so stored statements can be
+# filtered, aggregated and compared without re-uploading the PDFs. One SQLite file is shared
+# by all gunicorn workers: WAL mode lets them read while one of them writes.
+
+# Category slugs ("current_assets", "operating_expenses", ...) for the SECTIONS of financial_data
+CATEGORIES = {label.lower().replace('-', '_').replace(' ', '_'): path for label, path in SECTIONS}
+STATEMENTS = {statement: [category for category, path in CATEGORIES.items() if path[0] == statement]
+              for statement in ('balance_sheet', 'income_statement')}
+GROUP_COLUMNS = {'company': 'd.company', 'period': 'd.period', 'category': 'li.category', 'item': 'li.item_key'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    document_id TEXT NOT NULL UNIQUE,
+    source_digest TEXT,
+    company TEXT COLLATE NOCASE,
+    period TEXT COLLATE NOCASE,
+    filename TEXT,
+    parser TEXT,
+    -- 0 once a later document of the same company and period has been stored
+    current INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_company_period ON documents (company, period, current);
+CREATE INDEX IF NOT EXISTS documents_period ON documents (period, current);
+CREATE INDEX IF NOT EXISTS documents_source_digest ON documents (source_digest);
+
+CREATE TABLE IF NOT EXISTS line_items (
+    document INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    value REAL
+);
+-- Each index ends in the document so newest-first listings walk it without sorting
+CREATE INDEX IF NOT EXISTS line_items_document ON line_items (document, category);
+CREATE INDEX IF NOT EXISTS line_items_category ON line_items (category, document);
+CREATE INDEX IF NOT EXISTS line_items_item ON line_items (item_key, document);
+"""
+
+DOCUMENT_COLUMNS = ('document_id', 'source_digest', 'company', 'period', 'filename', 'parser', 'current', 'created_at')
+
+
+def line_items(financial_data):
+    # (category, name, item_key, value) for every line item of a financial_data structure
+    rows = []
+    for category, (statement, section, subcategory) in CATEGORIES.items():
+        try:
+            group = financial_data[statement][section]
+            items = group if subcategory is None else group[subcategory]
+        except (KeyError, TypeError):
+            continue
+        for item in items or []:
+            if not isinstance(item, dict) or not item.get('name'):
+                continue
+            value = item.get('value')
+            rows.append((category, str(item['name']), item_key(str(item['name'])),
+                         value if isinstance(value, (int, float)) else None))
+    return rows
+
+
+def financial_data_from_rows(rows):
+    # Inverse of line_items: rebuilds the financial_data structure from (category, name, value) rows
+    data = {}
+    for category, (statement, section, subcategory) in CATEGORIES.items():
+        target = data.setdefault(statement, {})
+        if subcategory is None:
+            target[section] = []
+        else:
+            target.setdefault(section, {})[subcategory] = []
+    for category, name, value in rows:
+        statement, section, subcategory = CATEGORIES[category]
+        group = data[statement][section]
+        (group if subcategory is None else group[subcategory]).append({'name': name, 'value': value})
+    return data
+
+
+class StatementStore:
+    """Normalized line items of processed documents, with company, period and source digest.
+
+    Documents are keyed by their document_id, a digest of the statements and the source PDF,
+    so storing the same report again only updates its company and period. Each thread of each process uses its own connection.
+    """
+
+    def __init__(self, path, busy_timeout=10.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Created with a short-lived connection: a preloading gunicorn master must not
+        # hand an open connection to its forked workers
+        connection = self._open()
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    @property
+    def directory(self):
+        return os.path.dirname(os.path.abspath(self.path))
+
+    def _open(self):
+        # Autocommit mode; writes open their own transaction
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                     check_same_thread=False)
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        return connection
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._local.connection = self._open()
+            self._local.pid = os.getpid()
+        return connection
+
+    def get_document(self, document_id):
+        row = self._connection().execute(
+            f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+        return dict(zip(DOCUMENT_COLUMNS, row)) if row else None
+
+    def put(self, document_id, financial_data, **details):
+        return self.put_many([dict(details, document_id=document_id, financial_data=financial_data)])
+
+    def put_many(self, records):
+        """Store documents in one transaction.
+
+        Each record has document_id and financial_data, and optionally source_digest,
+        company, period, filename and parser. Returns the number of new documents.
+        """
+        connection = self._connection()
+        now = time.time()
+        added = 0
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for record in records:
+                company, period = record.get('company'), record.get('period')
+                row = connection.execute('SELECT id, company, period FROM documents WHERE document_id = ?',
+                                         (record['document_id'],)).fetchone()
+                if row is None:
+                    rowid = connection.execute(
+                        'INSERT INTO documents (document_id, source_digest, company, period, filename, parser, '
+                        'created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (record['document_id'], record.get('source_digest'), company, period,
+                         record.get('filename'), record.get('parser'), now)).lastrowid
+                    connection.executemany(
+                        'INSERT INTO line_items (document, category, name, item_key, value) VALUES (?, ?, ?, ?, ?)',
+                        [(rowid,) + item for item in line_items(record['financial_data'])])
+                    added += 1
+                else:
+                    # A re-upload keeps its line items; labels given now replace the stored ones
+                    rowid = row[0]
+                    company, period = company or row[1], period or row[2]
+                    if (company, period) == (row[1], row[2]):
+                        continue
+                    connection.execute('UPDATE documents SET company = ?, period = ?, current = 1 WHERE id = ?',
+                                       (company, period, rowid))
+                if company and period:
+                    connection.execute('UPDATE documents SET current = 0 WHERE company = ? AND period = ? '
+                                       'AND current = 1 AND id != ?', (company, period, rowid))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return added
+
+    def delete(self, document_id):
+        # Removes a document and its line items; an older document of the same company and period becomes current
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT id, company, period FROM documents WHERE document_id = ?',
+                                     (document_id,)).fetchone()
+            if row is not None:
+                connection.execute('DELETE FROM documents WHERE id = ?', (row[0],))
+                if row[1] and row[2]:
+                    connection.execute(
+                        'UPDATE documents SET current = 1 WHERE id = (SELECT MAX(id) FROM documents '
+                        'WHERE company = ? AND period = ?)', (row[1], row[2]))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return row is not None
+
+    @staticmethod
+    def _where(filters, items=True):
+        # SQL conditions and parameters for the query filters. Every filter but `latest`
+        # takes a list of accepted values.
+        clauses, params = [], []
+
+        def any_of(column, values):
+            if values:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+
+        any_of('d.company', filters.get('company'))
+        any_of('d.period', filters.get('period'))
+        any_of('d.document_id', filters.get('document_id'))
+        any_of('d.source_digest', filters.get('source_digest'))
+        if items:
+            # With a document filter the few matching documents lead the join; the unary + keeps
+            # SQLite from scanning an item or category index across every document instead
+            prefix = '+' if clauses else ''
+            categories = list(filters.get('category') or [])
+            for statement in filters.get('statement') or []:
+                categories.extend(STATEMENTS.get(statement, ['']))
+            any_of(prefix + 'li.category', categories)
+            any_of(prefix + 'li.item_key', [item_key(item) for item in filters.get('item') or []])
+        if filters.get('latest', True):
+            clauses.append('d.current = 1')
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def documents(self, filters, limit=100, offset=0):
+        where, params = self._where(filters, items=False)
+        rows = self._connection().execute(
+            f"SELECT {', '.join('d.' + column for column in DOCUMENT_COLUMNS)} FROM documents d{where} "
+            f"ORDER BY d.id DESC LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+        return [dict(zip(DOCUMENT_COLUMNS, row)) for row in rows]
+
+    def line_items(self, filters, limit=200, offset=0):
+        # Newest documents first
+        where, params = self._where(filters)
+        rows = self._connection().execute(
+            'SELECT d.document_id, d.company, d.period, li.category, li.name, li.item_key, li.value '
+            f"FROM line_items li JOIN documents d ON d.id = li.document{where} "
+            'ORDER BY li.document DESC, li.rowid LIMIT ? OFFSET ?', params + [limit, offset]).fetchall()
+        return [{'document_id': document_id, 'company': company, 'period': period,
+                 'statement': CATEGORIES[category][0], 'category': category, 'name': name, 'item': key, 'value': value}
+                for document_id, company, period, category, name, key, value in rows]
+
+    def aggregate(self, filters, group_by, limit=1000):
+        # Count, sum, mean, min and max of the matching values per group
+        columns = [GROUP_COLUMNS[name] for name in group_by]
+        where, params = self._where(filters)
+        select = ''.join(f"{column}, " for column in columns)
+        group = f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}" if columns else ''
+        rows = self._connection().execute(
+            f"SELECT {select}COUNT(DISTINCT li.document), COUNT(li.value), SUM(li.value), AVG(li.value), "
+            f"MIN(li.value), MAX(li.value) FROM line_items li JOIN documents d ON d.id = li.document"
+            f"{where}{group} LIMIT ?", params + [limit]).fetchall()
+        fields = list(group_by) + ['documents', 'count', 'sum', 'mean', 'min', 'max']
+        return [dict(zip(fields, row)) for row in rows]
+
+    def statements(self, filters):
+        # {period: financial_data} rebuilt from the newest matching document of each period
+        connection = self._connection()
+        where, params = self._where(dict(filters, latest=True), items=False)
+        documents = connection.execute(
+            f"SELECT d.id, d.period, d.document_id FROM documents d{where} ORDER BY d.id DESC", params).fetchall()
+        periods, sources = {}, {}
+        for rowid, period, document_id in documents:
+            label = period or document_id[:12]
+            if label in periods:
+                continue
+            rows = connection.execute('SELECT category, name, value FROM line_items WHERE document = ? '
+                                      'ORDER BY rowid', (rowid,)).fetchall()
+            periods[label] = financial_data_from_rows(rows)
+            sources[label] = document_id
+        return periods, sources
+
+    def stats(self):
+        connection = self._connection()
+        documents, companies = connection.execute(
+            'SELECT COUNT(*), COUNT(DISTINCT company) FROM documents').fetchone()
+        try:
+            size = sum(os.path.getsize(self.path + suffix) for suffix in ('', '-wal') if os.path.exists(self.path + suffix))
+        except OSError:
+            size = None
+        return {'documents': documents, 'companies': companies,
+                'line_items': connection.execute('SELECT COUNT(*) FROM line_items').fetchone()[0],
+                'bytes': size}
@@ -0,0 +1,142 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+from flask import Response, request
+
+from observability import stage
+
+try:
+    import brotli
+except ImportError:
+    # Optional; without it only gzip variants are built
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Front-end delivery. At start-up every asset is read once, fingerprinted by content hash
+# and compressed ahead of time; index.html is rewritten to the fingerprinted URLs, which are
+# served with immutable caching. The page itself is revalidated with its ETag on each visit.
+# Large JSON responses from /api/* are compressed per request when the client accepts it.
+
+ASSET_FILES = ('styles.css', 'script.js', 'shubh_logo.png')
+INDEX_FILE = 'index.html'
+ASSET_PREFIX = '/assets/'
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# JSON responses at least this large are compressed (0 disables)
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+# Dynamic responses use faster settings than the assets built once at start-up
+GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '5'))
+
+
+def _compress(body, encoding, dynamic=False):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY if dynamic else 11)
+    # mtime=0 keeps the output, and so the ETag, identical across workers and restarts
+    return gzip.compress(body, compresslevel=GZIP_LEVEL if dynamic else 9, mtime=0)
+
+
+def supported_encodings():
+    # In order of preference
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def negotiate_encoding(available):
+    # The preferred encoding the client accepts among `available`, or None for identity
+    accepted = request.accept_encodings
+    for encoding in supported_encodings():
+        if encoding in available and accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+class Asset:
+    """One file held in memory with its pre-compressed variants."""
+
+    def __init__(self, name, body, mimetype=None):
+        self.name = name
+        self.mimetype = mimetype or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        stem, extension = os.path.splitext(name)
+        self.fingerprinted = f"{stem}.{self.digest}{extension}"
+        self.variants = {None: body}
+        for encoding in supported_encodings():
+            compressed = _compress(body, encoding)
+            # Images and other compressed formats gain nothing
+            if len(compressed) < len(body) * 0.9:
+                self.variants[encoding] = compressed
+
+    def etag(self, encoding):
+        # Strong ETags differ per encoding since the bytes differ
+        return self.digest if encoding is None else f"{self.digest}-{encoding}"
+
+    def response(self, cache_control):
+        encoding = negotiate_encoding(self.variants)
+        etag = self.etag(encoding)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        if len(self.variants) > 1:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+class AssetBundle:
+    """The page and its assets, loaded once per worker."""
+
+    def __init__(self, root):
+        self.files = {}
+        for name in ASSET_FILES:
+            with open(os.path.join(root, name), 'rb') as f:
+                self.files[name] = Asset(name, f.read())
+        self.fingerprinted = {asset.fingerprinted: asset for asset in self.files.values()}
+
+        with open(os.path.join(root, INDEX_FILE), 'r', encoding='utf-8') as f:
+            html = f.read()
+        for name, asset in self.files.items():
+            # href="styles.css", src="./shubh_logo.png"
+            html = re.sub(rf'''(?<=["'])(?:\./)?{re.escape(name)}(?=["'])''', ASSET_PREFIX + asset.fingerprinted, html)
+        self.index = Asset(INDEX_FILE, html.encode('utf-8'), mimetype='text/html')
+
+        for asset in [self.index, *self.files.values()]:
+            logger.info("Static asset %s: %s", asset.name,
+                        ', '.join(f"{encoding or 'identity'} {len(body)} B" for encoding, body in asset.variants.items()))
+
+
+def compress_response(response):
+    # Compresses a buffered JSON response when it is large enough and the client accepts it
+    if (COMPRESS_MIN_BYTES <= 0 or response.direct_passthrough or response.is_streamed
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers
+            or not 200 <= response.status_code < 300):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = negotiate_encoding(supported_encodings())
+    if encoding is None:
+        return response
+    with stage('compression'):
+        response.set_data(_compress(body, encoding, dynamic=True))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def setup_api_compression(app):
+    @app.after_request
+    def compress_api_response(response):
+        if request.path.startswith('/api/'):
+            return compress_response(response)
+        return response
@@ -0,0 +1,115 @@
+import random
+
+from pdf_extraction import text_pdf
+
+# Generates text-only annual-report style PDFs for benchmarks, without extra dependencies.
+
+COMPANY = 'Shubh Sawariya Industries Private Limited'
+
+BALANCE_SHEET_LINES = [
+    ('EQUITY AND LIABILITIES', None),
+    ("Shareholders' Funds", None),
+    ('Share Capital', 5000000),
+    ('Reserves and Surplus', 3250000),
+    ('Non-Current Liabilities', None),
+    ('Long-Term Borrowings', 4200000),
+    ('Deferred Tax Liabilities (Net)', 180000),
+    ('Current Liabilities', None),
+    ('Short-Term Borrowings', 1500000),
+    ('Trade Payables', 2100000),
+    ('Other Current Liabilities', 640000),
+    ('Short-Term Provisions', 210000),
+    ('ASSETS', None),
+    ('Non-Current Assets', None),
+    ('Property, Plant and Equipment', 8900000),
+    ('Intangible Assets', 350000),
+    ('Long-Term Loans and Advances', 420000),
+    ('Current Assets', None),
+    ('Inventories', 2600000),
+    ('Trade Receivables', 2900000),
+    ('Cash and Cash Equivalents', 1150000),
+    ('Short-Term Loans and Advances', 760000),
+]
+
+PROFIT_AND_LOSS_LINES = [
+    ('Revenue from Operations', 18500000),
+    ('Other Income', 420000),
+    ('Total Income', None),
+    ('Expenses', None),
+    ('Cost of Materials Consumed', 9800000),
+    ('Changes in Inventories of Finished Goods and Work-in-Progress', 310000),
+    ('Employee Benefits Expense', 2700000),
+    ('Finance Costs', 560000),
+    ('Depreciation and Amortization Expense', 890000),
+    ('Other Expenses', 1900000),
+]
+
+FILLER_SENTENCES = [
+    'In our opinion and to the best of our information and according to the explanations given to us,',
+    'the aforesaid financial statements give the information required by the Act in the manner so required',
+    'and give a true and fair view in conformity with the accounting principles generally accepted in India.',
+    'The Company has not entered into any transactions with related parties other than in the ordinary course.',
+    'Management is responsible for the preparation of these financial statements that give a true and fair view.',
+    'Significant accounting policies and notes form an integral part of the financial statements.',
+    'Estimates and underlying assumptions are reviewed on an ongoing basis.',
+    'Revenue is recognised when control of goods is transferred to the customer at an amount that reflects consideration.',
+]
+
+
+def format_indian(value):
+    # 1234567 -> "12,34,567"
+    digits = str(int(abs(value)))
+    if len(digits) > 3:
+        head, tail = digits[:-3], digits[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        if head:
+            groups.insert(0, head)
+        digits = ','.join(groups + [tail])
+    return f"({digits})" if value < 0 else digits
+
+
+def _statement_lines(title, rows, year, scale):
+    lines = [COMPANY, title, f"(All amounts in Rs.)   As at 31 March {year}   As at 31 March {year - 1}", '']
+    for name, value in rows:
+        if value is None:
+            lines.append(name)
+        else:
+            current = int(value * scale)
+            previous = int(value * scale * 0.9)
+            lines.append(f"{name}   {format_indian(current)}   {format_indian(previous)}")
+    return lines
+
+
+def _filler_lines(rng, count=40):
+    return [rng.choice(FILLER_SENTENCES) for _ in range(count)]
+
+
+def financial_statement_pages(page_count, year=2024, seed=0, scale=1.0):
+    # Page texts for a report of `page_count` pages: the two statements sit in the middle of notes
+    rng = random.Random(seed)
+    pages = []
+    statement_at = max(0, page_count // 3)
+    for i in range(page_count):
+        if i == statement_at:
+            body = _statement_lines(f"Balance Sheet as at 31 March {year}", BALANCE_SHEET_LINES, year, scale)
+        elif i == statement_at + 1:
+            body = _statement_lines(f"Statement of Profit and Loss for the year ended 31 March {year}",
+                                    PROFIT_AND_LOSS_LINES, year, scale)
+        else:
+            body = [f"Notes to the financial statements - Note {i + 1}"] + _filler_lines(rng)
+        pages.append([f"{COMPANY} - Annual Report {year}"] + body + [f"Page {i + 1}"])
+    return pages
+
+
+def build_pdf(pages, padding_bytes=0):
+    # `pages` is a list of lists of text lines; returns the bytes of a minimal PDF.
+    # `padding_bytes` adds an unreferenced binary stream, e.g. to mimic scanned-image bulk
+    padding = [random.Random(padding_bytes).randbytes(padding_bytes)] if padding_bytes else []
+    return text_pdf(pages, padding)
+
+
+def financial_statement_pdf(page_count, year=2024, seed=0, scale=1.0, padding_bytes=0):
+    return build_pdf(financial_statement_pages(page_count, year=year, seed=seed, scale=scale), padding_bytes)
@@ -0,0 +1,140 @@
+import os
+import unittest
+
+from compare_local_parser import compare, iter_corpus, load_reference
+from local_parser import parse_statements
+from pdf_extraction import iter_page_texts
+
+# The local Schedule III parser against statements whose line items are written out here,
+# and against statements it must leave to the model. Set LOCAL_PARSER_CORPUS to a directory
+# of real reports with saved model answers (report.pdf + report.json) to compare those too.
+#
+# Usage: python -m unittest test_local_parser
+
+THRESHOLD = float(os.getenv('LOCAL_PARSER_THRESHOLD', '0.85'))
+# Documents the local parser answers must agree with the model on nearly every line item
+MIN_PRECISION = 0.98
+MIN_RECALL = 0.95
+
+BALANCE_SHEET = """Acme Industries Limited
+Balance Sheet as at 31 March 2024
+Particulars Note As at 31 March 2024 As at 31 March 2023
+EQUITY AND LIABILITIES
+Shareholders' Funds
+Share Capital 1 50,00,000 50,00,000
+Reserves and Surplus 2 32,50,000 30,00,000
+Non-Current Liabilities
+Long-Term Borrowings 3 42,00,000 40,00,000
+Current Liabilities
+Trade Payables 4 21,00,000 19,00,000
+Other Current Liabilities 5 6,40,000 6,00,000
+Total 1,51,90,000 1,45,00,000
+ASSETS
+Non-Current Assets
+Property, Plant and Equipment 6 89,00,000 85,00,000
+Current Assets
+Inventories 7 26,00,000 24,00,000
+Trade Receivables 8 29,00,000 27,00,000
+Cash and Cash Equivalents 9 7,90,000 9,00,000
+Total 1,51,90,000 1,45,00,000"""
+
+PROFIT_AND_LOSS = """Acme Industries Limited
+Statement of Profit and Loss for the year ended 31 March 2024
+Revenue from Operations 10 1,85,00,000 1,70,00,000
+Other Income 11 4,20,000 3,00,000
+Total Income 1,89,20,000 1,73,00,000
+Expenses
+Cost of Materials Consumed 12 98,00,000 90,00,000
+Employee Benefits Expense 13 27,00,000 25,00,000
+Finance Costs 14 5,60,000 5,00,000
+Depreciation and Amortization Expense 15 8,90,000 8,00,000
+Other Expenses 16 19,00,000 18,00,000
+Profit before Tax 30,70,000 27,00,000"""
+
+EXPECTED = {
+    'balance_sheet': {
+        'assets': {
+            'current': [{'name': 'Inventories', 'value': 2600000}, {'name': 'Trade Receivables', 'value': 2900000},
+                        {'name': 'Cash and Cash Equivalents', 'value': 790000}],
+            'non_current': [{'name': 'Property, Plant and Equipment', 'value': 8900000}],
+        },
+        'liabilities': {
+            'current': [{'name': 'Trade Payables', 'value': 2100000},
+                        {'name': 'Other Current Liabilities', 'value': 640000}],
+            'non_current': [{'name': 'Long-Term Borrowings', 'value': 4200000}],
+        },
+        'equity': [{'name': 'Share Capital', 'value': 5000000}, {'name': 'Reserves and Surplus', 'value': 3250000}],
+    },
+    'income_statement': {
+        'revenue': {
+            'operating': [{'name': 'Revenue from Operations', 'value': 18500000}],
+            'non_operating': [{'name': 'Other Income', 'value': 420000}],
+        },
+        'expenses': {
+            'operating': [{'name': 'Cost of Materials Consumed', 'value': 9800000},
+                          {'name': 'Employee Benefits Expense', 'value': 2700000},
+                          {'name': 'Other Expenses', 'value': 1900000}],
+            'non_operating': [{'name': 'Finance Costs', 'value': 560000},
+                              {'name': 'Depreciation and Amortization Expense', 'value': 890000}],
+        },
+    },
+}
+
+
+def with_lines(text, after, lines):
+    # `text` with `lines` inserted after the line starting with `after`
+    out = []
+    for line in text.splitlines():
+        out.append(line)
+        if line.startswith(after):
+            out.extend(lines)
+    return '\n'.join(out)
+
+
+class LocalParserTest(unittest.TestCase):
+
+    def test_standard_statements(self):
+        data, confidence, unmapped = parse_statements([BALANCE_SHEET, PROFIT_AND_LOSS])
+        self.assertEqual(unmapped, [])
+        self.assertGreaterEqual(confidence, THRESHOLD)
+        self.assertEqual(data, EXPECTED)
+
+    def test_unmapped_expenses_fall_back(self):
+        # Lines no rule knows would be dropped and overstate profit; the balance sheet still balances
+        profit_and_loss = with_lines(PROFIT_AND_LOSS, 'Employee Benefits Expense', [
+            'Power and Fuel 60,000 55,000', 'Freight 70,000 65,000', 'Rates and Taxes 50,000 45,000',
+            'Exceptional Items 60,000 0'])
+        _, confidence, unmapped = parse_statements([BALANCE_SHEET, profit_and_loss])
+        self.assertEqual(len(unmapped), 4)
+        self.assertLess(confidence, THRESHOLD)
+
+    def test_one_renamed_income_line_falls_back(self):
+        profit_and_loss = PROFIT_AND_LOSS.replace('Other Expenses 16', 'Miscellaneous Charges 16')
+        _, confidence, unmapped = parse_statements([BALANCE_SHEET, profit_and_loss])
+        self.assertEqual(unmapped, ['Miscellaneous Charges 16 19,00,000 18,00,000'])
+        self.assertLess(confidence, THRESHOLD)
+
+    def test_unmapped_balance_sheet_line_falls_back(self):
+        # Offset on both sides so the balance sheet still balances
+        balance_sheet = with_lines(BALANCE_SHEET, 'Trade Receivables', ['Contract Assets 3,00,000 2,00,000']) \
+            .replace('Share Capital 1 50,00,000', 'Share Capital 1 53,00,000')
+        _, confidence, unmapped = parse_statements([balance_sheet, PROFIT_AND_LOSS])
+        self.assertEqual(len(unmapped), 1)
+        self.assertLess(confidence, THRESHOLD)
+
+    @unittest.skipUnless(os.getenv('LOCAL_PARSER_CORPUS'), 'LOCAL_PARSER_CORPUS is not set')
+    def test_saved_corpus(self):
+        for name, path, reference_path in iter_corpus(os.environ['LOCAL_PARSER_CORPUS']):
+            if not os.path.exists(reference_path):
+                continue
+            with self.subTest(document=name):
+                local, confidence, _ = parse_statements(list(iter_page_texts(path, max_workers=1)))
+                if confidence < THRESHOLD:
+                    continue
+                precision, recall = compare(local, load_reference(reference_path))
+                self.assertGreaterEqual(precision, MIN_PRECISION, f"{name}: local items the model disagrees with")
+                self.assertGreaterEqual(recall, MIN_RECALL, f"{name}: model items the local parser missed")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import io
+import logging
+import os
+import tempfile
+
+from flask import Request, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Upload limits. The request body is capped at MAX_UPLOAD_BYTES plus room for the multipart
+# framing, so Flask rejects larger bodies with 413 from the Content-Length header (or while
+# reading a chunked body) instead of buffering them first.
+MAX_UPLOAD_BYTES = int(float(os.getenv('MAX_UPLOAD_MB', '10')) * 1024 * 1024)
+MULTIPART_OVERHEAD = 64 * 1024
+# Uploads up to this size are kept in memory; anything larger (or of unknown size) is
+# written to a temporary file in UPLOAD_TMP_DIR while it is received
+UPLOAD_MEMORY_BYTES = int(os.getenv('UPLOAD_MEMORY_BYTES', str(256 * 1024)))
+UPLOAD_TMP_DIR = os.getenv('UPLOAD_TMP_DIR') or None
+
+# Reports accepted by one batch request; its body may hold that many full-size files
+MAX_BATCH_FILES = int(os.getenv('BATCH_MAX_FILES', '6'))
+
+UPLOAD_ENDPOINTS = {'process_pdf', 'create_job', 'process_batch'}
+BATCH_ENDPOINTS = {'process_batch'}
+
+
+class UploadRequest(Request):
+    # Werkzeug's max_form_memory_size (500 KB) also caps in-memory file parts, so
+    # UPLOAD_MEMORY_BYTES must stay below it
+    @property
+    def max_content_length(self):
+        limit = super().max_content_length
+        if limit is not None and self.endpoint in BATCH_ENDPOINTS:
+            return MAX_UPLOAD_BYTES * MAX_BATCH_FILES + MULTIPART_OVERHEAD
+        return limit
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= UPLOAD_MEMORY_BYTES:
+            return io.BytesIO()
+        # A real file, so extraction can memory-map it instead of reading it into the heap
+        return tempfile.TemporaryFile('w+b', dir=UPLOAD_TMP_DIR)
+
+
+def stream_size(stream):
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def too_large_response():
+    response = jsonify({'error': f'File size exceeds maximum limit of {MAX_UPLOAD_BYTES // (1024 * 1024)}MB'})
+    response.status_code = 413
+    # The body is not read, so the connection cannot be reused
+    response.headers['Connection'] = 'close'
+    return response
+
+
+def setup_upload_limits(app):
+    app.request_class = UploadRequest
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD
+
+    @app.before_request
+    def reject_oversized_upload():
+        # Answer from the headers alone, before anything touches the body
+        if request.endpoint in UPLOAD_ENDPOINTS and request.content_length is not None \
+                and request.content_length > request.max_content_length:
+            logger.warning("Rejected %d byte upload to %s", request.content_length, request.path)
+            return too_large_response()
+
+    @app.errorhandler(413)
+    def handle_413_error(error):
+        return too_large_response()